@@ -0,0 +1,536 @@
+"""
+Outils de lecture du JSON produit par Gemini.
+
+IncrementalExerciseParser suit la réponse en streaming et rend chaque objet
+exercice dès que son accolade fermante arrive, en ignorant le bloc
+<thinking_process> (qui peut contenir des crochets ou accolades parasites).
+
+parse_tolerant lit une réponse complète en une seule passe linéaire et répare au
+passage les défauts courants (retours à la ligne bruts, guillemets non échappés,
+virgules en trop, réponse tronquée...), en indiquant les réparations appliquées.
+"""
+import json
+import re
+from json.decoder import scanstring
+
+THINKING_OPEN = '<thinking_process>'
+THINKING_CLOSE = '</thinking_process>'
+
+
+class IncrementalExerciseParser:
+    """Parseur incrémental : feed(texte) -> liste des objets complets apparus dans ce morceau."""
+
+    def __init__(self):
+        self.buffer = ''
+        self.pos = 0            # Prochain caractère à examiner
+        self.depth = 0          # Profondeur {} / [] à l'intérieur de l'objet courant
+        self.obj_start = None   # Début de l'objet de premier niveau en cours
+        self.in_string = False
+        self.escape = False
+        self.in_thinking = False
+        self.emitted = 0
+
+    def feed(self, text):
+        if not text:
+            return []
+        self.buffer += text
+        found = []
+        buf = self.buffer
+        i = self.pos
+        n = len(buf)
+
+        while i < n:
+            if self.in_thinking:
+                end = buf.find(THINKING_CLOSE, i)
+                if end == -1:
+                    # On garde la fin du buffer au cas où la balise fermante serait coupée
+                    i = max(i, n - len(THINKING_CLOSE) + 1)
+                    break
+                i = end + len(THINKING_CLOSE)
+                self.in_thinking = False
+                continue
+
+            c = buf[i]
+
+            if self.obj_start is None:
+                if c == '<':
+                    if buf.startswith(THINKING_OPEN, i):
+                        self.in_thinking = True
+                        i += len(THINKING_OPEN)
+                        continue
+                    if THINKING_OPEN.startswith(buf[i:]):
+                        # Balise ouvrante possiblement coupée entre deux morceaux
+                        break
+                elif c == '{':
+                    self.obj_start = i
+                    self.depth = 1
+                i += 1
+                continue
+
+            # À l'intérieur d'un objet de premier niveau
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif c == '\\':
+                    self.escape = True
+                elif c == '"':
+                    self.in_string = False
+            elif c == '"':
+                self.in_string = True
+            elif c in '{[':
+                self.depth += 1
+            elif c in '}]':
+                self.depth -= 1
+                if self.depth == 0:
+                    obj = self._decode(buf[self.obj_start:i + 1])
+                    if obj is not None:
+                        found.append(obj)
+                    self.obj_start = None
+            i += 1
+
+        self.pos = i
+        # Compactage : on ne garde que ce qui peut encore servir
+        keep_from = self.obj_start if self.obj_start is not None else self.pos
+        if keep_from > 4096:
+            self.buffer = self.buffer[keep_from:]
+            self.pos -= keep_from
+            if self.obj_start is not None:
+                self.obj_start -= keep_from
+        self.emitted += len(found)
+        return found
+
+    def _decode(self, raw):
+        try:
+            obj = json.loads(raw, strict=False)
+        except ValueError:
+            return None
+        return obj if isinstance(obj, dict) else None
+
+
+# ==============================================================================
+# LECTURE TOLÉRANTE (une seule passe)
+# ==============================================================================
+FENCE_OPEN = re.compile(r'```[a-zA-Z]*[ \t]*\n?')
+CONTAINER_START = re.compile(r'[{\[]')
+NEXT_OBJECT = re.compile(r'[ \t\n\r]*,?[ \t\n\r]*\{')
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+NUMBER = re.compile(r'-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?')
+BARE_KEY = re.compile(r'[A-Za-z_][\w\-]*')
+BARE_VALUE_END = re.compile(r'[,}\]\n]')
+CONTROL_CHAR = re.compile(r'[\n\r\t]')
+STRING_SPECIAL = {'"': re.compile(r'["\\\n\r\t]'), "'": re.compile(r"['\\\n\r\t]")}
+ESCAPES = {'"': '"', "'": "'", '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+LITERALS = (('true', True, None), ('false', False, None), ('null', None, None),
+            ('True', True, 'python_literal'), ('False', False, 'python_literal'), ('None', None, 'python_literal'),
+            ('NaN', None, 'non_finite_number'), ('Infinity', None, 'non_finite_number'),
+            ('-Infinity', None, 'non_finite_number'))
+VALUE_START = set('"\'{[-0123456789tfnTFNI')
+MAX_START_ATTEMPTS = 16     # Débuts essayés en repli, si le début retenu ne donne aucun objet
+
+
+def _reject_constant(name):
+    raise ValueError(name)
+
+
+# Strict : un caractère de contrôle brut ou NaN / Infinity passent par la réparation
+RAW_DECODER = json.JSONDecoder(parse_constant=_reject_constant)
+
+_MISSING = object()
+
+
+class _Unparseable(Exception):
+    """Le début candidat ne mène pas à du JSON (texte libre entre crochets, par exemple)."""
+
+
+class TolerantJsonParser:
+    """
+    Parseur JSON à descente récursive, linéaire, qui répare au passage les défauts
+    habituels des réponses du modèle au lieu d'échouer. Chaque réparation est notée
+    dans `repairs` :
+    - raw_control_char : retour à la ligne / tabulation bruts dans une chaîne ;
+    - inner_quote : guillemet non échappé dans une chaîne (il ne précède ni , ni } ni ]) ;
+    - trailing_comma / extra_comma / missing_comma / missing_colon ;
+    - single_quote, unquoted_key, python_literal (True/False/None), bare_value ;
+    - non_finite_number : NaN / Infinity / -Infinity (hors JSON), remplacés par null ;
+    - bad_escape : séquence d'échappement invalide gardée telle quelle ;
+    - truncated : fin de texte avant la fin du JSON (conteneurs refermés, scalaire coupé retiré) ;
+    - partial_item_dropped : dernier élément du tableau racine incomplet, écarté ;
+    - concatenated : plusieurs objets racine à la suite, regroupés en liste.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.n = len(text)
+        self.i = 0
+        self.repairs = []
+        self.truncated = False
+
+    def repair(self, name):
+        if name not in self.repairs:
+            self.repairs.append(name)
+
+    def skip_ws(self):
+        if self.i < self.n and self.text[self.i] in ' \t\n\r':
+            self.i = WHITESPACE.match(self.text, self.i).end()
+
+    def parse_root(self, start):
+        self.i = start
+        value = self.parse_value(root=True)
+        if value is _MISSING:
+            raise _Unparseable()
+        if isinstance(value, dict) and not self.truncated:
+            # Objets racine à la suite ({...}\n{...}) : même traitement qu'un tableau
+            items = [value]
+            while True:
+                self.skip_ws()
+                if self.i < self.n and self.text[self.i] == ',':
+                    self.i += 1
+                    self.skip_ws()
+                if self.i >= self.n or self.text[self.i] != '{':
+                    break
+                item = self.parse_object()
+                if self.truncated:
+                    self.repair('partial_item_dropped')
+                    break
+                items.append(item)
+            if len(items) > 1:
+                self.repair('concatenated')
+                value = items
+        return value
+
+    def parse_value(self, root=False):
+        self.skip_ws()
+        if self.i >= self.n:
+            self.truncated = True
+            return _MISSING
+        c = self.text[self.i]
+        if c == '{':
+            return self.parse_object()
+        if c == '[':
+            return self.parse_array(root)
+        if c == '"':
+            return self.parse_string('"')
+        if c == "'":
+            self.repair('single_quote')
+            return self.parse_string("'")
+        if (c == '-' and not self.text.startswith('-I', self.i)) or c.isdigit():
+            return self.parse_number()
+        for word, value, repair in LITERALS:
+            if self.text.startswith(word, self.i):
+                self.i += len(word)
+                if repair:
+                    self.repair(repair)
+                return value
+            if self.n - self.i < len(word) and word.startswith(self.text[self.i:]):
+                # "tru" en fin de texte : littéral coupé
+                self.i = self.n
+                self.truncated = True
+                return _MISSING
+        if c in ',:}]':
+            return _MISSING
+        return self.parse_bare_value()
+
+    def parse_bare_value(self):
+        """Valeur sans guillemets (texte libre) : lue jusqu'au prochain séparateur ou fin de ligne."""
+        match = BARE_VALUE_END.search(self.text, self.i)
+        end = match.start() if match else self.n
+        value = self.text[self.i:end].strip()
+        self.i = end
+        if match is None:
+            self.truncated = True
+            return _MISSING
+        self.repair('bare_value')
+        return value
+
+    def parse_number(self):
+        match = NUMBER.match(self.text, self.i)
+        if match is None:
+            return self.parse_bare_value()
+        end = match.end()
+        if end >= self.n:
+            # Nombre en fin de texte : peut-être coupé ("12" pour "120")
+            self.i = self.n
+            self.truncated = True
+            return _MISSING
+        after = WHITESPACE.match(self.text, end).end()
+        if after < self.n and self.text[after] not in ',}]"\'':
+            # "15 min", "4v4" : texte libre qui commence par un chiffre
+            return self.parse_bare_value()
+        raw = match.group(0)
+        self.i = end
+        if '.' in raw or 'e' in raw or 'E' in raw:
+            return float(raw)
+        return int(raw)
+
+    def parse_string(self, quote):
+        text = self.text
+        if quote == '"':
+            # Chemin rapide (scanner C de json) ; le parcours ci-dessous ne sert qu'aux chaînes à réparer
+            try:
+                value, end = scanstring(text, self.i + 1, False)
+            except ValueError:
+                pass
+            else:
+                if self._closes_string(end):
+                    if CONTROL_CHAR.search(text, self.i, end):
+                        self.repair('raw_control_char')
+                    self.i = end
+                    return value
+        special = STRING_SPECIAL[quote]
+        chunks = []
+        i = self.i + 1
+        while True:
+            match = special.search(text, i)
+            if match is None:
+                chunks.append(text[i:])
+                self.i = self.n
+                self.truncated = True
+                return _MISSING
+            j = match.start()
+            chunks.append(text[i:j])
+            c = text[j]
+            if c == quote:
+                if self._closes_string(j + 1):
+                    self.i = j + 1
+                    return ''.join(chunks)
+                self.repair('inner_quote')
+                chunks.append(c)
+                i = j + 1
+            elif c == '\\':
+                i = self._escape(j, chunks)
+                if i is None:
+                    self.i = self.n
+                    self.truncated = True
+                    return _MISSING
+            else:
+                # Retour à la ligne ou tabulation bruts : conservés (comme json.loads(strict=False))
+                self.repair('raw_control_char')
+                chunks.append(c)
+                i = j + 1
+
+    def _escape(self, j, chunks):
+        """Décode l'échappement en `j` ; rend la position suivante, ou None si le texte s'arrête."""
+        text = self.text
+        if j + 1 >= self.n:
+            return None
+        c = text[j + 1]
+        if c in ESCAPES:
+            chunks.append(ESCAPES[c])
+            return j + 2
+        if c == 'u':
+            if j + 6 > self.n:
+                return None
+            try:
+                code = int(text[j + 2:j + 6], 16)
+            except ValueError:
+                self.repair('bad_escape')
+                chunks.append('\\u')
+                return j + 2
+            end = j + 6
+            if 0xD800 <= code < 0xDC00 and text.startswith('\\u', end):
+                try:
+                    low = int(text[end + 2:end + 6], 16)
+                except ValueError:
+                    low = 0
+                if 0xDC00 <= low < 0xE000:
+                    code = 0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)
+                    end += 6
+            chunks.append(chr(code))
+            return end
+        self.repair('bad_escape')
+        chunks.append('\\' + c)
+        return j + 2
+
+    def _closes_string(self, k):
+        """Un guillemet ferme la chaîne s'il est suivi (aux blancs près) de : } ] , ou de la fin du texte."""
+        text = self.text
+        after = WHITESPACE.match(text, k).end()
+        if after >= self.n:
+            return True
+        c = text[after]
+        if c in ':}]':
+            return True
+        if c == ',':
+            nxt = WHITESPACE.match(text, after + 1).end()
+            if nxt >= self.n or text[nxt] in VALUE_START or text[nxt] in '}]':
+                return True
+            # Clé sans guillemets juste après la virgule ("x", duree: ...)
+            key = BARE_KEY.match(text, nxt)
+            return key is not None and text.startswith(':', WHITESPACE.match(text, key.end()).end())
+        # Retour à la ligne puis nouvelle clé : virgule oubliée entre deux paires
+        return c in '"\'' and '\n' in text[k:after]
+
+    def parse_key(self):
+        c = self.text[self.i]
+        if c in '"\'':
+            if c == "'":
+                self.repair('single_quote')
+            return self.parse_string(c)
+        match = BARE_KEY.match(self.text, self.i)
+        if match is None:
+            raise _Unparseable()
+        self.repair('unquoted_key')
+        self.i = match.end()
+        return match.group(0)
+
+    def parse_object(self):
+        text = self.text
+        obj = {}
+        self.i += 1
+        while True:
+            self.skip_ws()
+            if self.i >= self.n:
+                self.truncated = True
+                return obj
+            c = text[self.i]
+            if c == '}':
+                self.i += 1
+                return obj
+            if c == ',':
+                self.repair('extra_comma')
+                self.i += 1
+                continue
+            key = self.parse_key()
+            if key is _MISSING:
+                return obj
+            self.skip_ws()
+            if self.i >= self.n:
+                self.truncated = True
+                return obj
+            if text[self.i] == ':':
+                self.i += 1
+            else:
+                self.repair('missing_colon')
+            value = self.parse_value()
+            if value is _MISSING:
+                if self.truncated:
+                    return obj
+                self.repair('bare_value')
+                value = None
+            obj[key] = value
+            if self.truncated:
+                return obj
+            if not self._after_item('}'):
+                return obj
+
+    def parse_array(self, root=False):
+        text = self.text
+        items = []
+        self.i += 1
+        while True:
+            self.skip_ws()
+            if self.i >= self.n:
+                self.truncated = True
+                return items
+            c = text[self.i]
+            if c == ']':
+                self.i += 1
+                return items
+            if c == ',':
+                self.repair('extra_comma')
+                self.i += 1
+                continue
+            value = self.parse_value()
+            if value is _MISSING:
+                if self.truncated:
+                    return items
+                raise _Unparseable()
+            if self.truncated:
+                if root and isinstance(value, dict):
+                    # Exercice coupé en plein milieu : ses champs seraient incomplets
+                    self.repair('partial_item_dropped')
+                else:
+                    items.append(value)
+                return items
+            items.append(value)
+            if not self._after_item(']'):
+                return items
+
+    def _after_item(self, closer):
+        """Consomme le séparateur après un élément ; False si le texte s'arrête là."""
+        self.skip_ws()
+        if self.i >= self.n:
+            self.truncated = True
+            return False
+        c = self.text[self.i]
+        if c == ',':
+            self.i += 1
+            self.skip_ws()
+            if self.i < self.n and self.text[self.i] == closer:
+                self.repair('trailing_comma')
+        elif c != closer and c not in '}]':
+            self.repair('missing_comma')
+        elif c != closer:
+            # Fermeture du mauvais type (] à la place de }) : on referme quand même
+            self.repair('mismatched_bracket')
+            self.i += 1
+            return False
+        return True
+
+
+def _payload_start(text):
+    """Début du JSON : contenu du bloc ```json s'il existe, sinon premier '{' / '[' après le bloc de réflexion."""
+    start = 0
+    end_thinking = text.rfind(THINKING_CLOSE)
+    if end_thinking != -1:
+        start = end_thinking + len(THINKING_CLOSE)
+    fence = FENCE_OPEN.search(text, start)
+    if fence is not None:
+        first = CONTAINER_START.search(text, fence.end())
+        if first is not None and not text[fence.end():first.start()].strip():
+            return first.start()
+    first = CONTAINER_START.search(text, start)
+    return first.start() if first is not None else None
+
+
+def _usable(value):
+    """Réponse exploitable : un objet, ou un tableau vide ou contenant au moins un objet."""
+    if isinstance(value, dict):
+        return True
+    return isinstance(value, list) and (not value or any(isinstance(item, dict) for item in value))
+
+
+def _parse_at(text, start):
+    """(valeur, réparations) lues à partir de `start`, ou None si elles ne donnent aucun objet."""
+    try:
+        # JSON déjà valide : décodé par le scanner C, sans réparation
+        value, end = RAW_DECODER.raw_decode(text, start)
+        if _usable(value) and not (isinstance(value, dict) and NEXT_OBJECT.match(text, end)):
+            return value, []
+    except ValueError:
+        pass
+    parser = TolerantJsonParser(text)
+    try:
+        value = parser.parse_root(start)
+    except (_Unparseable, RecursionError):
+        return None
+    if not _usable(value):
+        return None
+    if parser.truncated:
+        parser.repair('truncated')
+    return value, parser.repairs
+
+
+def parse_tolerant(text):
+    """
+    Lit le JSON d'une réponse du modèle en une passe, en réparant ce qui peut l'être.
+    Rend (valeur, réparations) ; valeur vaut None si aucun JSON exploitable n'a été trouvé.
+    Le bloc <thinking_process> et les balises ```json sont ignorés (ce ne sont pas des réparations).
+    Le début est choisi une fois (_payload_start) ; les '{' / '[' suivants ne sont essayés que si
+    ce début ne donne aucun objet (texte libre entre crochets avant le JSON, par exemple).
+    """
+    if not text:
+        return None, []
+    start = _payload_start(text)
+    if start is None:
+        return None, []
+    result = _parse_at(text, start)
+    if result is not None:
+        return result
+    for attempt, match in enumerate(CONTAINER_START.finditer(text, start + 1), 1):
+        if attempt >= MAX_START_ATTEMPTS:
+            break
+        result = _parse_at(text, match.start())
+        if result is not None:
+            return result
+    return None, []
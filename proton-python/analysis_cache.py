@@ -0,0 +1,253 @@
+"""
+Cache persistant des analyses vidéo (SQLite, fichier local).
+
+Une analyse est identifiée par (version d'analyse, hash du contenu vidéo) :
+- la version = modèle Gemini actif + hash du prompt multi-exercices,
+  un changement de l'un ou l'autre invalide donc naturellement le cache ;
+- l'URL normalisée n'est qu'un alias vers un hash de contenu, ce qui permet
+  de répondre sans même retélécharger la vidéo.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+CACHE_DIR = os.environ.get('ANALYSIS_CACHE_DIR', 'cache_data')
+CACHE_PATH = os.path.join(CACHE_DIR, 'analysis_cache.sqlite3')
+MAX_ENTRIES = int(os.environ.get('ANALYSIS_CACHE_MAX_ENTRIES', 500))
+MAX_BYTES = int(os.environ.get('ANALYSIS_CACHE_MAX_MB', 200)) * 1024 * 1024
+MAX_AGE_SECONDS = int(os.environ.get('ANALYSIS_CACHE_MAX_AGE_DAYS', 30)) * 86400
+MAX_CHUNK_ROWS = int(os.environ.get('ANALYSIS_CACHE_MAX_CHUNKS', 5000))
+
+# Paramètres de tracking qui ne changent pas la vidéo pointée
+IGNORED_QUERY_PARAMS = {'t', 'si', 'feature', 'pp', 'list', 'index', 'ab_channel', 'fbclid', 'igshid'}
+
+
+def normalize_video_url(url):
+    """Clé canonique d'une URL vidéo (IDs YouTube unifiés, tracking retiré)."""
+    url = (url or '').strip()
+    parts = urlsplit(url if '://' in url else f"https://{url}")
+    host = parts.netloc.lower()
+    if host.startswith('www.') or host.startswith('m.'):
+        host = host.split('.', 1)[1]
+    path = parts.path.rstrip('/')
+
+    # YouTube : watch?v=ID, youtu.be/ID, shorts/ID, embed/ID -> youtube:ID
+    if host in ('youtube.com', 'youtu.be', 'music.youtube.com'):
+        video_id = None
+        if host == 'youtu.be':
+            video_id = path.lstrip('/')
+        elif path == '/watch':
+            video_id = dict(parse_qsl(parts.query)).get('v')
+        else:
+            for prefix in ('/shorts/', '/embed/', '/live/', '/v/'):
+                if path.startswith(prefix):
+                    video_id = path[len(prefix):]
+                    break
+        if video_id:
+            return f"youtube:{video_id.split('/')[0]}"
+
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query)
+        if k.lower() not in IGNORED_QUERY_PARAMS and not k.lower().startswith('utm_')
+    )
+    return urlunsplit(('https', host, path, urlencode(query), ''))
+
+
+def file_sha256(path, block_size=1 << 20):
+    """Hash SHA-256 du contenu d'un fichier (lecture par blocs)."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def analysis_version(model_name, prompt):
+    """Empreinte courte (modèle + prompt) : change dès que l'un des deux change."""
+    digest = hashlib.sha256(f"{model_name}\n{prompt}".encode('utf-8')).hexdigest()
+    return digest[:16]
+
+
+class AnalysisCache:
+    """
+    Cache SQLite thread-safe des listes d'exercices, avec éviction par âge et par taille.
+    Stocke aussi le résultat de chaque segment, pour ne relancer que les segments manquants
+    (au plus max_chunks lignes, les plus anciennes partent d'abord).
+    """
+
+    def __init__(self, path=CACHE_PATH, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES, max_age=MAX_AGE_SECONDS,
+                 max_chunks=MAX_CHUNK_ROWS):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_chunks = max_chunks
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS analyses (
+                version TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                title TEXT,
+                thumbnail TEXT,
+                exercises TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (version, content_hash)
+            );
+            CREATE TABLE IF NOT EXISTS url_aliases (
+                url_key TEXT NOT NULL,
+                version TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                PRIMARY KEY (url_key, version)
+            );
+            CREATE INDEX IF NOT EXISTS idx_analyses_access ON analyses(last_access);
+            CREATE TABLE IF NOT EXISTS chunk_results (
+                content_hash TEXT NOT NULL,
+                start_ms INTEGER NOT NULL,
+                duration_ms INTEGER NOT NULL,
+                version TEXT NOT NULL,
+                exercises TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (content_hash, version, start_ms, duration_ms)
+            );
+            CREATE INDEX IF NOT EXISTS idx_chunks_created ON chunk_results(created_at);
+        """)
+        self.conn.commit()
+
+    def _row_to_entry(self, row):
+        title, thumbnail, exercises, content_hash = row
+        return {
+            "title": title,
+            "thumbnail": thumbnail,
+            "exercises": json.loads(exercises),
+            "content_hash": content_hash,
+        }
+
+    def _touch(self, version, content_hash):
+        self.conn.execute(
+            "UPDATE analyses SET last_access = ? WHERE version = ? AND content_hash = ?",
+            (time.time(), version, content_hash)
+        )
+        self.conn.commit()
+
+    def get_by_url(self, url_key, version):
+        """Analyse déjà connue pour cette URL normalisée (sans téléchargement)."""
+        with self.lock:
+            row = self.conn.execute("""
+                SELECT a.title, a.thumbnail, a.exercises, a.content_hash
+                FROM url_aliases u JOIN analyses a
+                  ON a.version = u.version AND a.content_hash = u.content_hash
+                WHERE u.url_key = ? AND u.version = ? AND a.created_at >= ?
+            """, (url_key, version, time.time() - self.max_age)).fetchone()
+            if not row:
+                return None
+            self._touch(version, row[3])
+            return self._row_to_entry(row)
+
+    def get_by_hash(self, content_hash, version, url_key=None):
+        """Analyse déjà connue pour ce contenu ; enregistre l'URL comme nouvel alias."""
+        with self.lock:
+            row = self.conn.execute("""
+                SELECT title, thumbnail, exercises, content_hash FROM analyses
+                WHERE content_hash = ? AND version = ? AND created_at >= ?
+            """, (content_hash, version, time.time() - self.max_age)).fetchone()
+            if not row:
+                return None
+            if url_key:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO url_aliases (url_key, version, content_hash) VALUES (?, ?, ?)",
+                    (url_key, version, content_hash)
+                )
+            self._touch(version, content_hash)
+            return self._row_to_entry(row)
+
+    def put(self, url_key, content_hash, version, title, thumbnail, exercises):
+        """Enregistre une analyse complète puis applique l'éviction."""
+        payload = json.dumps(exercises, ensure_ascii=False)
+        now = time.time()
+        with self.lock:
+            self.conn.execute("""
+                INSERT OR REPLACE INTO analyses
+                    (version, content_hash, title, thumbnail, exercises, size, created_at, last_access)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (version, content_hash, title, thumbnail, payload, len(payload.encode('utf-8')), now, now))
+            if url_key:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO url_aliases (url_key, version, content_hash) VALUES (?, ?, ?)",
+                    (url_key, version, content_hash)
+                )
+            self.conn.commit()
+            self._evict()
+
+    def get_chunk(self, content_hash, start, duration, version):
+        """Exercices déjà extraits pour ce segment (None si jamais analysé avec succès)."""
+        with self.lock:
+            row = self.conn.execute("""
+                SELECT exercises FROM chunk_results
+                WHERE content_hash = ? AND version = ? AND start_ms = ? AND duration_ms = ? AND created_at >= ?
+            """, (content_hash, version, int(round(start * 1000)), int(round(duration * 1000)),
+                  time.time() - self.max_age)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_chunk(self, content_hash, start, duration, version, exercises):
+        """Enregistre le résultat parsé d'un segment analysé avec succès."""
+        payload = json.dumps(exercises, ensure_ascii=False)
+        with self.lock:
+            self.conn.execute("""
+                INSERT OR REPLACE INTO chunk_results
+                    (content_hash, start_ms, duration_ms, version, exercises, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (content_hash, int(round(start * 1000)), int(round(duration * 1000)), version, payload, time.time()))
+            self._evict_chunks()
+            self.conn.commit()
+
+    def _evict_chunks(self):
+        """Résultats de segments expirés, puis les plus anciens au-delà de max_chunks lignes."""
+        self.conn.execute("DELETE FROM chunk_results WHERE created_at < ?", (time.time() - self.max_age,))
+        self.conn.execute("""
+            DELETE FROM chunk_results WHERE rowid IN (
+                SELECT rowid FROM chunk_results ORDER BY created_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_chunks,))
+
+    def _evict(self):
+        """Supprime les entrées expirées, puis les moins récemment lues au-delà des limites."""
+        self.conn.execute("DELETE FROM analyses WHERE created_at < ?", (time.time() - self.max_age,))
+        self._evict_chunks()
+        count, total = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM analyses").fetchone()
+        if count > self.max_entries or total > self.max_bytes:
+            rows = self.conn.execute(
+                "SELECT version, content_hash, size FROM analyses ORDER BY last_access ASC"
+            ).fetchall()
+            for version, content_hash, size in rows:
+                if count <= self.max_entries and total <= self.max_bytes:
+                    break
+                self.conn.execute(
+                    "DELETE FROM analyses WHERE version = ? AND content_hash = ?", (version, content_hash)
+                )
+                count -= 1
+                total -= size
+        self.conn.execute("""
+            DELETE FROM url_aliases WHERE NOT EXISTS (
+                SELECT 1 FROM analyses a
+                WHERE a.version = url_aliases.version AND a.content_hash = url_aliases.content_hash
+            )
+        """)
+        self.conn.commit()
+
+    def stats(self):
+        with self.lock:
+            count, total = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM analyses").fetchone()
+            chunks = self.conn.execute("SELECT COUNT(*) FROM chunk_results").fetchone()[0]
+        return {"entries": count, "bytes": total, "max_entries": self.max_entries, "max_bytes": self.max_bytes,
+                "chunks": chunks, "max_chunks": self.max_chunks}
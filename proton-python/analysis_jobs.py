@@ -0,0 +1,460 @@
+"""
+Jobs d'analyse vidéo asynchrones.
+
+Une soumission renvoie immédiatement un identifiant de job ; un pool borné de workers
+exécute l'analyse et le client interroge l'état (étape en cours, progression N/M,
+résultat). Les jobs terminés sont conservés pendant une durée de rétention puis purgés.
+
+Chaque job tient aussi un journal d'événements numérotés (progression, exercices
+partiels, changement d'état) que le client peut suivre en Server-Sent Events.
+
+État et événements sont recopiés dans une base SQLite partagée (JobStore) : sous gunicorn,
+la requête de suivi ou d'annulation peut arriver sur un autre worker que celui qui exécute
+le job. Ce worker-là lit le job depuis la base (RemoteJob) et l'annulation y est posée comme
+un drapeau que le worker propriétaire relit à ses points de contrôle.
+"""
+import concurrent.futures
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+MAX_WORKERS = int(os.environ.get('ANALYSIS_JOB_WORKERS', 2))
+MAX_PENDING = int(os.environ.get('ANALYSIS_JOB_MAX_PENDING', 20))
+RETENTION_SECONDS = int(os.environ.get('ANALYSIS_JOB_RETENTION_MIN', 60)) * 60
+JOBS_DIR = os.environ.get('ANALYSIS_CACHE_DIR', 'cache_data')
+JOBS_PATH = os.path.join(JOBS_DIR, 'analysis_jobs.sqlite3')
+CANCEL_CHECK_INTERVAL = 1.0     # Relecture du drapeau d'annulation posé par un autre worker
+REMOTE_POLL_INTERVAL = 0.5      # Suivi SSE d'un job exécuté par un autre worker
+
+# États possibles d'un job
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+# Étapes du pipeline, dans l'ordre
+STAGES = ('download', 'split', 'upload', 'analyse', 'dedup')
+
+
+class JobCancelled(Exception):
+    """Levée par un worker quand l'annulation du job a été demandée."""
+
+
+class QueueFull(Exception):
+    """Trop de jobs en attente : la soumission est refusée."""
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True     # Processus d'un autre utilisateur : il existe
+    return True
+
+
+class JobStore:
+    """Copie SQLite (WAL) de l'état et des événements des jobs, partagée entre les workers."""
+
+    def __init__(self, path=JOBS_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                url TEXT,
+                owner_pid INTEGER NOT NULL,
+                state TEXT NOT NULL,
+                stage TEXT,
+                progress TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                status_code INTEGER,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                last_event_id INTEGER NOT NULL,
+                cancel_requested INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs(state, finished_at);
+            CREATE TABLE IF NOT EXISTS job_events (
+                job_id TEXT NOT NULL,
+                event_id INTEGER NOT NULL,
+                type TEXT NOT NULL,
+                data TEXT NOT NULL,
+                ts REAL NOT NULL,
+                PRIMARY KEY (job_id, event_id)
+            ) WITHOUT ROWID;
+        """)
+        self.conn.commit()
+
+    def save(self, snapshot, event=None):
+        """Enregistre l'état d'un job (dict de AnalysisJob.snapshot) et, s'il y en a un, son dernier événement."""
+        with self.lock:
+            self.conn.execute("""
+                INSERT INTO jobs (id, url, owner_pid, state, stage, progress, result, error, status_code,
+                                  created_at, started_at, finished_at, last_event_id)
+                VALUES (:id, :url, :owner_pid, :state, :stage, :progress, :result, :error, :status_code,
+                        :created_at, :started_at, :finished_at, :last_event_id)
+                ON CONFLICT(id) DO UPDATE SET
+                    state = excluded.state, stage = excluded.stage, progress = excluded.progress,
+                    result = excluded.result, error = excluded.error, status_code = excluded.status_code,
+                    started_at = excluded.started_at, finished_at = excluded.finished_at,
+                    last_event_id = excluded.last_event_id
+            """, snapshot)
+            if event is not None:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO job_events (job_id, event_id, type, data, ts) VALUES (?, ?, ?, ?, ?)",
+                    (snapshot['id'], event['id'], event['type'], json.dumps(event['data'], ensure_ascii=False),
+                     event['ts'])
+                )
+            self.conn.commit()
+
+    def load(self, job_id):
+        with self.lock:
+            cursor = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+            row = cursor.fetchone()
+            if not row:
+                return None
+            return dict(zip([c[0] for c in cursor.description], row))
+
+    def events(self, job_id, after_id):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT event_id, type, data, ts FROM job_events WHERE job_id = ? AND event_id > ? ORDER BY event_id",
+                (job_id, after_id)
+            ).fetchall()
+        return [{"id": event_id, "type": event_type, "data": json.loads(data), "ts": ts}
+                for event_id, event_type, data, ts in rows]
+
+    def load_all(self):
+        """Tous les jobs, du plus récent au plus ancien (une seule requête)."""
+        with self.lock:
+            cursor = self.conn.execute("SELECT * FROM jobs ORDER BY created_at DESC")
+            columns = [c[0] for c in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def request_cancel(self, job_id):
+        with self.lock:
+            self.conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+            self.conn.commit()
+
+    def cancel_requested(self, job_id):
+        with self.lock:
+            row = self.conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def count_active(self):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE state IN (?, ?)", (QUEUED, RUNNING)
+            ).fetchone()[0]
+
+    def purge(self, retention):
+        """
+        Supprime les jobs terminés depuis plus de `retention` s, et marque en échec les jobs
+        dont le worker propriétaire a disparu (redémarrage, crash).
+        """
+        now = time.time()
+        with self.lock:
+            orphans = [
+                job_id for job_id, pid in self.conn.execute(
+                    "SELECT id, owner_pid FROM jobs WHERE state IN (?, ?)", (QUEUED, RUNNING)
+                ).fetchall()
+                if not process_alive(pid)
+            ]
+            for job_id in orphans:
+                self.conn.execute(
+                    "UPDATE jobs SET state = ?, error = ?, status_code = 500, finished_at = ? WHERE id = ?",
+                    (FAILED, "Worker interrompu pendant l'analyse", now, job_id)
+                )
+            expired = [row[0] for row in self.conn.execute(
+                "SELECT id FROM jobs WHERE state IN (?, ?, ?) AND finished_at < ?", (*FINISHED_STATES, now - retention)
+            ).fetchall()]
+            for job_id in expired:
+                self.conn.execute("DELETE FROM job_events WHERE job_id = ?", (job_id,))
+                self.conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            self.conn.commit()
+
+
+class AnalysisJob:
+    """État d'une analyse : étape courante, compteurs par étape, résultat ou erreur."""
+
+    def __init__(self, url, options=None, store=None):
+        self.id = uuid.uuid4().hex
+        self.url = url
+        self.options = options or {}
+        self.state = QUEUED
+        self.stage = None
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.status_code = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self.lock = threading.Lock()
+        # Journal d'événements (bus de progression) ; `changed` réveille les abonnés SSE
+        self.events = []
+        self.changed = threading.Condition(self.lock)
+        self.store = store
+        self.cancel_checked_at = 0.0
+        if store is not None:
+            store.save(self.snapshot())
+
+    @property
+    def cancelled(self):
+        if not self.cancel_event.is_set() and self.store is not None:
+            now = time.monotonic()
+            if now - self.cancel_checked_at >= CANCEL_CHECK_INTERVAL:
+                self.cancel_checked_at = now
+                if self.store.cancel_requested(self.id):
+                    self.cancel_event.set()
+        return self.cancel_event.is_set()
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise JobCancelled(self.id)
+
+    def snapshot(self):
+        """Colonnes de la table jobs (appelé avec le verrou tenu, ou avant toute publication)."""
+        return {
+            "id": self.id, "url": self.url, "owner_pid": os.getpid(), "state": self.state, "stage": self.stage,
+            "progress": json.dumps(self.progress),
+            "result": json.dumps(self.result, ensure_ascii=False) if self.result is not None else None,
+            "error": self.error, "status_code": self.status_code, "created_at": self.created_at,
+            "started_at": self.started_at, "finished_at": self.finished_at, "last_event_id": len(self.events) - 1,
+        }
+
+    def _append_event(self, event_type, data):
+        """Ajoute un événement au journal (appelé avec le verrou tenu)."""
+        event = {"id": len(self.events), "type": event_type, "data": data, "ts": time.time()}
+        self.events.append(event)
+        if self.store is not None:
+            try:
+                self.store.save(self.snapshot(), event)
+            except sqlite3.Error as e:
+                print(f"⚠️ [Job {self.id[:8]}] État non partagé : {e}")
+        self.changed.notify_all()
+
+    def emit(self, event_type, data):
+        """Publie un événement libre (ex: exercices partiels d'un segment)."""
+        with self.lock:
+            self._append_event(event_type, data)
+
+    def update(self, stage, done=None, total=None):
+        """Passe à l'étape `stage` et met à jour son compteur (ex: upload 3/8)."""
+        with self.lock:
+            self.stage = stage
+            counters = self.progress.setdefault(stage, {"done": 0, "total": None})
+            if done is not None:
+                counters["done"] = done
+            if total is not None:
+                counters["total"] = total
+            self._append_event('progress', {"stage": stage, **counters})
+
+    def set_state(self, state):
+        """Change l'état du job et publie l'événement correspondant."""
+        with self.lock:
+            self.state = state
+            if state == RUNNING:
+                self.started_at = time.time()
+            elif state in FINISHED_STATES:
+                self.finished_at = time.time()
+            data = {"state": state}
+            if self.error:
+                data["error"] = self.error
+            if state == SUCCEEDED:
+                data["result"] = self.result
+            self._append_event('state', data)
+
+    def wait_events(self, after_id, timeout):
+        """
+        Événements d'id > `after_id`, en attendant au plus `timeout` s s'il n'y en a pas.
+        Retourne (événements, job_terminé).
+        """
+        with self.lock:
+            if len(self.events) <= after_id + 1 and self.state not in FINISHED_STATES:
+                self.changed.wait(timeout)
+            return self.events[after_id + 1:], self.state in FINISHED_STATES
+
+    def to_dict(self, include_result=True):
+        with self.lock:
+            data = {
+                "id": self.id,
+                "url": self.url,
+                "state": self.state,
+                "stage": self.stage,
+                "progress": {k: dict(v) for k, v in self.progress.items()},
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "last_event_id": len(self.events) - 1,
+            }
+            if self.error:
+                data["error"] = self.error
+                data["error_status"] = self.status_code
+            if include_result and self.state == SUCCEEDED:
+                data["result"] = self.result
+        return data
+
+
+class RemoteJob:
+    """Job exécuté par un autre worker, lu depuis le JobStore (mêmes méthodes de lecture qu'AnalysisJob)."""
+
+    def __init__(self, store, row):
+        self.store = store
+        self.id = row['id']
+        self.row = row
+
+    @property
+    def state(self):
+        return self.row['state']
+
+    def refresh(self):
+        row = self.store.load(self.id)
+        if row:
+            self.row = row
+        return self
+
+    def wait_events(self, after_id, timeout):
+        """Comme AnalysisJob.wait_events, par relecture périodique de la base."""
+        deadline = time.monotonic() + timeout
+        while True:
+            events = self.store.events(self.id, after_id)
+            finished = self.refresh().state in FINISHED_STATES
+            if events or finished or time.monotonic() >= deadline:
+                return events, finished
+            time.sleep(REMOTE_POLL_INTERVAL)
+
+    def to_dict(self, include_result=True):
+        row = self.row
+        data = {
+            "id": row['id'],
+            "url": row['url'],
+            "state": row['state'],
+            "stage": row['stage'],
+            "progress": json.loads(row['progress']),
+            "created_at": row['created_at'],
+            "started_at": row['started_at'],
+            "finished_at": row['finished_at'],
+            "last_event_id": row['last_event_id'],
+        }
+        if row['error']:
+            data["error"] = row['error']
+            data["error_status"] = row['status_code']
+        if include_result and row['state'] == SUCCEEDED and row['result'] is not None:
+            data["result"] = json.loads(row['result'])
+        return data
+
+
+class JobManager:
+    """
+    Registre des jobs + pool borné de workers. Les jobs de ce processus sont servis depuis la
+    mémoire ; ceux des autres workers depuis le JobStore partagé (None : un seul processus).
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS, max_pending=MAX_PENDING, retention=RETENTION_SECONDS, store=None):
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='analysis-job')
+        self.max_pending = max_pending
+        self.retention = retention
+        self.store = store
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def submit(self, runner, url, **options):
+        """
+        Crée un job et le place dans la file. `runner(job)` retourne le résultat
+        ou lève une exception (son attribut `status` éventuel est conservé).
+        """
+        self.purge()
+        with self.lock:
+            if self.store is not None:
+                pending = self.store.count_active()     # Tous workers confondus
+            else:
+                pending = sum(1 for j in self.jobs.values() if j.state in (QUEUED, RUNNING))
+            if pending >= self.max_pending:
+                raise QueueFull(f"{pending} analyses déjà en cours ou en attente")
+            job = AnalysisJob(url, options, store=self.store)
+            self.jobs[job.id] = job
+        self.executor.submit(self._run, runner, job)
+        return job
+
+    def _run(self, runner, job):
+        if job.cancelled:
+            self._finish(job, CANCELLED)
+            return
+        job.set_state(RUNNING)
+        try:
+            result = runner(job)
+            with job.lock:
+                job.result = result
+            self._finish(job, SUCCEEDED)
+        except JobCancelled:
+            self._finish(job, CANCELLED)
+        except Exception as e:
+            with job.lock:
+                job.error = getattr(e, 'message', None) or str(e)
+                job.status_code = getattr(e, 'status', 500)
+            self._finish(job, FAILED)
+
+    def _finish(self, job, state):
+        job.set_state(state)
+        print(f"🏷️ [Job {job.id[:8]}] {state}")
+
+    def get(self, job_id):
+        self.purge()
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job is None and self.store is not None:
+            row = self.store.load(job_id)
+            if row:
+                job = RemoteJob(self.store, row)
+        return job
+
+    def cancel(self, job_id):
+        """Demande l'annulation (effective au prochain point de contrôle du worker propriétaire)."""
+        job = self.get(job_id)
+        if job and job.state not in FINISHED_STATES:
+            if self.store is not None:
+                self.store.request_cancel(job_id)
+            if isinstance(job, AnalysisJob):
+                job.cancel_event.set()
+        return job
+
+    def list(self):
+        self.purge()
+        if self.store is not None:
+            rows = self.store.load_all()
+            with self.lock:
+                return [self.jobs.get(row['id']) or RemoteJob(self.store, row) for row in rows]
+        with self.lock:
+            return sorted(self.jobs.values(), key=lambda j: j.created_at, reverse=True)
+
+    def purge(self):
+        """Oublie les jobs terminés depuis plus longtemps que la durée de rétention."""
+        limit = time.time() - self.retention
+        with self.lock:
+            expired = [
+                job_id for job_id, job in self.jobs.items()
+                if job.state in FINISHED_STATES and job.finished_at and job.finished_at < limit
+            ]
+            for job_id in expired:
+                del self.jobs[job_id]
+        if self.store is not None:
+            try:
+                self.store.purge(self.retention)
+            except sqlite3.Error as e:
+                print(f"⚠️ [Jobs] Purge de la base des jobs impossible : {e}")
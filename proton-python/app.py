@@ -6,7 +6,7 @@ import requests
 from google import genai
 from google.genai import types
 import concurrent.futures
-from flask import Flask, render_template, request, jsonify, redirect, session, url_for
+from flask import Flask, render_template, request, jsonify, redirect, session, url_for, Response, stream_with_context
 from flask_session import Session
 import yt_dlp
 from pytubefix import YouTube
@@ -14,7 +14,11 @@ import re
 import threading
 import stripe
 import uuid
-import ast
+import bisect
+import math
+import shutil
+import subprocess
+import sqlite3
 
 
 from moviepy.video.io.VideoFileClip import VideoFileClip
@@ -25,6 +29,16 @@ app = Flask(__name__)
 # 1. CLÉS API & CONFIGURATION
 # ==============================================================================
 import settings
+import analysis_cache
+import analysis_jobs
+import ai_json
+import genai_scheduler
+import file_watcher
+import club_db
+import club_reloader
+import exercise_similarity
+import similarity_index
+import exercise_store
 
 # Récupération des clés depuis settings.py
 GOOGLE_API_KEY = settings.GOOGLE_API_KEY
@@ -71,6 +85,15 @@ GENAI_CLIENT = None
 ACTIVE_MODEL_NAME = None
 GENAI_CONFIG = None
 
+# Tous les appels Gemini du process passent par cet ordonnanceur (concurrence, quotas, backoff)
+GENAI_SCHEDULER = genai_scheduler.GeminiScheduler()
+# Estimation des tokens d'entrée : ~300 tokens/s de vidéo, ~4 caractères/token de texte
+VIDEO_TOKENS_PER_SECOND = 300
+
+def estimate_input_tokens(text, video_seconds=0):
+    """Estimation grossière des tokens d'entrée d'une requête (pour le budget TPM)."""
+    return len(text) // 4 + int(video_seconds * VIDEO_TOKENS_PER_SECOND)
+
 def configure_google_ai():
     global GENAI_CLIENT, ACTIVE_MODEL_NAME, GENAI_CONFIG
     try:
@@ -1016,70 +1039,63 @@ FORMAT DE SORTIE JSON STRICT OBLIGATOIRE :
 # ==============================================================================
 # 5. MOTEUR PARALLÈLE
 # ==============================================================================
+# Un seul thread suit le processing Google de tous les fichiers uploadés
+FILE_WATCHER = file_watcher.FileReadinessWatcher(lambda: GENAI_CLIENT, scheduler=GENAI_SCHEDULER)
+VIDEO_READY_TIMEOUT = 60
+CHUNK_READY_TIMEOUT = 45  # Moins de timeout pour les petits segments
+
+def job_progress(job, stage, done=None, total=None):
+    """Relaye la progression d'une étape au job asynchrone (sans effet en mode synchrone)."""
+    if job is not None:
+        job.update(stage, done=done, total=total)
+
+def job_event(job, event_type, data):
+    """Publie un événement sur le bus du job (ex: exercices d'un segment terminé)."""
+    if job is not None:
+        job.emit(event_type, data)
+
+def job_checkpoint(job):
+    """Point d'annulation coopératif : lève JobCancelled si le job a été annulé."""
+    if job is not None:
+        job.raise_if_cancelled()
+
 def upload_video_worker(video_path):
     """Upload une seule vidéo à Gemini et attend qu'elle soit prête."""
     print("👁️ [Thread Vision] Upload de la vidéo vers Gemini...")
     try:
-        video_file = GENAI_CLIENT.files.upload(file=video_path)
-        # Wait for processing with TIMEOUT (Safety against infinite loops)
-        start_time = time.time()
-        TIMEOUT_SECONDS = 60 # 1 minute max pour le processing
-        
-        while video_file.state == "PROCESSING":
-            elapsed = time.time() - start_time
-            print(f"⏳ [Thread Vision] Traitement vidéo Google en cours... ({int(elapsed)}s)")
-            
-            if elapsed > TIMEOUT_SECONDS:
-                print("⚠️ [Thread Vision] TIMEOUT : Le traitement Google prend trop de temps. Abandon vidéo.")
-                return None
-                
-            time.sleep(2)
-            video_file = GENAI_CLIENT.files.get(name=video_file.name)
-        
-        if video_file.state == "FAILED":
-            raise Exception("L'upload vidéo Google a échoué (Status FAILED).")
-            
+        video_file = GENAI_SCHEDULER.call(GENAI_CLIENT.files.upload, file=video_path, request_cost=0)
+        # Le watcher partagé suit le processing Google (1 minute max)
+        video_file = FILE_WATCHER.watch(video_file, timeout=VIDEO_READY_TIMEOUT, label="Vidéo").result()
+        if not video_file:
+            return None
         print(f"✅ [Thread Vision] Vidéo prête : {video_file.name}")
         return video_file
     except Exception as e:
         print(f"❌ [Thread Vision] Erreur : {e}")
         return None
-    except Exception as e:
-        print(f"❌ [Thread Vision] Erreur : {e}")
-        return None
 
 def upload_video_chunk_worker(chunk_data):
-    """Worker pour uploader un segment vidéo en parallèle."""
+    """
+    Worker pour uploader un segment vidéo en parallèle.
+    Rend la main dès l'upload terminé : l'attente du processing est confiée à FILE_WATCHER.
+    """
     idx, chunk_path, start_time_sec = chunk_data
     print(f"📤 [Chunk {idx}] Upload segment {start_time_sec}s...")
     try:
-        video_file = GENAI_CLIENT.files.upload(file=chunk_path)
-        timeout = 45  # Moins de timeout pour les petits segments
-        start = time.time()
-        
-        while video_file.state == "PROCESSING":
-            if time.time() - start > timeout:
-                print(f"⚠️ [Chunk {idx}] Timeout upload")
-                return None
-            time.sleep(1.5)
-            video_file = GENAI_CLIENT.files.get(name=video_file.name)
-        
-        if video_file.state == "FAILED":
-            return None
-            
-        print(f"✅ [Chunk {idx}] Prêt")
+        video_file = GENAI_SCHEDULER.call(GENAI_CLIENT.files.upload, file=chunk_path, request_cost=0)
         return {"idx": idx, "file": video_file, "start_sec": start_time_sec}
     except Exception as e:
         print(f"❌ [Chunk {idx}] Erreur upload: {e}")
         return None
-    except Exception as e:
-        print(f"❌ [Chunk {idx}] Erreur upload: {e}")
-        return None
 
 def analyze_video_chunk_worker(chunk_info, title, audio_text, prompt):
-    """Worker pour analyser un segment vidéo en parallèle."""
+    """
+    Worker pour analyser un segment vidéo en parallèle.
+    Retourne None en cas d'échec (429, timeout, JSON illisible) pour distinguer
+    un segment à relancer d'un segment analysé sans exercice ([]).
+    """
     if not chunk_info or not chunk_info.get("file"):
-        return []
+        return None
     
     idx = chunk_info["idx"]
     video_file = chunk_info["file"]
@@ -1094,27 +1110,32 @@ def analyze_video_chunk_worker(chunk_info, title, audio_text, prompt):
         # Mode 2026 : Utilisation explicite de types.Part pour la robustesse
         video_part = types.Part.from_uri(file_uri=video_file.uri, mime_type=video_file.mime_type)
         
-        response = GENAI_CLIENT.models.generate_content(
-            model=ACTIVE_MODEL_NAME,
-            contents=[video_part, segment_prompt],
-            config=GENAI_CONFIG
-        )
+        def send(text):
+            return GENAI_SCHEDULER.call(
+                GENAI_CLIENT.models.generate_content,
+                model=ACTIVE_MODEL_NAME,
+                contents=[video_part, text],
+                config=GENAI_CONFIG,
+                est_tokens=estimate_input_tokens(text, 125)
+            )
         
-        # Cleanup file immédiatement
         try:
-            GENAI_CLIENT.files.delete(name=video_file.name)
-        except: pass
+            response = send(segment_prompt)
+            # Réponse coupée : la suite est redemandée tant que le fichier vidéo existe encore
+            result = load_exercises(response.text, response_finish_reason(response), segment_prompt, send, f"Chunk {idx}")
+        finally:
+            # Cleanup file dès la dernière requête
+            try:
+                GENAI_SCHEDULER.call(GENAI_CLIENT.files.delete, name=video_file.name, request_cost=0)
+            except: pass
         
-        # Nettoyer la réponse IA (Thinking Process)
-        cleaned_response = clean_ai_response(response.text)
-        result = robust_json_load(cleaned_response)
+        if result is None:
+            print(f"⚠️ [Chunk {idx}] Réponse IA illisible")
+            return None
         if not result:
             return []
         
         # Ajuster les timestamps en fonction du début du segment
-        if isinstance(result, dict):
-            result = [result]
-        
         for exo in result:
             if 'start_seconds' in exo:
                 exo['start_seconds'] = exo.get('start_seconds', 0) + start_sec
@@ -1126,83 +1147,261 @@ def analyze_video_chunk_worker(chunk_info, title, audio_text, prompt):
         
     except Exception as e:
         print(f"❌ [Chunk {idx}] Erreur analyse: {e}")
-        return []
+        return None
+
+# --- MOTEUR DE DÉCOUPAGE (STREAM COPY SUR KEYFRAMES) ---
+# ffmpeg est livré avec imageio-ffmpeg (dépendance de moviepy), ffprobe est optionnel.
+try:
+    import imageio_ffmpeg
+    FFMPEG_BIN = imageio_ffmpeg.get_ffmpeg_exe()
+except Exception:
+    FFMPEG_BIN = shutil.which('ffmpeg')
+FFPROBE_BIN = shutil.which('ffprobe')
+
+# Coût estimé d'un ré-encodage libx264 ultrafast (secondes de calcul par seconde de vidéo).
+# Recalibré à chaque fois que le chemin de ré-encodage est réellement utilisé.
+SPLIT_STATS = {
+    "reencode_ratio": 0.5,
+    "videos": 0,
+    "chunks_copied": 0,
+    "chunks_reencoded": 0,
+    "seconds_saved": 0.0,
+}
+SPLIT_STATS_LOCK = threading.Lock()
 
-def split_video_into_chunks(video_path, chunk_duration=120, overlap=5):
-    """Découpe une vidéo en segments avec chevauchement."""
-    chunks = []
+def probe_video_duration(video_path):
+    """Durée de la vidéo en secondes (ffprobe si dispo, sinon moviepy)."""
+    if FFPROBE_BIN:
+        try:
+            out = subprocess.run(
+                [FFPROBE_BIN, '-v', 'error', '-show_entries', 'format=duration',
+                 '-of', 'default=noprint_wrappers=1:nokey=1', video_path],
+                capture_output=True, text=True, timeout=30
+            )
+            return float(out.stdout.strip())
+        except Exception as e:
+            print(f"⚠️ ffprobe durée indisponible ({e}), bascule moviepy")
+
+    clip = VideoFileClip(video_path)
     try:
-        clip = VideoFileClip(video_path)
-        duration = clip.duration
-        
+        return clip.duration
+    finally:
+        clip.close()
+
+def probe_keyframes(video_path):
+    """Liste triée des timestamps (s) des keyframes de la piste vidéo principale."""
+    try:
+        if FFPROBE_BIN:
+            # Lecture des paquets uniquement (aucun décodage) : flag 'K' = keyframe
+            out = subprocess.run(
+                [FFPROBE_BIN, '-v', 'error', '-select_streams', 'v:0',
+                 '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', video_path],
+                capture_output=True, text=True, timeout=120
+            )
+            keyframes = []
+            for line in out.stdout.splitlines():
+                pts, _, flags = line.partition(',')
+                if 'K' in flags and pts not in ('', 'N/A'):
+                    keyframes.append(float(pts))
+            return sorted(set(keyframes))
+
+        if FFMPEG_BIN:
+            # Sans ffprobe : ffmpeg ne décode que les keyframes et showinfo donne leurs pts
+            out = subprocess.run(
+                [FFMPEG_BIN, '-hide_banner', '-nostats', '-skip_frame', 'nokey', '-i', video_path,
+                 '-map', '0:v:0', '-vf', 'showinfo', '-f', 'null', '-'],
+                capture_output=True, text=True, timeout=300
+            )
+            keyframes = [float(m) for m in re.findall(r'pts_time:\s*([\d.]+)', out.stderr)]
+            return sorted(set(keyframes))
+    except Exception as e:
+        print(f"⚠️ Lecture des keyframes impossible : {e}")
+    return []
+
+def plan_video_chunks(duration, keyframes, chunk_duration=120, overlap=5):
+    """
+    Calcule les bornes (idx, start, end) des segments.
+    Le début de chaque segment est recalé sur la keyframe qui le précède (coupe sans ré-encodage),
+    ce qui ne fait qu'agrandir le chevauchement avec le segment précédent.
+    """
+    plan = []
+    idx = 0
+    nominal = 0.0
+    prev_start = -1.0
+    while nominal < duration:
+        end = min(nominal + chunk_duration, duration)
+        start = nominal
+        if keyframes:
+            pos = bisect.bisect_right(keyframes, nominal + 1e-3) - 1
+            if pos >= 0:
+                start = keyframes[pos]
+        if plan and start <= prev_start:
+            # GOP plus long que l'avancée : on prolonge le segment précédent
+            plan[-1] = (plan[-1][0], prev_start, end)
+        elif start < end:
+            plan.append((idx, start, end))
+            prev_start = start
+            idx += 1
+        nominal = nominal + chunk_duration - overlap
+    return plan
+
+def cut_chunk_stream_copy(video_path, out_path, start, end):
+    """Extrait [start, end] sans décodage (remux). Retourne True si le segment est exploitable."""
+    if not FFMPEG_BIN:
+        return False
+    # Arrondi au ms supérieur : le seek d'entrée retombe sur la keyframe visée, pas sur la précédente
+    ss = math.ceil(start * 1000) / 1000
+    cmd = [
+        FFMPEG_BIN, '-hide_banner', '-loglevel', 'error', '-y',
+        '-ss', f"{ss:.3f}", '-i', video_path, '-t', f"{end - ss:.3f}",
+        '-map', '0:v:0', '-map', '0:a:0?', '-c', 'copy',
+        '-avoid_negative_ts', 'make_zero', '-movflags', '+faststart',
+        out_path
+    ]
+    try:
+        res = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+    except Exception as e:
+        print(f"⚠️ Stream copy impossible : {e}")
+        return False
+    if res.returncode != 0 or not os.path.exists(out_path) or os.path.getsize(out_path) == 0:
+        print(f"⚠️ Conteneur non remuxable ({res.stderr.strip()[:200]}), bascule ré-encodage")
+        try: os.remove(out_path)
+        except: pass
+        return False
+    return True
+
+def cut_chunk_reencode(clip, out_path, start, end):
+    """Chemin historique : décodage + ré-encodage libx264/aac via moviepy."""
+    sub_clip = clip.subclipped(start, end)
+    sub_clip.write_videofile(
+        out_path,
+        codec="libx264",
+        audio_codec="aac",
+        preset="ultrafast",
+        logger=None
+    )
+    sub_clip.close()
+
+def iter_video_chunks(video_path, chunk_duration=120, overlap=5, report=None, skip=None):
+    """
+    Découpe une vidéo en segments avec chevauchement, en GÉNÉRATEUR :
+    chaque segment (idx, path, start) est produit dès qu'il est écrit sur disque.
+    Coupe en stream copy sur les keyframes ; le ré-encodage moviepy n'est utilisé
+    que pour les conteneurs qui ne se remuxent pas. `report` (dict) reçoit les temps mesurés.
+    `skip(idx, start, end)` est appelé pour chaque segment prévu : s'il renvoie True,
+    le segment n'est ni découpé ni produit (résultat déjà en cache).
+    `report` reçoit aussi `planned_chunks` (segments prévus) et, si le découpage s'interrompt,
+    `unsplit_chunks` (indices prévus jamais produits) ; `whole_video` si la vidéo entière est
+    produite en repli faute d'avoir pu découper quoi que ce soit.
+    """
+    if report is None:
+        report = {}
+    handled = set()   # Segments produits ou repris du cache
+    plan = []
+    pending = None    # Segment en cours d'écriture (encore à nous, pas au consommateur)
+    clip = None
+    try:
+        duration = probe_video_duration(video_path)
+
         if duration <= chunk_duration + 10:
             # Vidéo courte, pas besoin de découper
-            clip.close()
-            return [(0, video_path, 0)]  # (idx, path, start_time)
-        
+            report["planned_chunks"] = 1
+            handled.add(0)
+            if skip and skip(0, 0.0, duration):
+                return
+            yield (0, video_path, 0)  # (idx, path, start_time)
+            return
+
         print(f"✂️ Découpage vidéo : {int(duration)}s en segments de {chunk_duration}s (overlap: {overlap}s)")
-        
-        idx = 0
-        start = 0
+
+        split_start = time.time()
+        keyframes = probe_keyframes(video_path)
+        plan = plan_video_chunks(duration, keyframes, chunk_duration, overlap)
+        report["planned_chunks"] = len(plan)
+        if not keyframes:
+            print("⚠️ Aucune keyframe lisible : découpage par ré-encodage")
+
         request_id = str(uuid.uuid4())[:8]  # ID unique pour éviter les collisions en parallèle
-        while start < duration:
-            end = min(start + chunk_duration, duration)
+        copied = 0
+        reencoded_seconds = 0.0
+        reencode_elapsed = 0.0
+        waiting = 0.0  # Temps passé chez le consommateur (hors découpage)
+        for idx, start, end in plan:
+            if skip and skip(idx, start, end):
+                handled.add(idx)
+                continue
             chunk_filename = f"{TEMP_FOLDER}/chunk_{request_id}_{idx}.mp4"
-            
-            sub_clip = clip.subclipped(start, end)
-            sub_clip.write_videofile(
-                chunk_filename,
-                codec="libx264",
-                audio_codec="aac",
-                preset="ultrafast",
-                logger=None
-            )
-            sub_clip.close()
-            
-            chunks.append((idx, chunk_filename, int(start)))
+            pending = chunk_filename
+
+            if not (keyframes and cut_chunk_stream_copy(video_path, chunk_filename, start, end)):
+                t0 = time.time()
+                if clip is None:
+                    clip = VideoFileClip(video_path)
+                cut_chunk_reencode(clip, chunk_filename, start, end)
+                reencode_elapsed += time.time() - t0
+                reencoded_seconds += end - start
+            else:
+                copied += 1
+
             print(f"   📎 Segment {idx}: {int(start)}s → {int(end)}s")
-            
-            # Prochaine position avec overlap
-            start = start + chunk_duration - overlap
-            idx += 1
-        
-        clip.close()
-        return chunks
-        
+            t0 = time.time()
+            handled.add(idx)
+            pending = None  # Le consommateur supprime le segment après l'upload
+            yield (idx, chunk_filename, int(start))
+            waiting += time.time() - t0
+
+        elapsed = time.time() - split_start - waiting
+        with SPLIT_STATS_LOCK:
+            if reencoded_seconds > 0:
+                # Recalibrage (moyenne glissante) du coût réel d'un ré-encodage
+                measured = reencode_elapsed / reencoded_seconds
+                SPLIT_STATS["reencode_ratio"] = 0.7 * SPLIT_STATS["reencode_ratio"] + 0.3 * measured
+            covered = sum(end - start for _, start, end in plan)
+            estimated = covered * SPLIT_STATS["reencode_ratio"]
+            saved = max(0.0, estimated - elapsed)
+            SPLIT_STATS["videos"] += 1
+            SPLIT_STATS["chunks_copied"] += copied
+            SPLIT_STATS["chunks_reencoded"] += len(plan) - copied
+            SPLIT_STATS["seconds_saved"] += saved
+
+        print(f"⏱️ Découpage en {elapsed:.1f}s ({copied}/{len(plan)} en stream copy) "
+              f"— ré-encodage complet estimé {estimated:.1f}s, gain ~{saved:.1f}s")
+        report.update({
+            "elapsed": elapsed,
+            "chunks": len(plan),
+            "copied": copied,
+            "estimated_reencode": estimated,
+            "saved": saved,
+        })
+
     except Exception as e:
         print(f"❌ Erreur découpage vidéo: {e}")
-        return [(0, video_path, 0)]  # Fallback: vidéo entière
+        if pending is not None:
+            # Segment à moitié écrit : inutilisable
+            try: os.remove(pending)
+            except OSError: pass
+        if not handled:
+            report.update({"planned_chunks": 1, "whole_video": True})
+            yield (0, video_path, 0)  # Fallback: vidéo entière
+        else:
+            # Les segments restants ne seront jamais analysés : le consommateur doit le savoir
+            report["unsplit_chunks"] = [idx for idx, _, _ in plan if idx not in handled]
+            print(f"⚠️ {len(report['unsplit_chunks'])} segment(s) non découpé(s) : analyse partielle")
+    finally:
+        if clip is not None:
+            clip.close()
+
+def split_video_into_chunks(video_path, chunk_duration=120, overlap=5, report=None):
+    """Découpe une vidéo en segments avec chevauchement (liste complète)."""
+    return list(iter_video_chunks(video_path, chunk_duration, overlap, report))
 
 def deduplicate_exercises(all_exercises):
-    """Fusionne les exercices détectés en évitant les doublons proches."""
+    """Fusionne les exercices détectés en évitant les doublons proches (MinHash/LSH, voir exercise_similarity)."""
     if len(all_exercises) <= 1:
         return all_exercises
     
-    # Tri par timestamp
-    sorted_exos = sorted(all_exercises, key=lambda x: x.get('start_seconds', 0))
-    
-    unique = []
-    for exo in sorted_exos:
-        ts = exo.get('start_seconds', 0)
-        summary = exo.get('summary', '').lower()
-        
-        # Vérifier si un exercice similaire existe déjà (proche en temps et nom similaire)
-        is_duplicate = False
-        for existing in unique:
-            existing_ts = existing.get('start_seconds', 0)
-            existing_summary = existing.get('summary', '').lower()
-            
-            # Si moins de 60s d'écart ET 40%+ de mots en commun = doublon probable
-            # (On élargit la fenêtre pour capter les répétitions et variantes vues comme nouveaux exos)
-            if abs(ts - existing_ts) < 60:
-                words1 = set(summary.split())
-                words2 = set(existing_summary.split())
-                if len(words1 & words2) > len(words1) * 0.4:
-                    is_duplicate = True
-                    break
-        
-        if not is_duplicate:
-            unique.append(exo)
+    # Quasi-doublons : titre, synopsis et matériel proches, à moins de 60s d'écart -> meilleure variante gardée
+    unique = exercise_similarity.deduplicate(all_exercises)
     
     print(f"🔄 Dédoublonnage: {len(all_exercises)} → {len(unique)} exercices")
     return unique
@@ -1214,19 +1413,23 @@ def clean_ai_response(response_text):
     cleaned_json = re.sub(r'<thinking_process>.*?</thinking_process>', '', response_text, flags=re.DOTALL)
     return cleaned_json.strip()
 
-def smart_split_and_process(video_path, title):
+def smart_split_and_process(video_path, title, content_hash=None, reuse_chunks=True, report=None, job=None):
     """
     Traitement intelligent avec DÉCOUPAGE VIDÉO PARALLÈLE pour les longues vidéos.
     - Vidéos courtes (<3min): Upload unique + analyse (comportement actuel)
-    - Vidéos longues (>=3min): Découpage en segments 2min + analyse parallèle + dédoublonnage
+    - Vidéos longues (>=3min): Découpage en segments 2min en flux (chaque segment est uploadé
+      dès son écriture, puis analysé dès que son fichier Gemini est ACTIVE) + dédoublonnage
+    Avec `content_hash`, chaque segment réussi est mis en cache et, si `reuse_chunks`, les segments
+    déjà analysés sont réutilisés (mode reprise : seuls les segments manquants sont relancés).
+    `report` (dict) reçoit le nombre de segments prévus (`planned_chunks`), analysés avec succès
+    ou repris du cache (`analysed_chunks`) et en échec (`missing_chunks`).
+    `job` (AnalysisJob) reçoit la progression par étape et peut annuler le traitement.
     """
     full_text_data = ""
     
     # D'abord, obtenir la durée de la vidéo
     try:
-        clip = VideoFileClip(video_path)
-        duration = clip.duration
-        clip.close()
+        duration = probe_video_duration(video_path)
     except Exception as e:
         print(f"❌ Erreur lecture vidéo: {e}")
         return []
@@ -1243,49 +1446,157 @@ def smart_split_and_process(video_path, title):
             # MODE PARALLÈLE (Vidéos >= 3 minutes)
             # ============================================================
             print("🚀 MODE TURBO: Analyse parallèle activée!")
+            pipeline_start = time.time()
+            version = current_analysis_version()
             
-            # 1. Découper la vidéo en segments de 2 min avec 3s d'overlap
-            video_chunks = split_video_into_chunks(video_path, chunk_duration=120, overlap=3)
+            # Pipeline en flux : découpe → upload → analyse, chaque segment avance dès qu'il est prêt
+            video_chunks = []
+            upload_futures = {}
+            ready_futures = {}
+            analysis_futures = {}
+            all_exercises = []
+            chunk_bounds = {}
+            reused_chunks = []
+            uploads_done = [0]
+            split_report = {}
             
-            # 2. Lancer tous les uploads vidéo en parallèle
-            print(f"📤 Upload de {len(video_chunks)} segments vidéo en parallèle sur Gemini...")
-            upload_futures = [executor.submit(upload_video_chunk_worker, chunk) for chunk in video_chunks]
+            def reuse_cached_chunk(idx, start, end):
+                """Segment déjà analysé pour ce contenu ? On reprend son résultat sans le redécouper."""
+                chunk_bounds[idx] = (start, end - start)
+                if not content_hash or not reuse_chunks:
+                    return False
+                cached = ANALYSIS_CACHE.get_chunk(content_hash, start, end - start, version)
+                if cached is None:
+                    return False
+                all_exercises.extend(cached)
+                reused_chunks.append(idx)
+                job_event(job, 'exercises', {"chunk": idx, "cached": True, "exercises": cached})
+                return True
             
-            # 3. Attendre les uploads vidéo
-            uploaded_chunks = [f.result() for f in upload_futures]
-            valid_chunks = [c for c in uploaded_chunks if c is not None]
+            def checkpoint():
+                """Annulation : on abandonne tout ce qui n'a pas encore démarré."""
+                if job is not None and job.cancelled:
+                    for f in list(upload_futures) + list(ready_futures) + list(analysis_futures):
+                        f.cancel()
+                    job.raise_if_cancelled()
             
-            if not valid_chunks:
+            def dispatch_uploaded(timeout):
+                """Upload terminé -> suivi par FILE_WATCHER ; fichier ACTIVE -> envoi à l'analyse."""
+                if not upload_futures and not ready_futures:
+                    return
+                done, _ = concurrent.futures.wait(
+                    list(upload_futures) + list(ready_futures),
+                    timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for f in done:
+                    if f in upload_futures:
+                        idx, path, _ = upload_futures.pop(f)
+                        try:
+                            uploaded = f.result()
+                        except Exception as e:
+                            print(f"⚠️ [Chunk {idx}] Erreur upload: {e}")
+                            uploaded = None
+                        # Le segment local n'est plus utile une fois sur Gemini
+                        if path != video_path:
+                            try: os.remove(path)
+                            except: pass
+                        uploads_done[0] += 1
+                        job_progress(job, 'upload', done=uploads_done[0])
+                        if uploaded:
+                            ready = FILE_WATCHER.watch(uploaded["file"], timeout=CHUNK_READY_TIMEOUT, label=f"Chunk {idx}")
+                            ready_futures[ready] = uploaded
+                        continue
+                    uploaded = ready_futures.pop(f)
+                    pending_file = uploaded["file"]
+                    try:
+                        uploaded["file"] = f.result()
+                    except Exception as e:
+                        # FAILED / timeout : fichier déjà supprimé par le watcher ; ici c'est l'attente qui a échoué
+                        print(f"⚠️ [Chunk {uploaded['idx']}] Attente du fichier Gemini interrompue : {e}")
+                        uploaded["file"] = None
+                        try: GENAI_SCHEDULER.call(GENAI_CLIENT.files.delete, name=pending_file.name, request_cost=0)
+                        except Exception: pass
+                    if uploaded["file"]:
+                        future = executor.submit(analyze_video_chunk_worker, uploaded, title, "", MULTI_EXERCISE_PROMPT)
+                        analysis_futures[future] = uploaded["idx"]
+                        job_progress(job, 'analyse', total=len(analysis_futures))
+            
+            with concurrent.futures.ThreadPoolExecutor(max_workers=4) as upload_executor:
+                # 1. Découper la vidéo en segments de 2 min avec 3s d'overlap, upload dès l'écriture
+                job_progress(job, 'split')
+                for chunk in iter_video_chunks(video_path, chunk_duration=120, overlap=3,
+                                               report=split_report, skip=reuse_cached_chunk):
+                    checkpoint()
+                    video_chunks.append(chunk)
+                    job_progress(job, 'split', done=len(video_chunks))
+                    upload_futures[upload_executor.submit(upload_video_chunk_worker, chunk)] = chunk
+                    dispatch_uploaded(timeout=0)
+                
+                print(f"📤 {len(video_chunks)} segments découpés en {time.time() - pipeline_start:.1f}s, fin des uploads...")
+                job_progress(job, 'split', done=len(video_chunks), total=len(video_chunks))
+                job_progress(job, 'upload', total=len(video_chunks))
+                
+                # 2. Chaque segment prêt côté Google part immédiatement en analyse
+                while upload_futures or ready_futures:
+                    checkpoint()
+                    dispatch_uploaded(timeout=1.0)
+            
+            if reused_chunks:
+                print(f"♻️ Mode reprise : {len(reused_chunks)} segment(s) déjà analysé(s), "
+                      f"{len(video_chunks)} segment(s) manquant(s) relancé(s)")
+            
+            if not analysis_futures and not reused_chunks:
                 print("❌ Aucun segment vidéo uploadé avec succès")
                 return []
             
-            print(f"✅ {len(valid_chunks)} segments prêts pour l'analyse IA")
-            
-            # 4. Analyser chaque segment en parallèle (Audio + Vidéo par Gemini)
-            print("🧠 Analyse IA (Audio+Vidéo) de tous les segments...")
-            analysis_futures = [
-                executor.submit(analyze_video_chunk_worker, chunk, title, "", MULTI_EXERCISE_PROMPT) 
-                for chunk in valid_chunks
-            ]
+            print(f"🧠 {len(analysis_futures)}/{len(video_chunks)} segments en analyse IA (Audio+Vidéo)...")
             
-            # 5. Collecter tous les résultats
-            all_exercises = []
-            for future in analysis_futures:
+            # 3. Collecter les résultats au fil de l'eau (et mettre en cache chaque segment réussi)
+            # Découpage interrompu : les segments jamais produits comptent comme des échecs
+            unsplit_chunks = split_report.get("unsplit_chunks", [])
+            for idx in unsplit_chunks:
+                job_event(job, 'chunk_failed', {"chunk": idx, "unsplit": True})
+            failed_chunks = len(video_chunks) - len(analysis_futures) + len(unsplit_chunks)
+            analyses_done = 0
+            analysed_chunks = len(reused_chunks)
+            for future in concurrent.futures.as_completed(analysis_futures):
+                checkpoint()
+                idx = analysis_futures[future]
+                analyses_done += 1
+                job_progress(job, 'analyse', done=analyses_done)
                 try:
                     result = future.result()
-                    if result:
-                        all_exercises.extend(result)
                 except Exception as e:
                     print(f"⚠️ Erreur analyse segment: {e}")
+                    result = None
+                if result is None:
+                    failed_chunks += 1
+                    job_event(job, 'chunk_failed', {"chunk": idx})
+                    continue
+                analysed_chunks += 1
+                all_exercises.extend(result)
+                job_event(job, 'exercises', {"chunk": idx, "cached": False, "exercises": result})
+                if content_hash and idx in chunk_bounds and not split_report.get("whole_video"):
+                    start, chunk_len = chunk_bounds[idx]
+                    try:
+                        ANALYSIS_CACHE.put_chunk(content_hash, start, chunk_len, version, result)
+                    except Exception as e:
+                        print(f"⚠️ [Chunk {idx}] Écriture cache impossible : {e}")
             
-            # 6. Dédoublonner les exercices
-            final_json = deduplicate_exercises(all_exercises)
+            if report is not None:
+                report.update({
+                    "missing_chunks": failed_chunks,
+                    "planned_chunks": split_report.get("planned_chunks", len(video_chunks) + len(reused_chunks)),
+                    "analysed_chunks": analysed_chunks,
+                })
+            if failed_chunks:
+                print(f"⚠️ {failed_chunks} segment(s) en échec : relancer la même vidéo ne traitera que ceux-là")
+            print(f"🏁 Pipeline segments terminé en {time.time() - pipeline_start:.1f}s")
             
-            # 7. Nettoyage des fichiers temporaires
-            for i, path, _ in video_chunks:
-                if path != video_path:  # Ne pas supprimer la vidéo originale
-                    try: os.remove(path)
-                    except: pass
+            # 4. Dédoublonner les exercices
+            job_progress(job, 'dedup')
+            final_json = deduplicate_exercises(all_exercises)
+            job_progress(job, 'dedup', done=1, total=1)
             
         else:
             # ============================================================
@@ -1294,6 +1605,7 @@ def smart_split_and_process(video_path, title):
             print("⚡ Mode rapide: Analyse directe (vidéo courte)")
             
             # Upload unique de la vidéo
+            job_progress(job, 'upload', done=0, total=1)
             vid_future = executor.submit(upload_video_worker, video_path)
             
             # Récupérer la vidéo uploadée
@@ -1302,6 +1614,8 @@ def smart_split_and_process(video_path, title):
             except Exception as e:
                 print(f"❌ Erreur récup vidéo : {e}")
                 return []
+            job_progress(job, 'upload', done=1, total=1)
+            job_checkpoint(job)
             
             if not GENAI_CLIENT or not video_file: 
                 print("❌ Echec critique : Pas de client ou pas de vidéo.")
@@ -1309,55 +1623,82 @@ def smart_split_and_process(video_path, title):
             
             # Analyse IA classique avec streaming (Audio + Vidéo par Gemini)
             print("🧠 Synthèse finale par l'IA (Yeux + Oreilles assemblés)...")
+            job_progress(job, 'analyse', done=0, total=1)
             try:
                 for attempt in range(3):
                     try:
                         print("🌊 Démarrage du stream IA...", end="", flush=True)
                         # Mode 2026 : Utilisation explicite de types.Part
                         video_part = types.Part.from_uri(file_uri=video_file.uri, mime_type=video_file.mime_type)
+                        prompt_text = MULTI_EXERCISE_PROMPT.format(raw_data=f"TITRE: {title}\nInstruction: Analyse complète (Audio + Visuel). Décris tout ce que tu vois et entends.")
                         
-                        response_stream = GENAI_CLIENT.models.generate_content_stream(
-                            model=ACTIVE_MODEL_NAME,
-                            contents=[
-                                video_part,
-                                MULTI_EXERCISE_PROMPT.format(raw_data=f"TITRE: {title}\nInstruction: Analyse complète (Audio + Visuel). Décris tout ce que tu vois et entends.")
-                            ],
-                            config=GENAI_CONFIG
-                        )
-                        
-                        full_response_text = ""
-                        for chunk in response_stream:
-                            if chunk.text:
-                                print(".", end="", flush=True)
-                                full_response_text += chunk.text
-                            else:
-                                # Mode 2026 : L'IA est en train de "réfléchir" (Thinking)
-                                print("💭", end="", flush=True)
+                        # Le créneau de l'ordonnanceur est tenu pendant toute la lecture du stream
+                        with GENAI_SCHEDULER.slot(est_tokens=estimate_input_tokens(prompt_text, duration)):
+                            response_stream = GENAI_CLIENT.models.generate_content_stream(
+                                model=ACTIVE_MODEL_NAME,
+                                contents=[video_part, prompt_text],
+                                config=GENAI_CONFIG
+                            )
+                            
+                            full_response_text = ""
+                            finish_reason = None
+                            # Chaque exercice est publié dès que son objet JSON est complet
+                            stream_parser = ai_json.IncrementalExerciseParser()
+                            streamed_exercises = []
+                            for chunk in response_stream:
+                                job_checkpoint(job)
+                                finish_reason = response_finish_reason(chunk) or finish_reason
+                                if chunk.text:
+                                    print(".", end="", flush=True)
+                                    full_response_text += chunk.text
+                                    for exo in stream_parser.feed(chunk.text):
+                                        streamed_exercises.append(exo)
+                                        print(f"\n📝 Exercice {len(streamed_exercises)} reçu : {exo.get('summary', 'Sans titre')[:50]}")
+                                        job_event(job, 'exercise', {
+                                            "index": len(streamed_exercises) - 1, "attempt": attempt, "exercise": exo
+                                        })
+                                else:
+                                    # Mode 2026 : L'IA est en train de "réfléchir" (Thinking)
+                                    print("💭", end="", flush=True)
                         print("\n✅ Stream terminé.")
                         
-                        # Nettoyer la réponse IA (Thinking Process)
-                        cleaned_response = clean_ai_response(full_response_text)
+                        def send(text):
+                            # Suite d'une réponse coupée : requête simple (pas de stream), même vidéo
+                            return GENAI_SCHEDULER.call(
+                                GENAI_CLIENT.models.generate_content,
+                                model=ACTIVE_MODEL_NAME,
+                                contents=[video_part, text],
+                                config=GENAI_CONFIG,
+                                est_tokens=estimate_input_tokens(text, duration)
+                            )
                         
-                        # Fallback : Si le nettoyage retire tout, essayer de parser direct
-                        if not cleaned_response and full_response_text:
-                            cleaned_response = full_response_text
-                            
-                        return robust_json_load(cleaned_response)
+                        # Thinking Process retiré, puis suite demandée si la réponse est tronquée
+                        parsed = load_exercises(full_response_text, finish_reason, prompt_text, send, "Vidéo")
+                        job_progress(job, 'analyse', done=1, total=1)
+                        # Le parse complet reste la référence ; les objets streamés servent de repli
+                        if not parsed and streamed_exercises:
+                            print(f"🔧 Parse final en échec, {len(streamed_exercises)} exercice(s) streamé(s) conservé(s)")
+                            parsed = streamed_exercises
+                        if report is not None:
+                            report.update({"planned_chunks": 1, "analysed_chunks": 1 if parsed else 0})
+                        return parsed
                         
                     except Exception as api_err:
-                        if "429" in str(api_err) and attempt < 2:
-                            print(f"\n⚠️ Rate Limit (429). Attente 5s (Tentative {attempt+1}/3)...")
-                            time.sleep(5)
+                        if genai_scheduler.is_retryable(api_err) and attempt < 2:
+                            # Backoff exponentiel avec jitter (ou délai suggéré par l'API)
+                            GENAI_SCHEDULER.backoff(attempt, api_err)
                             continue
                         raise api_err
                 
                 # Cleanup
                 try:
-                    if video_file: GENAI_CLIENT.files.delete(name=video_file.name)
+                    if video_file: GENAI_SCHEDULER.call(GENAI_CLIENT.files.delete, name=video_file.name, request_cost=0)
                 except: pass
                 
                 final_json = robust_json_load(full_response_text)
                 
+            except analysis_jobs.JobCancelled:
+                raise
             except Exception as e:
                 import traceback
                 traceback.print_exc()
@@ -1400,16 +1741,45 @@ def smart_split_and_process(video_path, title):
 # ROUTES
 # ==============================================================================
 TEMP_FOLDER = "temp_data"
-VIDEOS_DB = []
+
+# Bibliothèque des exercices (SQLite partagé entre workers, survit aux redémarrages)
+EXERCISE_STORE = exercise_store.ExerciseStore()
+
+# Fichiers temporaires laissés par une analyse interrompue (supprimés au-delà de cet âge)
+TEMP_FILE_MAX_AGE = 3 * 3600
+
+# Jobs d'analyse asynchrones (pool borné par worker ; état et événements partagés entre workers via SQLite)
+JOB_MANAGER = analysis_jobs.JobManager(store=analysis_jobs.JobStore())
+
+# Flux SSE simultanés par worker : chacun occupe un thread tant que le client reste connecté.
+# Servir avec des workers threadés ou gevent (ex. gunicorn -k gthread --threads 16, ou -k gevent),
+# jamais des workers sync ; au-delà de la limite, 503 et le client interroge GET /api/jobs/<id>.
+SSE_MAX_STREAMS = int(os.environ.get('ANALYSIS_SSE_MAX_STREAMS', 8))
+SSE_STREAMS = threading.BoundedSemaphore(SSE_MAX_STREAMS)
+
+# Cache persistant des analyses (clé : URL normalisée / hash du fichier + version modèle/prompt)
+ANALYSIS_CACHE = analysis_cache.AnalysisCache()
+
+# Index persistant des quasi-doublons de la bibliothèque (même exercice extrait de plusieurs vidéos)
+SIMILARITY_INDEX = similarity_index.SimilarityIndex()
+
+def current_analysis_version():
+    """Version d'analyse courante : modèle actif + hash du prompt multi-exercices."""
+    return analysis_cache.analysis_version(ACTIVE_MODEL_NAME, MULTI_EXERCISE_PROMPT)
 
 if not os.path.exists(TEMP_FOLDER): os.makedirs(TEMP_FOLDER)
 
-def cleanup_temp_folder():
-    """Nettoie tous les fichiers temporaires du dossier temp_data."""
+def cleanup_temp_folder(max_age=None):
+    """
+    Nettoie les fichiers temporaires du dossier temp_data.
+    Avec `max_age` (s), seuls les fichiers plus anciens sont supprimés (analyses en cours préservées).
+    """
     try:
         for filename in os.listdir(TEMP_FOLDER):
             filepath = os.path.join(TEMP_FOLDER, filename)
             if os.path.isfile(filepath):
+                if max_age is not None and time.time() - os.path.getmtime(filepath) < max_age:
+                    continue
                 try:
                     os.remove(filepath)
                     print(f"🗑️ Supprimé: {filename}")
@@ -1421,119 +1791,70 @@ def cleanup_temp_folder():
 # Nettoyage au démarrage
 cleanup_temp_folder()
 
-import ast
-
 def robust_json_load(text):
-    """Essaye d'extraire et de charger du JSON de manière indestructible (5 Tiers)."""
-    if not text: return None
-    
-    # 1. Nettoyage initial 
-    clean = re.sub(r'```json\s*', '', text, flags=re.IGNORECASE)
-    # Enlever le dernier ``` s'il existe (fin de bloc markdown)
-    clean = re.sub(r'```\s*$', '', clean)
-    
-    # 2. Extraction du bloc probable
-    s_arr = clean.find('[')
-    e_arr = clean.rfind(']') + 1
-    s_obj = clean.find('{')
-    e_obj = clean.rfind('}') + 1
-    
-    raw_block = ""
-    if s_arr != -1 and (s_obj == -1 or s_arr < s_obj):
-        raw_block = clean[s_arr:e_arr]
-    elif s_obj != -1:
-        raw_block = clean[s_obj:e_obj]
-    else:
-        raw_block = clean
-
-    # --- TIER 1 : Standard ---
-    try:
-        return json.loads(raw_block, strict=False)
-    except:
-        pass
-
-    # --- TIER 2 : Réparation des newlines et guillemets dans les valeurs ---
-    try:
-        # Remplacer les vrais retours à la ligne dans les strings par \n
-        # Pattern : trouver les contenus entre guillemets et échapper les newlines
-        def escape_newlines(m):
-            content = m.group(1)
-            content = content.replace('\n', '\\n').replace('\r', '')
-            return '"' + content + '"'
-        
-        repaired = re.sub(r'"((?:[^"\\]|\\.)*)"', escape_newlines, raw_block, flags=re.DOTALL)
-        repaired = re.sub(r',\s*([\]}])', r'\1', repaired)  # Virgules trailing
-        return json.loads(repaired, strict=False)
-    except:
-        pass
-
-    # --- TIER 3 : Fallback AST ---
-    try:
-        python_str = raw_block.replace('null', 'None').replace('true', 'True').replace('false', 'False')
-        return ast.literal_eval(python_str)
-    except:
-        pass
+    """JSON de la réponse IA, réparé en une seule passe si besoin (voir ai_json.parse_tolerant)."""
+    result, repairs = ai_json.parse_tolerant(text)
+    if repairs:
+        print(f"🔧 JSON réparé ({', '.join(repairs)})")
+    return result
+
+# Suites demandées au plus quand une réponse d'analyse est coupée (max_output_tokens atteint)
+MAX_CONTINUATIONS = 2
+CONTINUATION_MARKER = "SUITE DE RÉPONSE"
+
+def response_finish_reason(response):
+    """Motif de fin du premier candidat ('STOP', 'MAX_TOKENS'...), ou None."""
+    candidates = getattr(response, 'candidates', None) or []
+    if not candidates:
+        return None
+    reason = getattr(candidates[0], 'finish_reason', None)
+    return getattr(reason, 'name', reason)
 
-    # --- TIER 4 : Extraction MULTI-EXERCICE par Regex ---
-    # Cherche TOUS les objets {} dans le bloc
-    try:
-        keys = ["summary", "video_description", "synopsis", "themes", "duree_totale", 
-                "timing_detail_pro", "cat_range", "level_range", "materiel_detail", 
-                "dimensions", "nb_joueurs_exact", "start_seconds"]
-        
-        all_exercises = []
-        
-        # Trouver tous les objets indépendants
-        depth = 0
-        start_idx = -1
-        for i, char in enumerate(raw_block):
-            if char == '{':
-                if depth == 0:
-                    start_idx = i
-                depth += 1
-            elif char == '}':
-                depth -= 1
-                if depth == 0 and start_idx != -1:
-                    obj_str = raw_block[start_idx:i+1]
-                    
-                    extracted = {}
-                    for k in keys:
-                        # Pattern pour extraire les valeurs (gère les multilignes)
-                        if k == "themes":
-                            match = re.search(r'"themes"\s*:\s*\[(.*?)\]', obj_str, re.DOTALL)
-                            if match:
-                                themes_str = match.group(1).replace('"', '').replace("'", "")
-                                extracted[k] = [t.strip() for t in themes_str.split(',') if t.strip()]
-                        else:
-                            # Cherche jusqu'à la prochaine clé ou fin d'objet
-                            pattern = rf'"{k}"\s*:\s*"((?:[^"\\]|\\.)*?)"'
-                            match = re.search(pattern, obj_str, re.DOTALL)
-                            if match:
-                                val = match.group(1).replace('\\"', '"').replace('\\n', '\n').strip()
-                                extracted[k] = val
-                    
-                    if extracted.get('summary'):
-                        all_exercises.append(extracted)
-                    
-                    start_idx = -1
-        
-        if all_exercises:
-            print(f"🔧 Récupération réussie : {len(all_exercises)} exercice(s) extrait(s)")
-            return all_exercises
-            
-    except Exception as e:
-        print(f"❌ Echec Tier 4 : {e}")
+def continuation_prompt(prompt, exercises):
+    """Prompt d'origine + liste des exercices déjà reçus : le modèle ne renvoie que la suite."""
+    done = "\n".join(f"- {exo.get('summary', 'Sans titre')} (début {exo.get('start_seconds', '?')}s)" for exo in exercises)
+    return (f"{prompt}\n\n{CONTINUATION_MARKER} : ta réponse précédente a été coupée (limite de longueur). "
+            f"Exercices déjà extraits :\n{done}\n"
+            "Renvoie UNIQUEMENT le tableau JSON des exercices suivants, au même format, sans répéter ceux-ci. "
+            "Reste concis pour tenir dans la limite.")
 
-    # --- TIER 5 : Dernier recours - extraction minimale ---
-    try:
-        # Juste chercher le premier "summary" et construire un objet minimal
-        summary_match = re.search(r'"summary"\s*:\s*"([^"]+)"', raw_block)
-        if summary_match:
-            return [{"summary": summary_match.group(1), "synopsis": "Exercice extrait (données partielles)", "themes": ["TECHNIQUE"]}]
-    except:
-        pass
+def exercise_key(exo):
+    return (str(exo.get('summary', '')).strip().lower(), exo.get('start_seconds'))
 
-    return None
+def load_exercises(text, finish_reason, prompt, send, label):
+    """
+    Exercices d'une réponse d'analyse. Si elle est tronquée (MAX_TOKENS ou JSON non refermé),
+    `send(prompt)` redemande au modèle les exercices restants (MAX_CONTINUATIONS fois au plus)
+    et les morceaux sont recollés avant le dédoublonnage.
+    Rend None si la première réponse est illisible.
+    """
+    result, repairs = ai_json.parse_tolerant(clean_ai_response(text) or text)
+    if repairs:
+        print(f"🔧 [{label}] JSON réparé ({', '.join(repairs)})")
+    if result is None:
+        return None
+    exercises = [result] if isinstance(result, dict) else [exo for exo in result if isinstance(exo, dict)]
+    truncated = finish_reason == 'MAX_TOKENS' or 'truncated' in repairs
+    for _ in range(MAX_CONTINUATIONS):
+        if not truncated:
+            break
+        print(f"✂️ [{label}] Réponse tronquée après {len(exercises)} exercice(s), demande de la suite...")
+        try:
+            response = send(continuation_prompt(prompt, exercises))
+        except Exception as e:
+            print(f"⚠️ [{label}] Suite non obtenue : {e}")
+            break
+        more, repairs = ai_json.parse_tolerant(clean_ai_response(response.text) or response.text or '')
+        if isinstance(more, dict):
+            more = [more]
+        seen = {exercise_key(exo) for exo in exercises}
+        new = [exo for exo in more or [] if isinstance(exo, dict) and exercise_key(exo) not in seen]
+        if not new:
+            break
+        exercises.extend(new)
+        print(f"🧩 [{label}] {len(new)} exercice(s) récupéré(s) par continuation")
+        truncated = response_finish_reason(response) == 'MAX_TOKENS' or 'truncated' in repairs
+    return exercises
 
 @app.route('/')
 def home(): 
@@ -1544,16 +1865,40 @@ def home():
                            features=FEATURE_FLAGS, 
                            dev_mode=is_preview)
 
-@app.route('/add_video', methods=['POST'])
-def add_video():
-    url = request.json.get('url')
-    if not url: return jsonify({"error": "Lien vide"}), 400
-
-    # 🗑️ Nettoyage des anciens fichiers temporaires avant le nouveau téléchargement
-    cleanup_temp_folder()
-
-    print(f"\n🎬 DÉMARRAGE TURBO : {url}")
-    print(f"\n🎬 DÉMARRAGE TURBO : {url}")
+def register_exercises(exercises_list, title, thumbnail, url):
+    """
+    Crée les entrées bibliothèque pour une liste d'exercices analysés (une seule transaction).
+    Elles remplacent celles déjà enregistrées pour la même URL : reprendre une analyse partielle
+    (ou la relire depuis le cache) ne duplique pas les exercices de la vidéo.
+    """
+    removed, new_entries = EXERCISE_STORE.replace_link(
+        url, ((exo.get('summary', title), thumbnail, exo) for exo in exercises_list)
+    )
+    if removed:
+        print(f"♻️ {len(removed)} exercice(s) précédemment enregistré(s) pour cette vidéo remplacé(s)")
+    try:
+        for vid_id in removed:
+            SIMILARITY_INDEX.remove(vid_id)
+        clusters = SIMILARITY_INDEX.add_many((entry['id'], entry['data']) for entry in new_entries)
+        EXERCISE_STORE.set_clusters(clusters)
+        known = sum(1 for vid_id, cluster_id in clusters.items() if cluster_id != vid_id)
+        if known:
+            print(f"🔁 {known} exercice(s) déjà présent(s) en bibliothèque sous une autre variante")
+    except sqlite3.Error as e:
+        print(f"⚠️ Groupes de quasi-doublons non mis à jour : {e}")
+    return new_entries
+
+class VideoAnalysisError(Exception):
+    """Erreur d'analyse à renvoyer telle quelle au client (message + code HTTP)."""
+    def __init__(self, message, status=500):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+def download_video(url):
+    """Télécharge la vidéo dans TEMP_FOLDER. Retourne (path, title, thumbnail)."""
+    # Suffixe aléatoire : plusieurs jobs peuvent télécharger dans la même seconde
+    unique_filename = f"vid_{int(time.time())}_{uuid.uuid4().hex[:6]}"
     try:
         # HYBRID SYSTEM: Pytube for YouTube (Top 720p/480p), yt-dlp for others
         if "youtube.com" in url or "youtu.be" in url:
@@ -1576,14 +1921,13 @@ def add_video():
                 stream = yt.streams.filter(file_extension='mp4').order_by('resolution').desc().first()
             
             if not stream:
-                return jsonify({"error": "Vidéo introuvable ou illisible."}), 400
+                raise VideoAnalysisError("Vidéo introuvable ou illisible.", 400)
                 
-            path = stream.download(output_path=TEMP_FOLDER, filename=f"vid_{int(time.time())}.mp4")
+            path = stream.download(output_path=TEMP_FOLDER, filename=f"{unique_filename}.mp4")
             
         else:
             print("⬇️ Mode Multi-Plateforme (Max 720p)...")
             # yt-dlp gère le fallback automatiquement avec <=
-            unique_filename = f"vid_{int(time.time())}"
             ydl_opts = {
                 'format': 'best[height<=720]',
                 'outtmpl': f'{TEMP_FOLDER}/{unique_filename}.%(ext)s',
@@ -1615,106 +1959,319 @@ def add_video():
                 if not thumbnail:
                     thumbnail = "https://images.unsplash.com/photo-1579952363873-27f3bade9f55?q=80&w=1000&auto=format&fit=crop"
 
+    except VideoAnalysisError:
+        raise
     except Exception as e: 
         print(f"❌ Erreur téléchargement : {e}")
-        return jsonify({"error": str(e)}), 500
+        raise VideoAnalysisError(str(e), 500)
 
-    exercises_list = smart_split_and_process(path, title)
-    
-    try: os.remove(path)
-    except: pass
+    return path, title, thumbnail
+
+def analyze_video_url(url, use_cache=True, job=None):
+    """
+    Chaîne complète : cache → téléchargement → analyse → enregistrement.
+    Retourne les nouvelles entrées de la bibliothèque, lève VideoAnalysisError sinon.
+    """
+    version = current_analysis_version()
+    url_key = analysis_cache.normalize_video_url(url)
+
+    if use_cache:
+        cached = ANALYSIS_CACHE.get_by_url(url_key, version)
+        if cached:
+            print(f"⚡ Cache analyse (URL) : {url_key} → {len(cached['exercises'])} exercice(s)")
+            return register_exercises(cached['exercises'], cached['title'], cached['thumbnail'], url)
+
+    # 🗑️ Nettoyage des fichiers temporaires orphelins (sans toucher aux analyses en cours)
+    cleanup_temp_folder(max_age=TEMP_FILE_MAX_AGE)
+
+    print(f"\n🎬 DÉMARRAGE TURBO : {url}")
+    job_progress(job, 'download')
+    path, title, thumbnail = download_video(url)
+    job_progress(job, 'download', done=1, total=1)
+
+    try:
+        job_checkpoint(job)
+
+        content_hash = None
+        try:
+            content_hash = analysis_cache.file_sha256(path)
+        except Exception as e:
+            print(f"⚠️ Hash vidéo impossible : {e}")
+
+        if use_cache and content_hash:
+            cached = ANALYSIS_CACHE.get_by_hash(content_hash, version, url_key)
+            if cached:
+                print(f"⚡ Cache analyse (contenu) : {content_hash[:12]} → {len(cached['exercises'])} exercice(s)")
+                return register_exercises(cached['exercises'], title, thumbnail, url)
+
+        analysis_report = {}
+        exercises_list = smart_split_and_process(
+            path, title, content_hash=content_hash, reuse_chunks=use_cache, report=analysis_report, job=job
+        )
+    finally:
+        try: os.remove(path)
+        except: pass
     
-    new_entries = []
     if exercises_list:
         # CHECK FOOTBALL VERIFICATION
         if isinstance(exercises_list, list) and len(exercises_list) > 0 and 'error' in exercises_list[0]:
              if exercises_list[0]['error'] == 'NOT_FOOTBALL':
-                 return jsonify({"error": "Vous devez renseigner une vidéo de football."}), 400
-
-        for i, exo in enumerate(exercises_list):
-            entry = {
-                "id": int(time.time() * 1000) + i, # ID unique
-                "title": exo.get('summary', title),
-                "thumbnail": thumbnail,
-                "link": url,
-                "data": exo
-            }
-            VIDEOS_DB.append(entry)
-            new_entries.append(entry)
-        
-        return jsonify(new_entries)
+                 raise VideoAnalysisError("Vous devez renseigner une vidéo de football.", 400)
+
+        # Seule une analyse complète est mise en cache : une analyse partielle sera reprise segment par segment.
+        # Complète = chaque segment du plan de découpage analysé, pas seulement aucun échec compté
+        complete = (analysis_report.get("planned_chunks") is not None
+                    and analysis_report.get("analysed_chunks", 0) >= analysis_report["planned_chunks"]
+                    and not analysis_report.get("missing_chunks"))
+        if content_hash and complete:
+            try:
+                ANALYSIS_CACHE.put(url_key, content_hash, version, title, thumbnail, exercises_list)
+            except Exception as e:
+                print(f"⚠️ Écriture cache analyse impossible : {e}")
+
+        return register_exercises(exercises_list, title, thumbnail, url)
     
-    return jsonify({"error": "Echec Analyse ou Vidéo vide"}), 500
+    raise VideoAnalysisError("Echec Analyse ou Vidéo vide", 500)
+
+@app.route('/add_video', methods=['POST'])
+def add_video():
+    data = request.json or {}
+    url = data.get('url')
+    if not url: return jsonify({"error": "Lien vide"}), 400
+
+    # Contournement du cache par requête : {"no_cache": true} ou ?cache=0
+    use_cache = not (data.get('no_cache') or request.args.get('cache') == '0')
+    try:
+        return jsonify(analyze_video_url(url, use_cache=use_cache))
+    except VideoAnalysisError as e:
+        return jsonify({"error": e.message}), e.status
+
+# --- JOBS D'ANALYSE ASYNCHRONES ---
+@app.route('/api/jobs', methods=['POST'])
+def submit_analysis_job():
+    """Soumet une analyse : réponse immédiate avec l'id du job (202)."""
+    data = request.json or {}
+    url = data.get('url')
+    if not url: return jsonify({"error": "Lien vide"}), 400
+
+    use_cache = not (data.get('no_cache') or request.args.get('cache') == '0')
+    try:
+        job = JOB_MANAGER.submit(lambda job: analyze_video_url(url, use_cache=use_cache, job=job), url)
+    except analysis_jobs.QueueFull as e:
+        return jsonify({"error": f"Serveur saturé ({e}), réessayez plus tard."}), 503
+
+    print(f"📥 [Job {job.id[:8]}] En file : {url}")
+    return jsonify({"job_id": job.id, "state": job.state, "status_url": url_for('get_analysis_job', job_id=job.id)}), 202
+
+@app.route('/api/jobs', methods=['GET'])
+def list_analysis_jobs():
+    return jsonify([job.to_dict(include_result=False) for job in JOB_MANAGER.list()])
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_analysis_job(job_id):
+    job = JOB_MANAGER.get(job_id)
+    if not job: return jsonify({"error": "Job introuvable"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def stream_analysis_job(job_id):
+    """
+    Flux Server-Sent Events du job : progression par étape, exercices partiels
+    au fil des segments, puis état final. Reprise possible via Last-Event-ID.
+    La connexion garde un thread du worker (workers threadés / gevent requis) : au-delà de
+    SSE_MAX_STREAMS flux par worker, 503 avec l'URL de polling (status_url).
+    """
+    job = JOB_MANAGER.get(job_id)
+    if not job: return jsonify({"error": "Job introuvable"}), 404
+
+    if not SSE_STREAMS.acquire(blocking=False):
+        response = jsonify({
+            "error": "Trop de flux en cours, suivre le job par polling",
+            "status_url": url_for('get_analysis_job', job_id=job_id),
+        })
+        response.headers['Retry-After'] = '2'
+        return response, 503
+
+    try:
+        last_id = int(request.headers.get('Last-Event-ID', request.args.get('last_event_id', -1)))
+    except ValueError:
+        last_id = -1
+
+    def generate(last_id):
+        while True:
+            events, finished = job.wait_events(last_id, timeout=15)
+            if not events:
+                if finished:
+                    return
+                yield ": keepalive\n\n"
+                continue
+            for event in events:
+                last_id = event['id']
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'], ensure_ascii=False)}\n\n"
+
+    response = Response(
+        stream_with_context(generate(last_id)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # Libéré à la fermeture de la réponse (fin du job ou déconnexion du client)
+    response.call_on_close(SSE_STREAMS.release)
+    return response
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_analysis_job(job_id):
+    job = JOB_MANAGER.cancel(job_id)
+    if not job: return jsonify({"error": "Job introuvable"}), 404
+    return jsonify(job.to_dict(include_result=False))
+
+@app.route('/api/genai/metrics', methods=['GET'])
+def genai_metrics():
+    """Profondeur des files, appels en vol et budgets restants de l'ordonnanceur Gemini."""
+    return jsonify(GENAI_SCHEDULER.metrics())
 
 @app.route('/filter_videos', methods=['POST'])
-def filter_videos(): return jsonify(VIDEOS_DB)
+def filter_videos():
+    """
+    Bibliothèque filtrée et paginée. Corps JSON (tout est optionnel) :
+    themes (liste), category ("U15"), level ("Ligue"), duration_min / duration_max (minutes),
+    q (texte libre, index plein texte), cursor (next_cursor de la page précédente), limit, view ("list" | "detail").
+    La vue liste omet synopsis et SVG ; une entrée par groupe de quasi-doublons.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        params = exercise_store.search_params(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    items, next_cursor = EXERCISE_STORE.search(**params)
+    return jsonify({"items": items, "next_cursor": next_cursor})
+
+@app.route('/api/exercises/search', methods=['GET'])
+def search_exercises():
+    """Recherche plein texte (titre, description, synopsis), meilleurs résultats d'abord."""
+    query = (request.args.get('q') or '').strip()
+    if not query: return jsonify({"items": []})
+    items = EXERCISE_STORE.search_text(query, limit=request.args.get('limit', 20, type=int),
+                                       detail=request.args.get('view') == 'detail')
+    return jsonify({"items": items})
+
+@app.route('/api/exercises/<int:vid_id>', methods=['GET'])
+def get_exercise(vid_id):
+    """Fiche complète (vue détail : synopsis et SVG compris)."""
+    entry = EXERCISE_STORE.get(vid_id)
+    if not entry: return jsonify({"error": "Exercice introuvable"}), 404
+    return jsonify(entry)
 
 @app.route('/delete_video/<int:vid_id>', methods=['DELETE'])
 def delete_video(vid_id):
-    global VIDEOS_DB
-    VIDEOS_DB = [v for v in VIDEOS_DB if v['id'] != vid_id]
+    EXERCISE_STORE.delete(vid_id)
+    SIMILARITY_INDEX.remove(vid_id)
     return jsonify({"status": "success"})
 
-# Base de données locale des clubs (chargée au besoin)
-CLUBS_DB = []
-
-def load_clubs_db():
-    global CLUBS_DB
-    if CLUBS_DB: return
-    
-    try:
-        json_path = os.path.join(app.root_path, 'static', 'clubs_full.json')
-        if os.path.exists(json_path):
-            with open(json_path, 'r', encoding='utf-8') as f:
-                CLUBS_DB = json.load(f)
-            print(f"✅ Base clubs chargée: {len(CLUBS_DB)} clubs")
-        else:
-            print("⚠️ Fichier clubs_full.json introuvable (téléchargement en cours?)")
-    except Exception as e:
-        print(f"Erreur chargement clubs: {e}")
+@app.route('/api/exercises/<int:vid_id>/similar', methods=['GET'])
+def similar_exercises(vid_id):
+    """Exercices de la bibliothèque les plus proches de `vid_id` (autres vidéos comprises)."""
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    if EXERCISE_STORE.get(vid_id) is None: return jsonify({"error": "Exercice introuvable"}), 404
+    neighbours = SIMILARITY_INDEX.similar(vid_id, limit=limit * 2)
+    by_id = EXERCISE_STORE.get_many(other_id for other_id, _ in neighbours)
+    similar = []
+    for other_id, score in neighbours:
+        other = by_id.get(other_id)
+        if other:    # Index persistant : ignorer les ids qui ne sont plus en bibliothèque
+            similar.append({"id": other_id, "title": other['title'], "thumbnail": other['thumbnail'],
+                            "link": other['link'], "similarity": round(score, 2)})
+    return jsonify({"id": vid_id, "similar": similar[:limit]})
+
+# Base de données locale des clubs, chargée et rechargée à chaud par un thread d'arrière-plan
+CLUBS_JSON_FILE = os.path.join(app.root_path, 'static', 'clubs_full.json')
+CLUBS_INDEX_FILE = os.environ.get('CLUBS_INDEX_PATH', os.path.join(app.root_path, 'static', club_db.INDEX_FILENAME))
+CLUBS_SEARCH_LIMIT = 20
+CLUBS_RELOADER = club_reloader.ClubReloader(CLUBS_JSON_FILE, CLUBS_INDEX_FILE)
+CLUBS_RELOADER.start()
+
+def clubs_index():
+    """Index courant (club_db.ClubIndex, table comprise) ou None tant que la base n'est pas chargée."""
+    return CLUBS_RELOADER.index
 
 @app.route('/api/clubs_search')
 def clubs_search():
     query = request.args.get('q', '').lower().strip()
     if len(query) < 2:
         return jsonify([])
-    
 
-
-    # Charger la DB si nécessaire
-    if not CLUBS_DB:
-        load_clubs_db()
-    
-    # Si toujours vide, retourner vide (ou réessayer de charger)
-    if not CLUBS_DB:
+    # Base pas encore chargée (ou fichier absent) : on répond vide sans attendre le chargement
+    index = clubs_index()
+    if index is None:
         return jsonify([])
 
-    results = []
-    count = 0
-    
-    # Recherche simple et rapide (contient le texte)
-    for club in CLUBS_DB:
-        # Vérification des champs (certains peuvent être null)
-        c_name = (club.get('name') or '').lower()
-        c_short = (club.get('short_name') or '').lower()
-        c_loc = (club.get('location') or '').lower()
-        
-        if query in c_name or query in c_short or query in c_loc:
-            results.append({
-                "id": club.get("affiliation_number"),
-                "name": club.get("name"),
-                "short_name": club.get("short_name"),
-                "location": club.get("location"),
-                "logo": club.get("logo"),
-                "lat": club.get("latitude"),
-                "lng": club.get("longitude")
-            })
-            count += 1
-            if count >= 20: # Limite de résultats
-                break
-                
+    # Recherche par index (début de nom > début de mot > sous-chaîne, puis tolérance aux fautes)
+    results = [club_payload(club) for club in index.search(query, limit=CLUBS_SEARCH_LIMIT)]
     return jsonify(results)
 
+def club_payload(club, distance_km=None):
+    """Format JSON d'un club pour les recherches (autocomplete, carte)."""
+    payload = {
+        "id": club.get("affiliation_number"),
+        "name": club.get("name"),
+        "short_name": club.get("short_name"),
+        "location": club.get("location"),
+        "logo": club.get("logo"),
+        "lat": club.get("latitude"),
+        "lng": club.get("longitude")
+    }
+    if distance_km is not None:
+        payload["distance_km"] = round(distance_km, 2)
+    return payload
+
+# Bornes des recherches géographiques (protègent le serveur des requêtes "toute la France")
+CLUBS_GEO_MAX_RADIUS_KM = 200
+CLUBS_GEO_MAX_RESULTS = 500
+
+def geo_query_args():
+    """(lat, lng) lus dans la query string, ou None si absents / invalides."""
+    lat = club_db.parse_coordinate(request.args.get('lat'), 90)
+    lng = club_db.parse_coordinate(request.args.get('lng'), 180)
+    if lat is None or lng is None:
+        return None
+    return lat, lng
+
+@app.route('/api/v2/clubs-nearby', methods=['GET'])
+def clubs_nearby():
+    """Clubs dans un rayon (km) autour d'un point, du plus proche au plus loin."""
+    point = geo_query_args()
+    if not point:
+        return jsonify({"error": "Paramètres lat / lng manquants ou invalides"}), 400
+    try:
+        radius = min(float(request.args.get('radius_km', 10)), CLUBS_GEO_MAX_RADIUS_KM)
+        limit = min(int(request.args.get('limit', 50)), CLUBS_GEO_MAX_RESULTS)
+    except ValueError:
+        return jsonify({"error": "Paramètres radius_km / limit invalides"}), 400
+
+    index = clubs_index()
+    if index is None or radius <= 0 or limit <= 0:
+        return jsonify([])
+
+    hits = index.geo.within(point[0], point[1], radius, limit=limit)
+    return jsonify([club_payload(index.table[club_id], distance) for distance, club_id in hits])
+
+@app.route('/api/v2/clubs-nearest', methods=['GET'])
+def clubs_nearest():
+    """Les k clubs les plus proches d'un point, triés par distance."""
+    point = geo_query_args()
+    if not point:
+        return jsonify({"error": "Paramètres lat / lng manquants ou invalides"}), 400
+    try:
+        k = min(int(request.args.get('k', 10)), CLUBS_GEO_MAX_RESULTS)
+    except ValueError:
+        return jsonify({"error": "Paramètre k invalide"}), 400
+
+    index = clubs_index()
+    if index is None:
+        return jsonify([])
+
+    hits = index.geo.nearest(point[0], point[1], k)
+    return jsonify([club_payload(index.table[club_id], distance) for distance, club_id in hits])
+
 # ==============================================================================
 # ROUTES AUTHENTICATION
 # ==============================================================================
@@ -1856,6 +2413,8 @@ def get_current_user():
     """Retourne l'utilisateur en session."""
     return jsonify(session.get('user'))
 
+ADAPT_MAX_WORKERS = 4
+
 @app.route('/adapt_session_granular', methods=['POST'])
 def adapt_session_granular():
     data = request.json
@@ -1869,8 +2428,8 @@ def adapt_session_granular():
         constraints = step['constraints']
         
         # On cherche l'exo original dans la DB (ou on pourrait le passer dans le body)
-        # Mais pour être sûr d'avoir la donnée fraîche, on utilise VIDEOS_DB
-        original_exo = next((v for v in VIDEOS_DB if v['id'] == vid_id), None)
+        # Mais pour être sûr d'avoir la donnée fraîche, on relit la bibliothèque (clé primaire)
+        original_exo = EXERCISE_STORE.get(vid_id)
         if not original_exo: return None
 
         try:
@@ -1884,7 +2443,15 @@ def adapt_session_granular():
                 level=constraints.get('level', 'Non spécifié'),
                 time=constraints.get('time', 'Non spécifié')
             )
-            response = ACTIVE_MODEL.generate_content(prompt)
+            # Priorité interactive : l'utilisateur attend, on passe devant les analyses vidéo
+            response = GENAI_SCHEDULER.call(
+                GENAI_CLIENT.models.generate_content,
+                model=ACTIVE_MODEL_NAME,
+                contents=prompt,
+                config=GENAI_CONFIG,
+                priority=genai_scheduler.INTERACTIVE,
+                est_tokens=estimate_input_tokens(prompt)
+            )
             res_json = robust_json_load(response.text)
             
             if not res_json:
@@ -1911,7 +2478,11 @@ def adapt_session_granular():
             print(f"Error adapting granular exercise {vid_id}: {e}")
             return original_exo
 
-    with concurrent.futures.ThreadPoolExecutor() as executor:
+    if not GENAI_CLIENT:
+        return jsonify({"error": "IA non configurée"}), 503
+
+    # Pool borné : l'ordonnanceur global limite de toute façon les appels simultanés
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(plan), ADAPT_MAX_WORKERS)) as executor:
         results = list(executor.map(process_step, plan))
 
     return jsonify([r for r in results if r])
@@ -2077,8 +2648,21 @@ def search_cities():
     query = request.args.get('q', '').strip()
     if len(query) < 2:
         return jsonify([])
-    results = club_db.search_cities(query)
-    return jsonify(results)
+    index = clubs_index()
+    if index is None:
+        return jsonify([])
+    # Préfixe sur les noms de villes normalisés et triés (bisect)
+    return jsonify(index.cities.search(query, limit=CLUBS_SEARCH_LIMIT))
+
+def city_club_payload(club):
+    """Format attendu par le formulaire d'inscription (ville -> club)."""
+    return {
+        "id": club.get("affiliation_number"),
+        "nom": club.get("name"),
+        "adresse": club.get("address") or "",
+        "cp": club.get("zip") or "",
+        "ville": club.get("location")
+    }
 
 @app.route('/api/v2/clubs-by-city', methods=['GET'])
 def get_clubs_by_city():
@@ -2086,8 +2670,11 @@ def get_clubs_by_city():
     city = request.args.get('city', '').strip()
     if not city:
         return jsonify([])
-    clubs = club_db.get_clubs_in_city(city)
-    return jsonify(clubs)
+    index = clubs_index()
+    if index is None:
+        return jsonify([])
+    # Table de hachage ville normalisée -> clubs, déjà triés par nom
+    return jsonify([city_club_payload(index.table[club_id]) for club_id in index.cities.clubs_in(city)])
 
 
 
@@ -0,0 +1,178 @@
+"""
+Faux client google-genai pour le benchmark du pipeline (aucun appel réseau, aucun quota).
+
+Reproduit la surface utilisée par app.py :
+- client.files : upload / get / list / delete, avec un état PROCESSING qui dure
+  `processing_seconds` avant de passer ACTIVE ;
+- client.models : generate_content / generate_content_stream, avec une latence
+  configurable, des 429 injectés au hasard et une réponse JSON préenregistrée
+  (bloc <thinking_process> + bloc ```json, comme le vrai modèle) ;
+- réponses coupées au hasard (finish_reason MAX_TOKENS) : une demande de suite
+  ("SUITE DE RÉPONSE" + exercices déjà reçus) renvoie les exercices restants.
+"""
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+
+
+class FakeAPIError(Exception):
+    """Erreur au format des erreurs google-genai (code + message avec retryDelay)."""
+
+    def __init__(self, code, message):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+class FakeFile:
+    def __init__(self, path, processing_seconds):
+        self.name = f"files/{uuid.uuid4().hex[:12]}"
+        self.uri = f"https://fake-genai.local/v1beta/{self.name}"
+        self.mime_type = 'video/mp4'
+        self.display_name = path
+        self.ready_at = time.monotonic() + processing_seconds
+
+    @property
+    def state(self):
+        return 'PROCESSING' if time.monotonic() < self.ready_at else 'ACTIVE'
+
+
+def canned_exercises(segment_start=0, count=2):
+    """Exercices factices plausibles (champs lus par le dédoublonnage et le parse)."""
+    themes = ['CONSERVATION', 'FINITION', 'TRANSITION', 'PRESSING', 'TECHNIQUE']
+    exercises = []
+    for i in range(count):
+        theme = themes[(segment_start // 120 + i) % len(themes)]
+        exercises.append({
+            "summary": f"Jeu de {theme.lower()} en 4 contre 4 plus 2 appuis",
+            "start_seconds": 10 + i * 50,
+            "themes": [theme],
+            "cat_range": "U15-Seniors",
+            "level_range": "Régional",
+            "duree_totale": "15 min",
+            "synopsis": "Deux équipes de 4 joueurs s'affrontent dans un carré de 30x30m. " * 6,
+            "materiel_detail": "Plots, chasubles, 10 ballons",
+            "svg_schema": "<svg viewBox=\"0 0 800 500\">" + "<circle cx=\"100\" cy=\"100\" r=\"8\"/>" * 40 + "</svg>",
+        })
+    return exercises
+
+
+def canned_response_text(segment_start=0, count=2, skip=0):
+    thinking = "<thinking_process>\nAnalyse des séquences, repérage des consignes [voir 00:12].\n</thinking_process>\n"
+    exercises = canned_exercises(segment_start, count)[skip:]
+    return thinking + "```json\n" + json.dumps(exercises, ensure_ascii=False, indent=2) + "\n```"
+
+
+CONTINUATION_MARKER = "SUITE DE RÉPONSE"
+
+
+class FakeFiles:
+    def __init__(self, owner):
+        self.owner = owner
+        self.store = {}
+        self.lock = threading.Lock()
+
+    def upload(self, file=None, **kwargs):
+        self.owner._count('files.upload')
+        time.sleep(self.owner.upload_seconds)
+        video_file = FakeFile(file, self.owner.processing_seconds)
+        with self.lock:
+            self.store[video_file.name] = video_file
+        return video_file
+
+    def get(self, name=None, **kwargs):
+        self.owner._count('files.get')
+        with self.lock:
+            video_file = self.store.get(name)
+        if video_file is None:
+            raise FakeAPIError(404, f"NOT_FOUND: {name}")
+        return video_file
+
+    def list(self, config=None, **kwargs):
+        self.owner._count('files.list')
+        with self.lock:
+            return iter(list(self.store.values()))
+
+    def delete(self, name=None, **kwargs):
+        self.owner._count('files.delete')
+        with self.lock:
+            self.store.pop(name, None)
+
+
+class FakeModels:
+    def __init__(self, owner):
+        self.owner = owner
+
+    def list(self, **kwargs):
+        return iter([SimpleNamespace(name='models/gemini-2.5-flash-fake')])
+
+    def _maybe_rate_limit(self):
+        if random.random() < self.owner.rate_limit_ratio:
+            self.owner._count('429')
+            raise FakeAPIError(429, f"RESOURCE_EXHAUSTED. retryDelay: '{self.owner.retry_delay}s'")
+
+    def _prompt(self, contents):
+        return ' '.join(c for c in contents if isinstance(c, str)) if isinstance(contents, list) else str(contents)
+
+    def _respond(self, contents):
+        """(texte, finish_reason) : réponse complète, coupée au hasard, ou suite d'une réponse coupée."""
+        prompt = self._prompt(contents)
+        match = re.search(r"SEGMENT: (\d+)s", prompt)
+        segment_start = int(match.group(1)) if match else 0
+        if CONTINUATION_MARKER in prompt:
+            # Les exercices déjà reçus sont listés un par ligne ("- résumé (début Xs)")
+            done = len(re.findall(r"^- ", prompt.split(CONTINUATION_MARKER, 1)[1], flags=re.MULTILINE))
+            self.owner._count('continuations')
+            return canned_response_text(segment_start, self.owner.exercises_per_call, skip=done), 'STOP'
+        text = canned_response_text(segment_start, self.owner.exercises_per_call)
+        if random.random() < self.owner.truncate_ratio:
+            self.owner._count('truncated')
+            return text[:int(len(text) * 0.7)], 'MAX_TOKENS'
+        return text, 'STOP'
+
+    def generate_content(self, model=None, contents=None, config=None, **kwargs):
+        self.owner._count('models.generate_content')
+        time.sleep(self.owner.latency_seconds)
+        self._maybe_rate_limit()
+        text, finish_reason = self._respond(contents)
+        return SimpleNamespace(text=text, candidates=[SimpleNamespace(finish_reason=finish_reason)])
+
+    def generate_content_stream(self, model=None, contents=None, config=None, **kwargs):
+        self.owner._count('models.generate_content_stream')
+        self._maybe_rate_limit()
+        text, finish_reason = self._respond(contents)
+        pieces = [text[i:i + 200] for i in range(0, len(text), 200)]
+        delay = self.owner.latency_seconds / max(1, len(pieces))
+
+        def stream():
+            for i, piece in enumerate(pieces):
+                time.sleep(delay)
+                finish = finish_reason if i == len(pieces) - 1 else None
+                yield SimpleNamespace(text=piece, candidates=[SimpleNamespace(finish_reason=finish)])
+        return stream()
+
+
+class FakeGenAIClient:
+    """Remplaçant de genai.Client pour le benchmark."""
+
+    def __init__(self, latency_seconds=1.0, processing_seconds=0.5, upload_seconds=0.05,
+                 rate_limit_ratio=0.0, retry_delay=0.2, exercises_per_call=2, truncate_ratio=0.0, seed=0):
+        self.latency_seconds = latency_seconds
+        self.processing_seconds = processing_seconds
+        self.upload_seconds = upload_seconds
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_delay = retry_delay
+        self.exercises_per_call = exercises_per_call
+        self.truncate_ratio = truncate_ratio
+        self.calls = {}
+        self.calls_lock = threading.Lock()
+        self.files = FakeFiles(self)
+        self.models = FakeModels(self)
+        random.seed(seed)
+
+    def _count(self, key):
+        with self.calls_lock:
+            self.calls[key] = self.calls.get(key, 0) + 1
@@ -0,0 +1,189 @@
+"""
+Benchmark de la lecture du JSON des réponses Gemini : ai_json.parse_tolerant (une passe)
+contre l'ancien robust_json_load (cascade de 5 tiers, copiée ci-dessous pour comparaison).
+
+Corpus :
+- par défaut, les réponses de tests/fixtures/gemini_responses/ : réponses du modèle anonymisées
+  (sans titre de vidéo, lien ni nom de club), une par défaut rencontré en production :
+  retours à la ligne bruts, coupure MAX_TOKENS, guillemets non échappés, virgules finales et NaN,
+  objets concaténés d'une reprise, texte autour du JSON, littéraux Python ; tests/test_ai_json.py
+  vérifie le résultat attendu de chacune ;
+- --corpus : un autre dossier de fichiers .txt / .json (réponses brutes récupérées des logs) ;
+- --synthetic : en plus, des réponses synthétiques de ~15k tokens (SVG compris) déclinées avec
+  les mêmes défauts, pour mesurer les temps sur des réponses de taille réelle.
+
+Utilisation :
+    python bench_json_repair.py
+    python bench_json_repair.py --synthetic --runs 20
+    python bench_json_repair.py --corpus chemin/vers/reponses
+"""
+import argparse
+import ast
+import contextlib
+import io
+import json
+import os
+import re
+import statistics
+import time
+
+import ai_json
+from bench_fake_genai import canned_exercises
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CORPUS_DIR = os.path.join(BENCH_DIR, 'tests', 'fixtures', 'gemini_responses')
+EXERCISES_PER_RESPONSE = 25     # ~15k tokens avec les SVG
+
+
+def legacy_robust_json_load(text):
+    """Ancien robust_json_load de app.py (5 tiers), gardé tel quel comme référence."""
+    if not text: return None
+    clean = re.sub(r'```json\s*', '', text, flags=re.IGNORECASE)
+    clean = re.sub(r'```\s*$', '', clean)
+    s_arr = clean.find('[')
+    e_arr = clean.rfind(']') + 1
+    s_obj = clean.find('{')
+    e_obj = clean.rfind('}') + 1
+    if s_arr != -1 and (s_obj == -1 or s_arr < s_obj):
+        raw_block = clean[s_arr:e_arr]
+    elif s_obj != -1:
+        raw_block = clean[s_obj:e_obj]
+    else:
+        raw_block = clean
+    try:
+        return json.loads(raw_block, strict=False)
+    except:
+        pass
+    try:
+        def escape_newlines(m):
+            content = m.group(1)
+            content = content.replace('\n', '\\n').replace('\r', '')
+            return '"' + content + '"'
+        repaired = re.sub(r'"((?:[^"\\]|\\.)*)"', escape_newlines, raw_block, flags=re.DOTALL)
+        repaired = re.sub(r',\s*([\]}])', r'\1', repaired)
+        return json.loads(repaired, strict=False)
+    except:
+        pass
+    try:
+        python_str = raw_block.replace('null', 'None').replace('true', 'True').replace('false', 'False')
+        return ast.literal_eval(python_str)
+    except:
+        pass
+    try:
+        keys = ["summary", "video_description", "synopsis", "themes", "duree_totale",
+                "timing_detail_pro", "cat_range", "level_range", "materiel_detail",
+                "dimensions", "nb_joueurs_exact", "start_seconds"]
+        all_exercises = []
+        depth = 0
+        start_idx = -1
+        for i, char in enumerate(raw_block):
+            if char == '{':
+                if depth == 0:
+                    start_idx = i
+                depth += 1
+            elif char == '}':
+                depth -= 1
+                if depth == 0 and start_idx != -1:
+                    obj_str = raw_block[start_idx:i + 1]
+                    extracted = {}
+                    for k in keys:
+                        if k == "themes":
+                            match = re.search(r'"themes"\s*:\s*\[(.*?)\]', obj_str, re.DOTALL)
+                            if match:
+                                themes_str = match.group(1).replace('"', '').replace("'", "")
+                                extracted[k] = [t.strip() for t in themes_str.split(',') if t.strip()]
+                        else:
+                            pattern = rf'"{k}"\s*:\s*"((?:[^"\\]|\\.)*?)"'
+                            match = re.search(pattern, obj_str, re.DOTALL)
+                            if match:
+                                extracted[k] = match.group(1).replace('\\"', '"').replace('\\n', '\n').strip()
+                    if extracted.get('summary'):
+                        all_exercises.append(extracted)
+                    start_idx = -1
+        if all_exercises:
+            return all_exercises
+    except Exception:
+        pass
+    try:
+        summary_match = re.search(r'"summary"\s*:\s*"([^"]+)"', raw_block)
+        if summary_match:
+            return [{"summary": summary_match.group(1), "synopsis": "Exercice extrait (données partielles)", "themes": ["TECHNIQUE"]}]
+    except:
+        pass
+    return None
+
+
+def response_text(body):
+    thinking = "<thinking_process>\nSéquences [00:12] à [01:40], consignes {4v4 + 2 appuis}.\n</thinking_process>\n"
+    return thinking + "```json\n" + body + "\n```"
+
+
+def synthetic_corpus():
+    """(nom, texte) : une réponse propre puis la même avec chaque défaut injecté."""
+    exercises = canned_exercises(0, EXERCISES_PER_RESPONSE)
+    for i, exo in enumerate(exercises):
+        exo['synopsis'] = f"Exercice {i} : " + exo['synopsis']
+    body = json.dumps(exercises, ensure_ascii=False, indent=2)
+    compact = json.dumps(exercises, ensure_ascii=False)
+    cases = [
+        ('propre', response_text(body)),
+        ('retours_ligne_bruts', response_text(body.replace('. Deux', '.\nDeux'))),
+        ('virgules_finales', response_text(body.replace('\n  }', ',\n  }').replace('\n]', ',\n]'))),
+        ('guillemets_internes', response_text(body.replace("s'affrontent", 's\'affrontent en "rondo"'))),
+        ('litteraux_python', response_text(body.replace('"cat_range"', '"ok": True, "cat_range"'))),
+        ('objets_concatenes', response_text('\n'.join(json.dumps(e, ensure_ascii=False) for e in exercises))),
+        ('tronquee', response_text(compact)[:int(len(compact) * 0.8)]),
+        ('tronquee_defauts', response_text(body.replace('. Deux', '.\nDeux').replace('\n  }', ',\n  }'))[:int(len(body) * 0.8)]),
+    ]
+    return cases
+
+
+def file_corpus(directory):
+    if not os.path.isdir(directory):
+        return []
+    cases = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(('.txt', '.json')):
+            with open(os.path.join(directory, name), encoding='utf-8', errors='replace') as f:
+                cases.append((name, f.read()))
+    return cases
+
+
+def timed(fn, text, runs):
+    samples = []
+    result = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = fn(text)
+        samples.append((time.perf_counter() - start) * 1000)
+    return result, statistics.median(samples)
+
+
+def count_items(value):
+    if isinstance(value, list):
+        return len(value)
+    return 1 if isinstance(value, dict) else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la lecture tolérante du JSON Gemini")
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS_DIR, help="Dossier de réponses réelles (.txt / .json)")
+    parser.add_argument('--synthetic', action='store_true', help="ajoute les réponses synthétiques de ~15k tokens")
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    cases = file_corpus(args.corpus) + (synthetic_corpus() if args.synthetic else [])
+    if not cases:
+        print(f"❌ Aucune réponse dans {args.corpus} (fichiers .txt / .json attendus)")
+        return
+    print(f"{'cas':<26}{'Ko':>7}{'ancien ms':>11}{'nouveau ms':>12}{'exos anc.':>11}{'exos nouv.':>12}  réparations")
+    for name, text in cases:
+        old, old_ms = timed(legacy_robust_json_load, text, args.runs)
+        (new, repairs), new_ms = timed(ai_json.parse_tolerant, text, args.runs)
+        print(f"{name[:25]:<26}{len(text) / 1024:>7.1f}{old_ms:>11.2f}{new_ms:>12.2f}"
+              f"{count_items(old):>11}{count_items(new):>12}  {', '.join(repairs) or '-'}")
+
+
+if __name__ == '__main__':
+    main()
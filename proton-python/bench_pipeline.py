@@ -0,0 +1,300 @@
+"""
+Benchmark de bout en bout de smart_split_and_process, sans quota Gemini.
+
+- Vidéos synthétiques (mire + bip) de 1, 5, 20 et 60 minutes générées avec ffmpeg (lavfi),
+  conservées dans bench_data/ entre deux exécutions.
+- Gemini est remplacé par bench_fake_genai.FakeGenAIClient (latence, durée de PROCESSING,
+  taux de 429 et réponses JSON réglables).
+- Chaque taille tourne dans un process séparé pour mesurer son pic de RSS.
+- Rapport par étape (probe, split, upload, analyse, dedup, parse) : temps cumulé sur
+  tous les threads et fenêtre de temps réel (début de la 1re occurrence -> fin de la dernière).
+
+Utilisation :
+    python bench_pipeline.py                      # toutes les tailles, comparées à la baseline
+    python bench_pipeline.py --sizes 1 5          # sous-ensemble
+    python bench_pipeline.py --update-baseline     # enregistre les mesures comme référence
+Code de sortie 1 si une mesure régresse au-delà de la tolérance ou n'a pas de référence,
+2 si bench_baseline.json est absent (la vérification ne peut pas passer sans référence).
+La référence dépend de la machine : bench_baseline.json n'est pas versionné (.gitignore), chaque
+machine (CI comprise) crée la sienne une fois avec --update-baseline avant la première vérification.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BENCH_DIR, 'bench_data')
+BASELINE_PATH = os.path.join(BENCH_DIR, 'bench_baseline.json')
+DEFAULT_SIZES = (1, 5, 20, 60)
+STAGES = ('probe', 'split', 'upload', 'analyse', 'dedup', 'parse')
+RESULT_MARKER = 'BENCH_RESULT '
+
+# Tolérance de régression : relative + marge absolue (évite les faux positifs sur les petites valeurs)
+TIME_TOLERANCE = 0.25
+TIME_SLACK_SECONDS = 0.5
+RSS_TOLERANCE = 0.20
+RSS_SLACK_MB = 20
+
+
+def ffmpeg_binary():
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return 'ffmpeg'
+
+
+def make_synthetic_video(minutes):
+    """Vidéo mire 320x240 15 fps + sinusoïde, keyframe toutes les 2s (réutilisée si déjà générée)."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, f"synthetic_{minutes}min.mp4")
+    if os.path.exists(path):
+        return path
+    print(f"🎬 Génération de la vidéo synthétique {minutes} min...")
+    seconds = int(minutes * 60)
+    cmd = [
+        ffmpeg_binary(), '-y', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', f"testsrc=size=320x240:rate=15:duration={seconds}",
+        '-f', 'lavfi', '-i', f"sine=frequency=440:duration={seconds}",
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-g', '30', '-pix_fmt', 'yuv420p',
+        '-c:a', 'aac', '-b:a', '64k', '-shortest', path + '.tmp.mp4',
+    ]
+    subprocess.run(cmd, check=True)
+    os.replace(path + '.tmp.mp4', path)
+    return path
+
+
+class StageClock:
+    """Accumule, par étape, le nombre d'appels, le temps cumulé et la fenêtre temps réel."""
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.lock = threading.Lock()
+        self.stages = {name: {"calls": 0, "busy_s": 0.0, "first": None, "last": None} for name in STAGES}
+
+    def record(self, stage, started, ended):
+        with self.lock:
+            entry = self.stages[stage]
+            entry["calls"] += 1
+            entry["busy_s"] += ended - started
+            start, end = started - self.origin, ended - self.origin
+            entry["first"] = start if entry["first"] is None else min(entry["first"], start)
+            entry["last"] = end if entry["last"] is None else max(entry["last"], end)
+
+    def wrap(self, stage, fn):
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.record(stage, started, time.perf_counter())
+        return timed
+
+    def wrap_stream(self, stage, fn):
+        """Comme wrap, mais le temps court jusqu'à la fin de la consommation du stream."""
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                iterator = fn(*args, **kwargs)
+            except Exception:
+                self.record(stage, started, time.perf_counter())
+                raise
+
+            def consume():
+                try:
+                    for item in iterator:
+                        yield item
+                finally:
+                    self.record(stage, started, time.perf_counter())
+            return consume()
+        return timed
+
+    def report(self):
+        data = {}
+        for name, entry in self.stages.items():
+            span = (entry["last"] - entry["first"]) if entry["calls"] else 0.0
+            data[name] = {"calls": entry["calls"], "busy_s": round(entry["busy_s"], 3), "span_s": round(span, 3)}
+        return data
+
+
+def run_one(minutes, options):
+    """Mesure une taille dans le process courant ; retourne le dict de résultats."""
+    sys.path.insert(0, BENCH_DIR)
+    import bench_fake_genai
+    from google import genai
+
+    fake = bench_fake_genai.FakeGenAIClient(
+        latency_seconds=options.latency,
+        processing_seconds=options.processing,
+        rate_limit_ratio=options.rate_limit,
+        exercises_per_call=options.exercises,
+        truncate_ratio=options.truncate,
+    )
+    # app.py configure son client au chargement : on lui sert le faux client
+    genai.Client = lambda *args, **kwargs: fake
+
+    # Dossier de travail isolé : temp_data/ et le cache d'analyse du serveur ne sont pas touchés
+    work_dir = os.path.join(DATA_DIR, 'work')
+    os.makedirs(work_dir, exist_ok=True)
+    os.environ['ANALYSIS_CACHE_DIR'] = os.path.join(work_dir, 'cache')
+    os.chdir(work_dir)
+    video_path = make_synthetic_video(minutes)
+
+    import app
+
+    clock = StageClock()
+    for name in ('probe_video_duration', 'probe_keyframes'):
+        setattr(app, name, clock.wrap('probe', getattr(app, name)))
+    for name in ('cut_chunk_stream_copy', 'cut_chunk_reencode'):
+        setattr(app, name, clock.wrap('split', getattr(app, name)))
+    for name in ('upload_video_worker', 'upload_video_chunk_worker'):
+        setattr(app, name, clock.wrap('upload', getattr(app, name)))
+    app.clean_ai_response = clock.wrap('parse', app.clean_ai_response)
+    app.ai_json.parse_tolerant = clock.wrap('parse', app.ai_json.parse_tolerant)
+    app.deduplicate_exercises = clock.wrap('dedup', app.deduplicate_exercises)
+    fake.models.generate_content = clock.wrap('analyse', fake.models.generate_content)
+    fake.models.generate_content_stream = clock.wrap_stream('analyse', fake.models.generate_content_stream)
+
+    # L'attente du PROCESSING Google compte dans l'étape upload
+    watch = app.FILE_WATCHER.watch
+
+    def timed_watch(video_file, *args, **kwargs):
+        started = time.perf_counter()
+        future = watch(video_file, *args, **kwargs)
+        future.add_done_callback(lambda f: clock.record('upload', started, time.perf_counter()))
+        return future
+    app.FILE_WATCHER.watch = timed_watch
+
+    started = time.perf_counter()
+    exercises = app.smart_split_and_process(video_path, f"Synthétique {minutes} min")
+    total = time.perf_counter() - started
+
+    peak_self = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    peak_children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return {
+        "minutes": minutes,
+        "total_s": round(total, 3),
+        "exercises": len(exercises or []),
+        "stages": clock.report(),
+        "peak_rss_mb": round(peak_self, 1),
+        "peak_child_rss_mb": round(peak_children, 1),
+        "api_calls": dict(fake.calls),
+        "scheduler": app.GENAI_SCHEDULER.metrics(),
+    }
+
+
+def fake_settings(options):
+    return {"latency": options.latency, "processing": options.processing,
+            "rate_limit": options.rate_limit, "exercises": options.exercises, "truncate": options.truncate}
+
+
+def run_isolated(minutes, options):
+    """Lance une mesure dans un process Python neuf (pic de RSS propre à la taille)."""
+    cmd = [sys.executable, os.path.abspath(__file__), '--run-one', str(minutes),
+           '--latency', str(options.latency), '--processing', str(options.processing),
+           '--rate-limit', str(options.rate_limit), '--exercises', str(options.exercises),
+           '--truncate', str(options.truncate)]
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    sys.stderr.write(proc.stdout[-4000:] + proc.stderr[-4000:])
+    raise RuntimeError(f"Mesure {minutes} min en échec (code {proc.returncode})")
+
+
+def print_result(result):
+    print(f"\n📹 {result['minutes']} min : {result['total_s']:.2f}s, {result['exercises']} exercice(s), "
+          f"RSS {result['peak_rss_mb']:.0f} Mo (ffmpeg {result['peak_child_rss_mb']:.0f} Mo)")
+    for name in STAGES:
+        stage = result['stages'][name]
+        print(f"   {name:<8} {stage['calls']:>4} appel(s)  cumulé {stage['busy_s']:>8.2f}s  fenêtre {stage['span_s']:>8.2f}s")
+    sched = result['scheduler']
+    print(f"   gemini   429: {sched['rate_limited']}  retries: {sched['retries']}  appels: {result['api_calls']}")
+
+
+def exceeds(value, base, tolerance, slack):
+    return value > base * (1 + tolerance) + slack
+
+
+def compare(result, base):
+    """Liste des régressions de `result` par rapport à la mesure de référence `base`."""
+    problems = []
+    label = f"{result['minutes']} min"
+    if exceeds(result['total_s'], base['total_s'], TIME_TOLERANCE, TIME_SLACK_SECONDS):
+        problems.append(f"{label} : durée totale {result['total_s']:.2f}s (référence {base['total_s']:.2f}s)")
+    for name in STAGES:
+        new, old = result['stages'][name]['span_s'], base['stages'][name]['span_s']
+        if exceeds(new, old, TIME_TOLERANCE, TIME_SLACK_SECONDS):
+            problems.append(f"{label} : étape {name} {new:.2f}s (référence {old:.2f}s)")
+    if exceeds(result['peak_rss_mb'], base['peak_rss_mb'], RSS_TOLERANCE, RSS_SLACK_MB):
+        problems.append(f"{label} : pic RSS {result['peak_rss_mb']:.0f} Mo (référence {base['peak_rss_mb']:.0f} Mo)")
+    if result['exercises'] != base['exercises']:
+        problems.append(f"{label} : {result['exercises']} exercice(s) au lieu de {base['exercises']}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du pipeline d'analyse vidéo (Gemini simulé)")
+    parser.add_argument('--sizes', nargs='+', type=int, default=list(DEFAULT_SIZES), help="durées en minutes")
+    parser.add_argument('--latency', type=float, default=1.0, help="latence d'un appel modèle (s)")
+    parser.add_argument('--processing', type=float, default=0.5, help="durée du PROCESSING d'un fichier (s)")
+    parser.add_argument('--rate-limit', type=float, default=0.0, help="proportion d'appels modèle en 429")
+    parser.add_argument('--exercises', type=int, default=2, help="exercices par réponse simulée")
+    parser.add_argument('--truncate', type=float, default=0.0, help="proportion de réponses coupées (MAX_TOKENS)")
+    parser.add_argument('--update-baseline', action='store_true', help="enregistre les mesures comme référence")
+    parser.add_argument('--run-one', type=int, help=argparse.SUPPRESS)
+    options = parser.parse_args()
+
+    if options.run_one is not None:
+        result = run_one(options.run_one, options)
+        print(RESULT_MARKER + json.dumps(result, ensure_ascii=False))
+        return 0
+
+    results = {}
+    for minutes in options.sizes:
+        make_synthetic_video(minutes)
+        results[str(minutes)] = run_isolated(minutes, options)
+        print_result(results[str(minutes)])
+
+    if options.update_baseline:
+        baseline = {}
+        if os.path.exists(BASELINE_PATH):
+            with open(BASELINE_PATH, encoding='utf-8') as f:
+                baseline = json.load(f)
+        baseline.setdefault('results', {}).update(results)
+        baseline['fake'] = fake_settings(options)
+        with open(BASELINE_PATH, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Référence mise à jour : {BASELINE_PATH}")
+        return 0
+
+    if not os.path.exists(BASELINE_PATH):
+        # Sans référence, aucune régression ne peut être détectée : la vérification échoue
+        print(f"\n❌ Pas de référence ({BASELINE_PATH}) : lancer avec --update-baseline pour en créer une.")
+        return 2
+    with open(BASELINE_PATH, encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('fake') != fake_settings(options):
+        print(f"\n⚠️ Réglages du faux Gemini différents de la référence ({baseline.get('fake')}) : comparaison indicative.")
+    problems = []
+    for key, result in results.items():
+        if key in baseline.get('results', {}):
+            problems.extend(compare(result, baseline['results'][key]))
+        else:
+            problems.append(f"{key} min : pas de mesure de référence (--update-baseline --sizes {key})")
+    if problems:
+        print("\n❌ RÉGRESSIONS :")
+        for problem in problems:
+            print(f"   - {problem}")
+        return 1
+    print("\n✅ Aucune régression par rapport à la référence.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
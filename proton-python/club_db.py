@@ -0,0 +1,1079 @@
+"""
+Index en mémoire de la base des clubs (static/clubs_full.json).
+
+Construit une seule fois au chargement de la base :
+- champs recherchables prénormalisés (nom, nom court, localité), sous deux formes :
+  repliée (sans accents ni ponctuation, "E.S. BULLY-LES-MINES" -> "es bully les mines")
+  et développée (ST/STE, AS/US/FC remplacés par leur forme longue) ;
+- deux tableaux triés (début de champ, début de mot) parcourus par bisect :
+  les meilleurs rangs sortent directement, dans l'ordre alphabétique ;
+- listes de postings par trigramme (et par bigramme pour les requêtes de 2 caractères),
+  stockées en array('I') d'identifiants de clubs triés, pour les sous-chaînes.
+Classement : début de champ > début de mot > sous-chaîne.
+
+Si rien ne correspond (faute de frappe), une recherche approchée prend le relais :
+vocabulaire des mots indexés, filtré par trigrammes communs puis vérifié par une
+distance de Levenshtein bornée (1 faute dès 4 lettres, 2 dès 8).
+
+Les localités alimentent un index des villes (CityIndex) : nom normalisé -> clubs
+(hash) pour la liste des clubs d'une ville, et noms triés pour l'autocomplétion par bisect.
+
+Les coordonnées (latitude / longitude) alimentent une grille régulière (GeoIndex)
+pour les recherches par rayon et des k clubs les plus proches, en distance haversine.
+
+Stockage compact (lecture seule) : la base elle-même est une ClubTable en colonnes
+(chaînes UTF-8 concaténées + offsets, colonnes à faible cardinalité encodées par
+dictionnaire, coordonnées en array('d')), et l'index range ses textes, postings et
+tables de préfixes dans quelques gros buffers plutôt que des milliers de petits objets.
+
+Index binaire précompilé : `python club_db.py build` écrit ces buffers dans un fichier
+versionné (static/clubs_index.bin) portant l'empreinte SHA-256 du JSON source. Les
+workers l'ouvrent par mmap (sections lues via memoryview, sans copie ni json.load)
+et reviennent au JSON si le fichier est absent, d'un autre format ou périmé.
+"""
+import argparse
+import bisect
+import hashlib
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import time
+import unicodedata
+from array import array
+
+SEARCH_FIELDS = ('name', 'short_name', 'location')
+CITY_FIELD = 'location'
+FIELD_SEP = '\x01'   # Séparateur de champs dans le texte de recherche (jamais dans une requête)
+PREFIX_KEY_LENGTH = 32  # Longueur des clés de tri des tables de préfixes ; au-delà on vérifie le texte
+FUZZY_MAX_CANDIDATES = 100  # Mots du vocabulaire vérifiés au plus par mot de requête
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+GRID_CELL_DEGREES = 0.1     # ~11 km en latitude, ~7 km en longitude en France
+# Le grand cercle est un peu plus court que l'arc de parallèle : marge sur les bornes de la grille
+GRID_MARGIN = 1.02
+GRID_KEY_BASE = 4096        # Clé entière d'une cellule : ligne * base + colonne (|colonne| <= 1800)
+COORDINATE_BOUNDS = {'latitude': 90, 'longitude': 180}
+DICT_ENCODING_RATIO = 4     # Encodage par dictionnaire si chaque valeur revient 4 fois en moyenne
+
+INDEX_FILENAME = 'clubs_index.bin'
+INDEX_MAGIC = b'CLUBIDX\n'
+INDEX_FORMAT_VERSION = 2    # À incrémenter dès que la normalisation ou la structure de l'index change
+INDEX_HEADER = struct.Struct('<8sII')   # magic, version, longueur du manifeste JSON
+INDEX_ALIGN = 8
+
+
+# Abréviations courantes des noms de clubs et de villes, développées à l'index comme à la requête
+ABBREVIATIONS = {
+    'st': 'saint',
+    'ste': 'sainte',
+    'sts': 'saints',
+    'stes': 'saintes',
+    'as': 'association sportive',
+    'us': 'union sportive',
+    'fc': 'football club',
+}
+LIGATURES = str.maketrans({'œ': 'oe', 'æ': 'ae', 'ß': 'ss'})
+# Sigles à points : "e.s." / "a.s.c" -> "es" / "asc"
+DOTTED_ACRONYM = re.compile(r"\b(?:[a-z0-9]\.){2,}|\b(?:[a-z0-9]\.)+[a-z0-9]\b")
+NON_ALNUM = re.compile(r"[^a-z0-9]+")
+FIELD_START = re.compile(FIELD_SEP + '(?=[^' + FIELD_SEP + '])')
+WORD_START = re.compile(' (?=.)')
+
+
+def normalize(text):
+    """Forme repliée : minuscules sans accents, sigles à points recollés, ponctuation -> espace."""
+    text = unicodedata.normalize('NFKD', (text or '').lower().translate(LIGATURES))
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    text = DOTTED_ACRONYM.sub(lambda m: m.group(0).replace('.', ''), text)
+    return NON_ALNUM.sub(' ', text).strip()
+
+
+def expand_abbreviations(text, skip_last=False):
+    """Développe les abréviations d'un texte normalisé (sauf le dernier mot si `skip_last`)."""
+    words = text.split(' ')
+    last = len(words) - 1 if skip_last else len(words)
+    return ' '.join(ABBREVIATIONS.get(w, w) if i < last else w for i, w in enumerate(words))
+
+
+def index_variants(text):
+    """Formes indexées d'un champ : repliée, et développée si différente."""
+    folded = normalize(text)
+    expanded = expand_abbreviations(folded)
+    return (folded, expanded) if expanded != folded else (folded,)
+
+
+def query_variants(query):
+    """
+    Formes cherchées pour une requête. Le dernier mot, peut-être en cours de frappe,
+    n'est pas développé ("as" doit encore trouver "asnieres").
+    """
+    folded = normalize(query)
+    expanded = expand_abbreviations(folded, skip_last=True)
+    return (folded, expanded) if expanded != folded else (folded,)
+
+
+def ngrams(text, n):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def padded_trigrams(word, prefix=False):
+    """Trigrammes d'un mot borné ('^mot$') ; sans borne de fin pour un mot en cours de frappe."""
+    return ngrams('^' + word + ('' if prefix else '$'), 3)
+
+
+def max_typos(word):
+    """Nombre de fautes tolérées selon la longueur du mot."""
+    if len(word) < 4:
+        return 0
+    return 1 if len(word) < 8 else 2
+
+
+def bounded_levenshtein(a, b, limit, prefix=False):
+    """
+    Distance d'édition entre `a` et `b` (ou le préfixe de `b` le plus proche si `prefix`),
+    une inversion de deux lettres comptant pour une faute. None dès qu'elle dépasse `limit`.
+    Seule la bande diagonale de largeur 2*limit+1 est calculée.
+    """
+    if prefix:
+        b = b[:len(a) + limit]
+    elif abs(len(a) - len(b)) > limit:
+        return None
+    n = len(b)
+    over = limit + 1
+    before = None
+    previous = [j if j <= limit else over for j in range(n + 1)]
+    for i in range(1, len(a) + 1):
+        ca = a[i - 1]
+        current = [i if i <= limit else over] + [over] * n
+        row_min = current[0]
+        for j in range(max(1, i - limit), min(n, i + limit) + 1):
+            cb = b[j - 1]
+            value = min(previous[j - 1] + (ca != cb), current[j - 1] + 1, previous[j] + 1)
+            if before is not None and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                value = min(value, before[j - 2] + 1)
+            current[j] = value
+            if value < row_min:
+                row_min = value
+        if row_min > limit:
+            return None
+        before, previous = previous, current
+    distance = min(previous) if prefix else previous[n]
+    return distance if distance <= limit else None
+
+
+# ==============================================================================
+# STOCKAGE EN COLONNES
+# ==============================================================================
+class StringColumn:
+    """Chaînes UTF-8 concaténées dans un seul buffer + offsets array('I') ; None via un masque."""
+
+    kind = 'str'
+
+    def __init__(self, blob, offsets, nulls=None):
+        self.blob = blob
+        self.offsets = offsets
+        self.nulls = nulls
+
+    @classmethod
+    def build(cls, values):
+        blob = bytearray()
+        offsets = array('I', [0])
+        nulls = bytearray(len(values))
+        for i, value in enumerate(values):
+            if value is None:
+                nulls[i] = 1
+            else:
+                blob += value.encode('utf-8')
+            offsets.append(len(blob))
+        return cls(bytes(blob), offsets, bytes(nulls) if any(nulls) else None)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if self.nulls is not None and self.nulls[i]:
+            return None
+        return str(self.blob[self.offsets[i]:self.offsets[i + 1]], 'utf-8')
+
+    def dump(self, writer):
+        return {'kind': self.kind, 'blob': writer.add(self.blob), 'offsets': writer.add(self.offsets),
+                'nulls': writer.add(self.nulls)}
+
+    @classmethod
+    def load(cls, reader, meta):
+        return cls(reader.get(meta['blob']), reader.get(meta['offsets']), reader.get(meta['nulls']))
+
+
+class DictColumn:
+    """Colonne à faible cardinalité (villes, districts...) : codes array('I') + valeurs distinctes internées."""
+
+    kind = 'dict'
+
+    def __init__(self, codes, values):
+        self.codes = codes
+        self.values = values
+        self.decoded = [None if v is None else sys.intern(v) for v in (values[j] for j in range(len(values)))]
+
+    @classmethod
+    def build(cls, values):
+        slots = {}
+        codes = array('I', (slots.setdefault(v, len(slots)) for v in values))
+        return cls(codes, StringColumn.build(list(slots)))
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        return self.decoded[self.codes[i]]
+
+    def dump(self, writer):
+        return {'kind': self.kind, 'codes': writer.add(self.codes), 'values': self.values.dump(writer)}
+
+    @classmethod
+    def load(cls, reader, meta):
+        return cls(reader.get(meta['codes']), StringColumn.load(reader, meta['values']))
+
+
+class IntColumn:
+    """Entiers (numéros d'affiliation...) en array('q') ; None via un masque."""
+
+    kind = 'int'
+
+    def __init__(self, values, nulls=None):
+        self.values = values
+        self.nulls = nulls
+
+    @classmethod
+    def build(cls, values):
+        nulls = bytes(1 if v is None else 0 for v in values)
+        return cls(array('q', (0 if v is None else v for v in values)), nulls if any(nulls) else None)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, i):
+        if self.nulls is not None and self.nulls[i]:
+            return None
+        return self.values[i]
+
+    def dump(self, writer):
+        return {'kind': self.kind, 'values': writer.add(self.values), 'nulls': writer.add(self.nulls)}
+
+    @classmethod
+    def load(cls, reader, meta):
+        return cls(reader.get(meta['values']), reader.get(meta['nulls']))
+
+
+class FloatColumn:
+    """Flottants (coordonnées) en array('d') ; None stocké en NaN."""
+
+    kind = 'float'
+
+    def __init__(self, values):
+        self.values = values
+
+    @classmethod
+    def build(cls, values):
+        return cls(array('d', (math.nan if v is None else float(v) for v in values)))
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, i):
+        value = self.values[i]
+        return None if value != value else value
+
+    def dump(self, writer):
+        return {'kind': self.kind, 'values': writer.add(self.values)}
+
+    @classmethod
+    def load(cls, reader, meta):
+        return cls(reader.get(meta['values']))
+
+
+class ObjectColumn:
+    """Repli pour les valeurs hétérogènes ou imbriquées : liste Python telle quelle."""
+
+    kind = 'json'
+
+    def __init__(self, values):
+        self.values = values
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, i):
+        return self.values[i]
+
+    def dump(self, writer):
+        return {'kind': self.kind, 'values': writer.add_text(json.dumps(self.values, ensure_ascii=False))}
+
+    @classmethod
+    def load(cls, reader, meta):
+        return cls(json.loads(reader.text(meta['values'])))
+
+
+COLUMN_TYPES = {column.kind: column for column in (StringColumn, DictColumn, IntColumn, FloatColumn, ObjectColumn)}
+
+
+def build_column(field, values):
+    """Choisit la représentation la plus compacte qui restitue exactement les valeurs."""
+    if field in COORDINATE_BOUNDS:
+        return FloatColumn.build([parse_coordinate(v, COORDINATE_BOUNDS[field]) for v in values])
+    present = [v for v in values if v is not None]
+    if all(type(v) is int and -2 ** 63 <= v < 2 ** 63 for v in present):
+        return IntColumn.build(values)
+    if all(type(v) is float for v in present):
+        return FloatColumn.build(values)
+    if all(type(v) is str for v in present):
+        if len(set(present)) * DICT_ENCODING_RATIO <= len(values):
+            return DictColumn.build(values)
+        return StringColumn.build(values)
+    return ObjectColumn(list(values))
+
+
+class ClubTable:
+    """CLUBS_DB en colonnes (struct-of-arrays) ; chaque ligne est reconstruite en dict à la demande."""
+
+    def __init__(self, fields, columns):
+        self.fields = fields
+        self.columns = columns
+        self.by_name = dict(zip(fields, columns))
+        self.size = len(columns[0]) if columns else 0
+
+    @classmethod
+    def from_records(cls, records):
+        fields = list(dict.fromkeys(key for record in records for key in record))
+        columns = [build_column(field, [record.get(field) for record in records]) for field in fields]
+        return cls(fields, columns)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.size:
+            raise IndexError(i)
+        return {field: column[i] for field, column in zip(self.fields, self.columns)}
+
+    def value(self, i, field):
+        column = self.by_name.get(field)
+        return None if column is None else column[i]
+
+    def dump(self, writer):
+        return {'fields': self.fields, 'columns': [column.dump(writer) for column in self.columns]}
+
+    @classmethod
+    def load(cls, reader, meta):
+        return cls(meta['fields'], [COLUMN_TYPES[column['kind']].load(reader, column) for column in meta['columns']])
+
+
+# ==============================================================================
+# STRUCTURES D'INDEX
+# ==============================================================================
+class TextColumn:
+    """Textes normalisés (ASCII) concaténés dans une seule str + offsets : recherche bornée sans copie."""
+
+    def __init__(self, text, offsets):
+        self.text = text
+        self.offsets = offsets
+
+    @classmethod
+    def build(cls, texts):
+        offsets = array('I', [0])
+        for text in texts:
+            offsets.append(offsets[-1] + len(text))
+        return cls(''.join(texts), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.text[self.offsets[i]:self.offsets[i + 1]]
+
+    def contains(self, i, needle):
+        return self.text.find(needle, self.offsets[i], self.offsets[i + 1]) != -1
+
+    def dump(self, writer):
+        return {'text': writer.add_text(self.text), 'offsets': writer.add(self.offsets)}
+
+    @classmethod
+    def load(cls, reader, meta):
+        # Texte ASCII (normalisé) : la seule section recopiée en str, pour str.find
+        return cls(reader.text(meta['text']), reader.get(meta['offsets']))
+
+
+class Postings:
+    """Listes de postings concaténées dans un seul array('I') : clé -> tranche (memoryview, sans copie)."""
+
+    def __init__(self, keys, starts, ids):
+        self.slots = {key: k for k, key in enumerate(keys)}
+        self.starts = starts
+        self.ids = ids
+        self.view = memoryview(ids)
+
+    @classmethod
+    def build(cls, mapping):
+        keys = sorted(mapping)
+        starts = array('I', [0])
+        ids = array('I')
+        for key in keys:
+            ids.extend(mapping[key])
+            starts.append(len(ids))
+        return cls(keys, starts, ids)
+
+    def __contains__(self, key):
+        return key in self.slots
+
+    def __len__(self):
+        return len(self.slots)
+
+    def get(self, key, default=None):
+        k = self.slots.get(key)
+        if k is None:
+            return default
+        return self.view[self.starts[k]:self.starts[k + 1]]
+
+    def __getitem__(self, key):
+        k = self.slots[key]
+        return self.view[self.starts[k]:self.starts[k + 1]]
+
+    def dump(self, writer):
+        keys = list(self.slots)
+        meta = {'starts': writer.add(self.starts), 'ids': writer.add(self.ids)}
+        if all(type(key) is int for key in keys):
+            meta['int_keys'] = writer.add(array('q', keys))
+        else:
+            meta['keys'] = writer.add_text('\n'.join(keys))
+        return meta
+
+    @classmethod
+    def load(cls, reader, meta):
+        if 'int_keys' in meta:
+            keys = list(reader.get(meta['int_keys']))
+        else:
+            text = reader.text(meta['keys'])
+            keys = text.split('\n') if text else []
+        return cls(keys, reader.get(meta['starts']), reader.get(meta['ids']))
+
+
+class PrefixTable:
+    """Positions dans le texte de recherche, triées par le texte qui les suit : recherche de préfixe par bisect."""
+
+    def __init__(self, texts, positions, ids):
+        self.text = texts.text
+        self.positions = positions
+        self.ids = ids
+
+    @classmethod
+    def build(cls, texts, entries):
+        text = texts.text
+
+        def sort_key(entry):
+            # Clé arrêtée à la fin du champ : FIELD_SEP est inférieur à tout caractère indexé,
+            # l'ordre reste compatible avec la comparaison du texte brut faite par iter_prefix
+            pos = entry[0]
+            end = text.find(FIELD_SEP, pos, pos + PREFIX_KEY_LENGTH)
+            return text[pos:end if end != -1 else pos + PREFIX_KEY_LENGTH], entry[1]
+        entries.sort(key=sort_key)
+        return cls(texts, array('I', (p for p, _ in entries)), array('I', (i for _, i in entries)))
+
+    def iter_prefix(self, query):
+        """Identifiants dont le texte à la position commence par `query` (ordre alphabétique)."""
+        text = self.text
+        probe = query[:PREFIX_KEY_LENGTH]
+        positions = self.positions
+        i = bisect.bisect_left(positions, probe, key=lambda pos: text[pos:pos + len(probe)])
+        while i < len(positions) and text.startswith(probe, positions[i]):
+            if len(query) <= PREFIX_KEY_LENGTH or text.startswith(query, positions[i]):
+                yield self.ids[i]
+            i += 1
+
+    def dump(self, writer):
+        return {'positions': writer.add(self.positions), 'ids': writer.add(self.ids)}
+
+    @classmethod
+    def load(cls, reader, meta, texts):
+        return cls(texts, reader.get(meta['positions']), reader.get(meta['ids']))
+
+
+def parse_coordinate(value, bound):
+    """Coordonnée en float, ou None si absente, illisible ou hors bornes."""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    if math.isnan(value) or abs(value) > bound:
+        return None
+    return value
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Distance orthodromique en km entre deux points (degrés)."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    h = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(h)))
+
+
+class GeoIndex:
+    """Grille régulière en degrés : cellule -> identifiants des clubs géolocalisés."""
+
+    def __init__(self, lats, lngs, ids, cells, cell_degrees=GRID_CELL_DEGREES):
+        self.cell = cell_degrees
+        self.lats = lats
+        self.lngs = lngs
+        self.ids = ids
+        self.cells = cells
+        rows = [key // GRID_KEY_BASE for key in cells.slots]
+        cols = [key % GRID_KEY_BASE for key in cells.slots]
+        cols = [c - GRID_KEY_BASE if c >= GRID_KEY_BASE // 2 else c for c in cols]
+        self.row_range = (min(rows), max(rows)) if rows else (0, -1)
+        self.col_range = (min(cols), max(cols)) if cols else (0, -1)
+
+    @classmethod
+    def build(cls, latitudes, longitudes, cell_degrees=GRID_CELL_DEGREES):
+        """À partir des colonnes de coordonnées (NaN = absente) de la table."""
+        lats = array('d')
+        lngs = array('d')
+        ids = array('I')
+        cells = {}
+        for club_id in range(len(latitudes)):
+            lat, lng = latitudes[club_id], longitudes[club_id]
+            # (0, 0) = coordonnées manquantes dans l'export, pas un club dans le golfe de Guinée
+            if lat is None or lng is None or (lat == 0 and lng == 0):
+                continue
+            cells.setdefault(cls.cell_key(lat, lng, cell_degrees), []).append(len(ids))
+            ids.append(club_id)
+            lats.append(lat)
+            lngs.append(lng)
+        return cls(lats, lngs, ids, Postings.build(cells), cell_degrees)
+
+    @staticmethod
+    def cell_key(lat, lng, cell_degrees):
+        return int(math.floor(lat / cell_degrees)) * GRID_KEY_BASE + int(math.floor(lng / cell_degrees))
+
+    def dump(self, writer):
+        return {'lats': writer.add(self.lats), 'lngs': writer.add(self.lngs), 'ids': writer.add(self.ids),
+                'cells': self.cells.dump(writer), 'cell_degrees': self.cell}
+
+    @classmethod
+    def load(cls, reader, meta):
+        return cls(reader.get(meta['lats']), reader.get(meta['lngs']), reader.get(meta['ids']),
+                   Postings.load(reader, meta['cells']), meta['cell_degrees'])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _cell_of(self, lat, lng):
+        return (int(math.floor(lat / self.cell)), int(math.floor(lng / self.cell)))
+
+    def _scan(self, lat, lng, rows, cols):
+        """(distance, identifiant) des clubs des cellules rows x cols."""
+        found = []
+        for row in rows:
+            for col in cols:
+                for position in self.cells.get(row * GRID_KEY_BASE + col, ()):
+                    distance = haversine_km(lat, lng, self.lats[position], self.lngs[position])
+                    found.append((distance, self.ids[position]))
+        return found
+
+    def _lng_span(self, lat, radius_km):
+        """Demi-largeur en degrés de longitude couvrant `radius_km` autour de la latitude `lat`."""
+        lat_span = radius_km / KM_PER_DEGREE
+        widest = min(89.0, abs(lat) + lat_span)   # Latitude la plus haute touchée : degrés les plus courts
+        return min(180.0, GRID_MARGIN * radius_km / (KM_PER_DEGREE * math.cos(math.radians(widest))))
+
+    def within(self, lat, lng, radius_km, limit=None):
+        """(distance_km, identifiant) des clubs à moins de `radius_km`, du plus proche au plus loin."""
+        if not self.ids:
+            return []
+        lat_span = GRID_MARGIN * radius_km / KM_PER_DEGREE
+        lng_span = self._lng_span(lat, radius_km)
+        row_lo, col_lo = self._cell_of(lat - lat_span, lng - lng_span)
+        row_hi, col_hi = self._cell_of(lat + lat_span, lng + lng_span)
+        rows = range(max(row_lo, self.row_range[0]), min(row_hi, self.row_range[1]) + 1)
+        cols = range(max(col_lo, self.col_range[0]), min(col_hi, self.col_range[1]) + 1)
+        found = [item for item in self._scan(lat, lng, rows, cols) if item[0] <= radius_km]
+        if limit is not None:
+            return heapq.nsmallest(limit, found)
+        found.sort()
+        return found
+
+    def nearest(self, lat, lng, k):
+        """Les `k` clubs les plus proches : anneaux de cellules jusqu'à ce que le k-ième soit garanti."""
+        if not self.ids or k <= 0:
+            return []
+        center_row, center_col = self._cell_of(lat, lng)
+        max_ring = max(
+            abs(center_row - self.row_range[0]), abs(center_row - self.row_range[1]),
+            abs(center_col - self.col_range[0]), abs(center_col - self.col_range[1]),
+        )
+        found = []
+        ring = 0
+        while True:
+            if ring == 0:
+                found.extend(self._scan(lat, lng, [center_row], [center_col]))
+            else:
+                rows = range(center_row - ring, center_row + ring + 1)
+                for row in (center_row - ring, center_row + ring):
+                    found.extend(self._scan(lat, lng, [row], range(center_col - ring, center_col + ring + 1)))
+                found.extend(self._scan(lat, lng, rows[1:-1], [center_col - ring]))
+                found.extend(self._scan(lat, lng, rows[1:-1], [center_col + ring]))
+            # Tout club hors des anneaux parcourus est à au moins `covered` km
+            edge_lat = min(89.0, abs(lat) + (ring + 1) * self.cell)
+            covered = ring * self.cell * KM_PER_DEGREE * math.cos(math.radians(edge_lat)) / GRID_MARGIN
+            if len(found) >= k:
+                best = heapq.nsmallest(k, found)
+                if best[-1][0] <= covered or ring >= max_ring:
+                    return best
+            elif ring >= max_ring:
+                return sorted(found)
+            ring += 1
+
+
+def city_key(city):
+    """Clé d'une ville : forme normalisée et développée ("ST-ÉTIENNE" et "Saint Etienne" -> "saint etienne")."""
+    return expand_abbreviations(normalize(city))
+
+
+class CityIndex:
+    """Villes des clubs : clé normalisée -> clubs (hash), et noms triés pour l'autocomplétion (bisect)."""
+
+    def __init__(self, names, clubs, texts, prefixes):
+        self.names = names          # Nom affiché de chaque ville (rang de sa clé dans `clubs`)
+        self.clubs = clubs          # Postings clé -> clubs de la ville, triés par nom
+        self.texts = texts
+        self.prefixes = prefixes
+
+    @classmethod
+    def build(cls, table):
+        spellings = {}
+        members = {}
+        column = table.by_name.get(CITY_FIELD)
+        for club_id in range(len(table) if column is not None else 0):
+            city = (column[club_id] or '').strip()
+            key = city_key(city)
+            if not key:
+                continue
+            members.setdefault(key, []).append(club_id)
+            counts = spellings.setdefault(key, {})
+            counts[city] = counts.get(city, 0) + 1
+        for key, club_ids in members.items():
+            club_ids.sort(key=lambda club_id: (normalize(table.value(club_id, 'name')), club_id))
+        clubs = Postings.build(members)
+        # Graphie affichée : la plus fréquente parmi les clubs de la ville
+        names = StringColumn.build([max(spellings[key].items(), key=lambda item: (item[1], item[0]))[0]
+                                    for key in clubs.slots])
+        texts = []
+        entries = []
+        offset = 0
+        for city_id, key in enumerate(clubs.slots):
+            # Forme repliée en plus de la clé : "st e" doit aussi trouver "saint etienne"
+            variants = dict.fromkeys((key, normalize(names[city_id])))
+            text = FIELD_SEP + FIELD_SEP.join(variants)
+            entries.extend((offset + m.end(), city_id) for m in FIELD_START.finditer(text))
+            texts.append(text)
+            offset += len(text)
+        texts = TextColumn.build(texts)
+        return cls(names, clubs, texts, PrefixTable.build(texts, entries))
+
+    def __len__(self):
+        return len(self.clubs)
+
+    def search(self, query, limit=20):
+        """Villes dont le nom commence par `query`, dans l'ordre alphabétique des clés."""
+        found = set()
+        for variant in query_variants(query):
+            if not variant:
+                continue
+            matches = set()
+            for city_id in self.prefixes.iter_prefix(variant):
+                matches.add(city_id)
+                if len(matches) >= limit:
+                    break
+            found |= matches
+        # Les identifiants suivent l'ordre des clés triées
+        return [self.names[city_id] for city_id in sorted(found)[:limit]]
+
+    def clubs_in(self, city):
+        """Identifiants des clubs d'une ville (nom exact à la normalisation près), triés par nom."""
+        return self.clubs.get(city_key(city), ())
+
+    def dump(self, writer):
+        return {'names': self.names.dump(writer), 'clubs': self.clubs.dump(writer),
+                'texts': self.texts.dump(writer), 'prefixes': self.prefixes.dump(writer)}
+
+    @classmethod
+    def load(cls, reader, meta):
+        texts = TextColumn.load(reader, meta['texts'])
+        return cls(StringColumn.load(reader, meta['names']), Postings.load(reader, meta['clubs']),
+                   texts, PrefixTable.load(reader, meta['prefixes'], texts))
+
+
+class ClubIndex:
+    """Index trigrammes / bigrammes / préfixes / grille sur une ClubTable."""
+
+    def __init__(self, table, search_texts, trigrams, bigrams, field_starts, word_starts,
+                 vocab, word_clubs, vocab_grams, geo, cities):
+        self.table = table
+        self.search_texts = search_texts
+        self.trigrams = trigrams
+        self.bigrams = bigrams
+        self.field_starts = field_starts
+        self.word_starts = word_starts
+        # Vocabulaire pour la recherche approchée : mot -> clubs, trigrammes bornés -> mots
+        self.vocab = vocab
+        self.word_clubs = word_clubs
+        self.vocab_grams = vocab_grams
+        self.geo = geo
+        self.cities = cities
+
+    @classmethod
+    def build(cls, table):
+        texts = []
+        trigrams = {}
+        bigrams = {}
+        field_starts = []
+        word_entries = []
+        word_clubs = {}
+        offset = 0
+        for club_id in range(len(table)):
+            fields = [value for field in SEARCH_FIELDS for value in index_variants(table.value(club_id, field))]
+            text = FIELD_SEP + FIELD_SEP.join(fields)
+            texts.append(text)
+            # Positions absolues (dans le texte concaténé) des débuts de champ et de mot
+            field_starts.extend((offset + m.end(), club_id) for m in FIELD_START.finditer(text))
+            word_entries.extend((offset + m.end(), club_id) for m in WORD_START.finditer(text))
+            offset += len(text)
+            for word in {w for value in fields for w in value.split()}:
+                word_clubs.setdefault(word, []).append(club_id)
+            grams3 = set()
+            grams2 = set()
+            for value in fields:
+                grams3 |= ngrams(value, 3)
+                grams2 |= ngrams(value, 2)
+            for gram in grams3:
+                trigrams.setdefault(gram, []).append(club_id)
+            for gram in grams2:
+                bigrams.setdefault(gram, []).append(club_id)
+        search_texts = TextColumn.build(texts)
+        vocab = sorted(word_clubs)
+        vocab_grams = {}
+        for word_id, word in enumerate(vocab):
+            for gram in padded_trigrams(word):
+                vocab_grams.setdefault(gram, []).append(word_id)
+        latitudes = table.by_name.get('latitude')
+        longitudes = table.by_name.get('longitude')
+        if latitudes is not None and longitudes is not None:
+            geo = GeoIndex.build(latitudes, longitudes)
+        else:
+            geo = GeoIndex.build([], [])
+        return cls(table, search_texts, Postings.build(trigrams), Postings.build(bigrams),
+                   PrefixTable.build(search_texts, field_starts), PrefixTable.build(search_texts, word_entries),
+                   vocab, Postings.build(word_clubs), Postings.build(vocab_grams), geo, CityIndex.build(table))
+
+    def dump(self, writer):
+        return {
+            'search_texts': self.search_texts.dump(writer),
+            'trigrams': self.trigrams.dump(writer),
+            'bigrams': self.bigrams.dump(writer),
+            'field_starts': self.field_starts.dump(writer),
+            'word_starts': self.word_starts.dump(writer),
+            'vocab': writer.add_text('\n'.join(self.vocab)),
+            'word_clubs': self.word_clubs.dump(writer),
+            'vocab_grams': self.vocab_grams.dump(writer),
+            'geo': self.geo.dump(writer),
+            'cities': self.cities.dump(writer),
+        }
+
+    @classmethod
+    def load(cls, reader, meta, table):
+        search_texts = TextColumn.load(reader, meta['search_texts'])
+        vocab = reader.text(meta['vocab'])
+        return cls(table, search_texts, Postings.load(reader, meta['trigrams']), Postings.load(reader, meta['bigrams']),
+                   PrefixTable.load(reader, meta['field_starts'], search_texts),
+                   PrefixTable.load(reader, meta['word_starts'], search_texts),
+                   vocab.split('\n') if vocab else [], Postings.load(reader, meta['word_clubs']),
+                   Postings.load(reader, meta['vocab_grams']), GeoIndex.load(reader, meta['geo']),
+                   CityIndex.load(reader, meta['cities']))
+
+    def __len__(self):
+        return len(self.table)
+
+    def _candidates(self, query):
+        """
+        Postings du n-gramme le plus sélectif de la requête (ordre du fichier).
+        Chaque candidat est de toute façon vérifié sur le texte : inutile d'intersecter.
+        """
+        if len(query) >= 3:
+            postings = [self.trigrams.get(gram) for gram in ngrams(query, 3)]
+        else:
+            postings = [self.bigrams.get(query)]
+        if any(p is None for p in postings):
+            return ()
+        return min(postings, key=len)
+
+    def search(self, query, limit=20, fuzzy=True):
+        """Clubs correspondant à `query`, les mieux classés d'abord (au plus `limit`)."""
+        variants = [v for v in query_variants(query) if len(v) >= 2]
+        if not variants:
+            return []
+        texts = self.search_texts
+        found = []
+        seen = set()
+        # 1. Début de champ puis début de mot : lus directement dans les tables triées
+        for rank_table in (self.field_starts, self.word_starts):
+            for variant in variants:
+                for club_id in rank_table.iter_prefix(variant):
+                    if club_id in seen:
+                        continue
+                    seen.add(club_id)
+                    found.append(club_id)
+                    if len(found) >= limit:
+                        return [self.table[i] for i in found]
+        # 2. Sous-chaînes : candidats par n-grammes, vérifiés, dans l'ordre du fichier
+        for variant in variants:
+            for club_id in self._candidates(variant):
+                if club_id not in seen and texts.contains(club_id, variant):
+                    seen.add(club_id)
+                    found.append(club_id)
+                    if len(found) >= limit:
+                        return [self.table[i] for i in found]
+        # 3. Aucun résultat exact : probablement une faute de frappe
+        if not found and fuzzy:
+            return self.fuzzy_search(query, limit)
+        return [self.table[i] for i in found]
+
+    def _vocab_matches(self, word, last):
+        """Mots du vocabulaire proches de `word` -> distance (préfixes admis pour le dernier mot)."""
+        typos = max_typos(word)
+        if typos == 0:
+            if not last:
+                return {word: 0} if word in self.word_clubs else {}
+            i = bisect.bisect_left(self.vocab, word)
+            matches = {}
+            while i < len(self.vocab) and self.vocab[i].startswith(word):
+                matches[self.vocab[i]] = 0
+                i += 1
+            return matches
+        # Filtre : une faute fait perdre au plus 3 trigrammes bornés (4 pour une inversion)
+        grams = padded_trigrams(word, prefix=last)
+        threshold = max(1, len(grams) - 3 * typos - 1)
+        counts = {}
+        for gram in grams:
+            for word_id in self.vocab_grams.get(gram, ()):
+                counts[word_id] = counts.get(word_id, 0) + 1
+        candidates = [word_id for word_id, count in counts.items() if count >= threshold]
+        # Les mots les plus proches partagent le plus de trigrammes : on borne le nombre de vérifications
+        if len(candidates) > FUZZY_MAX_CANDIDATES:
+            candidates = heapq.nlargest(FUZZY_MAX_CANDIDATES, candidates, key=counts.__getitem__)
+        matches = {}
+        for word_id in candidates:
+            candidate = self.vocab[word_id]
+            distance = bounded_levenshtein(word, candidate, typos, prefix=last)
+            if distance is not None:
+                matches[candidate] = distance
+        return matches
+
+    def _fuzzy_scores(self, words):
+        """club_id -> somme des distances, pour les clubs qui contiennent tous les mots (à quelques fautes près)."""
+        per_word = []
+        for position, word in enumerate(words):
+            matches = self._vocab_matches(word, last=position == len(words) - 1)
+            if not matches:
+                return {}
+            size = sum(len(self.word_clubs[candidate]) for candidate in matches)
+            per_word.append((size, matches))
+        # On part du mot le plus sélectif, les autres sont vérifiés sur les mots de chaque candidat
+        per_word.sort(key=lambda item: item[0])
+        scores = {}
+        for candidate, distance in per_word[0][1].items():
+            for club_id in self.word_clubs[candidate]:
+                if distance < scores.get(club_id, distance + 1):
+                    scores[club_id] = distance
+        others = [matches for _, matches in per_word[1:]]
+        if not others:
+            return scores
+        result = {}
+        for club_id, score in scores.items():
+            club_words = self.search_texts[club_id].replace(FIELD_SEP, ' ').split()
+            for matches in others:
+                best = min((matches[w] for w in club_words if w in matches), default=None)
+                if best is None:
+                    break
+                score += best
+            else:
+                result[club_id] = score
+        return result
+
+    def fuzzy_search(self, query, limit=20):
+        """Recherche tolérante aux fautes : tous les mots doivent se retrouver, les plus proches d'abord."""
+        scores = {}
+        for variant in query_variants(query):
+            words = variant.split()
+            if not words:
+                continue
+            for club_id, score in self._fuzzy_scores(words).items():
+                if score < scores.get(club_id, score + 1):
+                    scores[club_id] = score
+        best = heapq.nsmallest(limit, scores.items(), key=lambda item: (item[1], item[0]))
+        return [self.table[club_id] for club_id, _ in best]
+
+
+# ==============================================================================
+# INDEX BINAIRE (mmap)
+# ==============================================================================
+class IndexWriter:
+    """Accumule les sections binaires d'un fichier d'index, alignées sur INDEX_ALIGN octets."""
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def add(self, buffer):
+        """Référence [offset, longueur, format] de la section, à ranger dans le manifeste."""
+        if buffer is None:
+            return None
+        view = memoryview(buffer)
+        data = view.tobytes()
+        ref = [self.size, len(data), view.format]
+        padding = -len(data) % INDEX_ALIGN
+        self.chunks.append(data)
+        if padding:
+            self.chunks.append(bytes(padding))
+        self.size += len(data) + padding
+        return ref
+
+    def add_text(self, text):
+        return self.add(text.encode('utf-8'))
+
+
+class IndexReader:
+    """Sections d'un index ouvert par mmap, rendues en memoryview typées (aucune copie)."""
+
+    def __init__(self, view):
+        self.view = view
+
+    def get(self, ref):
+        if ref is None:
+            return None
+        offset, length, fmt = ref
+        section = self.view[offset:offset + length]
+        return section if fmt == 'B' else section.cast(fmt)
+
+    def text(self, ref):
+        return str(self.view[ref[0]:ref[0] + ref[1]], 'utf-8')
+
+
+def native_layout():
+    """Ordre des octets et tailles des types : un index n'est relu que sur une machine compatible."""
+    return {'byteorder': sys.byteorder, 'itemsize': {code: array(code).itemsize for code in 'Iqd'}}
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _data_offset(manifest_length):
+    end = INDEX_HEADER.size + manifest_length
+    return end + (-end % INDEX_ALIGN)
+
+
+def write_index_file(path, table, index, source_digest):
+    """Écrit table + index dans `path` (remplacement atomique : les workers ne lisent jamais un fichier partiel)."""
+    writer = IndexWriter()
+    manifest = {
+        'layout': native_layout(),
+        'source_sha256': source_digest,
+        'clubs': len(table),
+        'built_at': int(time.time()),
+        'table': table.dump(writer),
+        'index': index.dump(writer),
+    }
+    header = json.dumps(manifest).encode('utf-8')
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_FORMAT_VERSION, len(header)))
+        f.write(header)
+        f.write(bytes(_data_offset(len(header)) - INDEX_HEADER.size - len(header)))
+        for chunk in writer.chunks:
+            f.write(chunk)
+    os.replace(tmp_path, path)
+
+
+def build_from_bytes(raw, digest=None):
+    """Construit (table, index, empreinte SHA-256) depuis le JSON des clubs déjà lu (`digest` : empreinte déjà calculée)."""
+    table = ClubTable.from_records(json.loads(raw))
+    return table, ClubIndex.build(table), digest or hashlib.sha256(raw).hexdigest()
+
+
+def build_from_source(source_path):
+    """Lit le JSON des clubs et construit (table, index, empreinte SHA-256 du fichier lu)."""
+    with open(source_path, 'rb') as f:
+        return build_from_bytes(f.read())
+
+
+def build_index_file(source_path, index_path):
+    """Compile le JSON des clubs en index binaire ; rend (table, index)."""
+    table, index, digest = build_from_source(source_path)
+    write_index_file(index_path, table, index, digest)
+    return table, index
+
+
+def open_index_file(index_path, source_path=None, source_digest=None):
+    """
+    (table, index) lus par mmap depuis l'index binaire, ou None s'il est absent,
+    d'un autre format, ou périmé (empreinte différente de `source_digest`, ou à défaut
+    de celle de `source_path`, hachée ici).
+    """
+    try:
+        with open(index_path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):
+        return None
+    manifest = None
+    try:
+        magic, version, manifest_length = INDEX_HEADER.unpack_from(mapped)
+        if magic == INDEX_MAGIC and version == INDEX_FORMAT_VERSION:
+            manifest = json.loads(mapped[INDEX_HEADER.size:INDEX_HEADER.size + manifest_length])
+    except (struct.error, ValueError):
+        pass
+    if manifest is not None and source_digest is None and source_path and os.path.exists(source_path):
+        source_digest = file_digest(source_path)
+    if manifest is None or manifest.get('layout') != native_layout() or (
+            source_digest is not None and source_digest != manifest.get('source_sha256')):
+        mapped.close()
+        return None
+    # Les memoryview gardent le mmap ouvert tant que la table ou l'index sont référencés
+    reader = IndexReader(memoryview(mapped)[_data_offset(manifest_length):])
+    table = ClubTable.load(reader, manifest['table'])
+    return table, ClubIndex.load(reader, manifest['index'], table)
+
+
+def main(argv=None):
+    here = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Index binaire de la base des clubs")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="Compile clubs_full.json en index binaire (à relancer après chaque mise à jour)")
+    build.add_argument('--source', default=os.path.join(here, 'static', 'clubs_full.json'))
+    build.add_argument('--output', default=os.path.join(here, 'static', INDEX_FILENAME))
+    args = parser.parse_args(argv)
+
+    start = time.time()
+    table, _ = build_index_file(args.source, args.output)
+    size_mb = os.path.getsize(args.output) / 1e6
+    print(f"✅ Index binaire écrit : {args.output} ({len(table)} clubs, {size_mb:.1f} Mo, {time.time() - start:.2f}s)")
+
+
+if __name__ == '__main__':
+    main()
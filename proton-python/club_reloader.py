@@ -0,0 +1,131 @@
+"""
+Chargement et rechargement à chaud de la base des clubs (static/clubs_full.json).
+
+Un thread d'arrière-plan surveille le fichier et construit l'index hors du chemin des requêtes :
+- détection par mtime + taille, confirmée par l'empreinte SHA-256 (un simple `touch` ne recharge rien) ;
+  le fichier est lu et haché une seule fois : la même empreinte sert à valider l'index binaire
+  et à construire l'index depuis ces octets ;
+- index binaire à jour (club_db.open_index_file) si possible, sinon JSON + ClubIndex.build,
+  puis réécriture de l'index binaire pour les prochains démarrages ;
+- l'index courant est remplacé en une seule affectation : une requête lit `reloader.index`
+  une fois et garde une table et un index cohérents jusqu'à sa fin ;
+- fichier absent ou illisible : l'index précédent reste servi et le fichier n'est revérifié
+  qu'après une fenêtre de cache négatif. Les requêtes ne touchent jamais au disque.
+"""
+import hashlib
+import os
+import threading
+import time
+
+import club_db
+
+CHECK_INTERVAL = float(os.environ.get('CLUBS_RELOAD_INTERVAL', 10))
+MISSING_INTERVAL = float(os.environ.get('CLUBS_MISSING_RETRY', 60))
+SETTLE_SECONDS = 2.0    # Fichier modifié il y a moins de 2 s : probablement en cours d'écriture
+
+
+class ClubReloader:
+    """Thread unique qui garde `index` (club_db.ClubIndex, ou None) à jour avec le fichier source."""
+
+    def __init__(self, source_path, index_path, check_interval=CHECK_INTERVAL,
+                 missing_interval=MISSING_INTERVAL, persist=True):
+        self.source_path = source_path
+        self.index_path = index_path
+        self.check_interval = check_interval
+        self.missing_interval = missing_interval
+        self.persist = persist
+        self.index = None
+        self.loaded_stat = None     # (mtime_ns, taille) du JSON dont provient l'index courant
+        self.loaded_digest = None
+        self.rejected = None        # (stat, empreinte) du dernier fichier illisible, pour ne pas le relire
+        self.missing_reported = False
+        self.wakeup = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='clubs-reloader', daemon=True)
+                self.thread.start()
+
+    def check_now(self):
+        """Réveille le thread (après un téléchargement de la base, par exemple)."""
+        self.wakeup.set()
+
+    def _run(self):
+        while True:
+            try:
+                delay = self.check()
+            except Exception as e:
+                print(f"⚠️ [Clubs] Vérification de la base impossible : {e}")
+                delay = self.check_interval
+            self.wakeup.wait(delay)
+            self.wakeup.clear()
+
+    def check(self):
+        """Une vérification (rechargement si besoin) ; rend le délai avant la suivante."""
+        try:
+            stat = os.stat(self.source_path)
+        except FileNotFoundError:
+            if self.index is None:
+                self._load_orphan_index()
+            return self.missing_interval
+        self.missing_reported = False
+        stat_key = (stat.st_mtime_ns, stat.st_size)
+        if stat_key == self.loaded_stat or (self.rejected and stat_key == self.rejected[0]):
+            return self.check_interval
+        if time.time() - stat.st_mtime < SETTLE_SECONDS:
+            return SETTLE_SECONDS
+        try:
+            with open(self.source_path, 'rb') as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return self.missing_interval
+        digest = hashlib.sha256(raw).hexdigest()
+        if digest == self.loaded_digest:
+            self.loaded_stat = stat_key
+            return self.check_interval
+        if self.rejected and digest == self.rejected[1]:
+            self.rejected = (stat_key, digest)
+            return self.check_interval
+        try:
+            self._load(stat_key, raw, digest)
+        except Exception as e:
+            print(f"❌ [Clubs] {os.path.basename(self.source_path)} illisible, index précédent conservé : {e}")
+            self.rejected = (stat_key, digest)
+        return self.check_interval
+
+    def _load(self, stat_key, raw, digest):
+        start = time.time()
+        reloading = self.index is not None
+        origin = "index binaire (mmap)"
+        loaded = club_db.open_index_file(self.index_path, source_digest=digest)
+        if loaded is not None:
+            index = loaded[1]
+        else:
+            origin = "JSON"
+            _, index, _ = club_db.build_from_bytes(raw, digest)
+            if self.persist:
+                try:
+                    club_db.write_index_file(self.index_path, index.table, index, digest)
+                except OSError as e:
+                    print(f"⚠️ [Clubs] Index binaire non écrit ({self.index_path}) : {e}")
+        self.index = index
+        self.loaded_stat = stat_key
+        self.loaded_digest = digest
+        self.rejected = None
+        verb = "rechargée" if reloading else "chargée"
+        print(f"✅ [Clubs] Base {verb} depuis {origin} : {len(index)} clubs en {time.time() - start:.2f}s")
+
+    def _load_orphan_index(self):
+        """JSON absent mais index binaire présent (déploiement sans la source) : on le sert tel quel."""
+        loaded = club_db.open_index_file(self.index_path)
+        if loaded is None:
+            if not self.missing_reported:
+                print(f"⚠️ [Clubs] {os.path.basename(self.source_path)} introuvable (téléchargement en cours?), "
+                      f"vérification toutes les {self.missing_interval:.0f}s")
+                self.missing_reported = True
+            return
+        self.index = loaded[1]
+        print(f"✅ [Clubs] Base chargée depuis l'index binaire seul : {len(self.index)} clubs")
@@ -0,0 +1,81 @@
+"""
+Texte indexé et requêtes de la recherche plein texte (FTS5) de la bibliothèque.
+
+FTS5 ne sait pas raciniser le français : les textes sont repliés (minuscules, sans accents,
+« 4 contre 4 » -> « 4v4 ») et racinisés ici, avant l'index comme avant la requête, puis confiés
+au tokenizer unicode61 (remove_diacritics 2). Le racinisateur est volontairement léger : pluriels,
+féminins et terminaisons verbales courantes (« défensives » / « défensif », « centrer » / « centré »
+/ « centres »), sans chercher à regrouper des mots de sens différents.
+"""
+import exercise_similarity
+
+FIELDS = ('summary', 'video_description', 'synopsis')
+FIELD_WEIGHTS = (5.0, 2.0, 1.0)     # bm25 : le titre compte plus qu'une mention dans le synopsis
+MIN_STEM = 3
+
+# (suffixe, remplacement), le premier qui s'applique gagne ; après retrait du pluriel
+SUFFIXES = (
+    ('ement', ''), ('euse', 'eur'), ('ive', 'if'), ('ienne', 'ien'), ('onne', 'on'),
+    ('elle', 'el'), ('ette', 'et'), ('ere', ''), ('ee', ''), ('er', ''), ('e', ''),
+)
+
+
+def stem(word):
+    """Racine d'un mot déjà replié (minuscules sans accents)."""
+    if len(word) <= MIN_STEM or not word.isalpha():
+        return word
+    if word.endswith('aux') and len(word) > 4:
+        word = word[:-3] + 'al'
+    elif word[-1] in 'sx':
+        word = word[:-1]
+    for suffix, replacement in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) + len(replacement) >= MIN_STEM:
+            return word[:-len(suffix)] + replacement
+    return word
+
+
+def words(text):
+    """Mots significatifs d'un texte, repliés mais non racinisés, dans l'ordre."""
+    return [word for word in exercise_similarity.normalize(text).split()
+            if word not in exercise_similarity.FUNCTION_WORDS]
+
+
+def terms(text):
+    """Racines des mots significatifs d'un texte, dans l'ordre."""
+    return [stem(word) for word in words(text)]
+
+
+def prefixes(word):
+    """
+    Préfixes à chercher pour un mot en cours de saisie : sa racine, le mot tel quel, et les
+    complétions d'un suffixe que stem() réécrit (« défensiv » -> « defensif », « danseus » -> « danseur »).
+    """
+    found = [stem(word), word]
+    for suffix, replacement in (('aux', 'al'),) + SUFFIXES:
+        for k in range(1, len(suffix)):
+            partial = suffix[:k]
+            if word.endswith(partial) and not replacement.startswith(partial) \
+                    and len(word) - k + len(replacement) >= MIN_STEM:
+                found.append(word[:-k] + replacement)
+    return list(dict.fromkeys(found))
+
+
+def document(exo):
+    """Valeurs des colonnes FTS d'un exercice (synopsis sans SVG ni intitulés de sections)."""
+    return tuple(' '.join(terms(exercise_similarity.exercise_text(exo, field))) for field in FIELDS)
+
+
+def match_query(text):
+    """
+    Requête MATCH : tous les termes, le dernier en préfixe (saisie en cours) ; None si rien à chercher.
+    Le dernier mot peut être incomplet : sa racine ne préfixe pas forcément celle du mot entier,
+    d'où l'alternative entre les préfixes de prefixes().
+    Les termes sont cités, la syntaxe FTS5 tapée par l'utilisateur n'est donc pas interprétée.
+    """
+    typed = words(text)
+    if not typed:
+        return None
+    quoted = [f'"{stem(word)}"' for word in typed[:-1]]
+    last = [f'"{prefix}"*' for prefix in prefixes(typed[-1])]
+    quoted.append(last[0] if len(last) == 1 else f"({' OR '.join(last)})")
+    return ' AND '.join(quoted)
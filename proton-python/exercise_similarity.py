@@ -0,0 +1,205 @@
+"""
+Détection des exercices quasi-doublons (MinHash + LSH).
+
+Chaque exercice est réduit à un ensemble de « shingles » (mots porteurs de sens et paires de mots
+consécutifs) tirés du titre, du synopsis (sans le SVG ni les intitulés de sections imposés par le
+prompt) et du matériel. Sa signature MinHash estime la similarité de Jaccard entre deux ensembles ;
+découpée en bandes, elle sert de clé de seau LSH : seuls les exercices qui partagent un seau sont
+comparés, ce qui évite le tout-contre-tout.
+
+Les hachages sont stables d'un processus à l'autre (blake2b, permutations tirées d'une graine fixe) :
+signatures et clés de bandes peuvent être stockées.
+"""
+import hashlib
+import operator
+import os
+import random
+import re
+import struct
+import unicodedata
+
+NUM_PERM = 64
+BANDS = 32
+ROWS = NUM_PERM // BANDS        # Seuil LSH ~ (1/32)^(1/2) ≈ 0.18 : large, la similarité est revérifiée ensuite
+SIMILARITY_THRESHOLD = float(os.environ.get('EXERCISE_DEDUP_THRESHOLD', 0.4))
+TIME_WINDOW = int(os.environ.get('EXERCISE_DEDUP_WINDOW', 60))     # Secondes, au sein d'une même vidéo
+MIN_TOKEN_LENGTH = 2
+
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+_rng = random.Random(0x5EED)
+PERMUTATIONS = [(_rng.randrange(1, MERSENNE_PRIME), _rng.randrange(0, MERSENNE_PRIME)) for _ in range(NUM_PERM)]
+BAND_PACK = struct.Struct(f'<B{ROWS}I')
+
+TEXT_FIELDS = ('summary', 'synopsis', 'materiel_detail')
+DETAIL_FIELDS = ('materiel_detail', 'dimensions', 'nb_joueurs_exact', 'timing_detail_pro',
+                 'duree_totale', 'cat_range', 'level_range')
+
+SVG_BLOCK = re.compile(r'```svg.*?(?:```|$)|<svg\b.*?(?:</svg>|$)', re.DOTALL | re.IGNORECASE)
+MARKDOWN_HEADING = re.compile(r'^\s*#+[^\n]*$', re.MULTILINE)
+VERSUS = re.compile(r'\b(\d+)\s*(?:contre|vs|v|c)\s*(\d+)\b')
+NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+FUNCTION_WORDS = frozenset("""
+a au aux avec ce ces cette dans de des du elle en et est il ils la le les leur leurs mais ne ni
+on ou par pas plus pour qu que qui sa se ses si son sont sur ta te tes un une vers y d l s n c
+chaque entre apres avant puis lors tout tous toute toutes fois doit peut
+""".split())
+
+# Mots outils + vocabulaire présent dans presque toutes les fiches : ils rapprochent des exercices
+# différents (« jeu », « conservation »...) sans rien dire de l'exercice lui-même.
+STOPWORDS = FUNCTION_WORDS | frozenset("""
+jeu joueur joueurs exercice exercices equipe equipes ballon ballons match seance
+travail travailler objectif consigne consignes min minute minutes seconde secondes
+""".split())
+
+
+def normalize(text):
+    """Minuscules sans accents, « 4 contre 4 » -> « 4v4 », ponctuation -> espace."""
+    text = unicodedata.normalize('NFKD', str(text or '').lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    text = VERSUS.sub(r'\1v\2', text)
+    return NON_ALNUM.sub(' ', text).strip()
+
+
+def content_tokens(text):
+    tokens = []
+    for word in normalize(text).split():
+        if word in STOPWORDS or len(word) < MIN_TOKEN_LENGTH:
+            continue
+        if len(word) > 3 and word[-1] in 'sx' and not word[-2].isdigit():
+            word = word[:-1]    # Pluriel : « plots » et « plot » se confondent
+        tokens.append(word)
+    return tokens
+
+
+def exercise_text(exo, field):
+    value = exo.get(field)
+    if isinstance(value, (list, tuple)):
+        value = ' '.join(str(v) for v in value)
+    value = str(value or '')
+    if field == 'synopsis':
+        value = MARKDOWN_HEADING.sub(' ', SVG_BLOCK.sub(' ', value))
+    return value
+
+
+def shingles(exo):
+    """Ensemble des mots et paires de mots significatifs de l'exercice (tous champs texte confondus)."""
+    result = set()
+    for field in TEXT_FIELDS:
+        tokens = content_tokens(exercise_text(exo, field))
+        result.update(tokens)
+        result.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+    return result
+
+
+def signature(features):
+    """Signature MinHash (NUM_PERM entiers 32 bits) d'un ensemble de shingles ; None s'il est vide."""
+    if not features:
+        return None
+    hashes = [int.from_bytes(hashlib.blake2b(f.encode('utf-8'), digest_size=8).digest(), 'little')
+              for f in features]
+    return tuple(min([(a * h + b) % MERSENNE_PRIME for h in hashes]) & MAX_HASH for a, b in PERMUTATIONS)
+
+
+def exercise_signature(exo):
+    return signature(shingles(exo))
+
+
+def band_keys(sig):
+    """Clés de seau LSH (une par bande), stables : deux signatures qui partagent une clé sont candidates."""
+    return [int.from_bytes(hashlib.blake2b(BAND_PACK.pack(band, *sig[band * ROWS:(band + 1) * ROWS]),
+                                           digest_size=8).digest(), 'little', signed=True)
+            for band in range(BANDS)]
+
+
+def similarity(sig_a, sig_b):
+    """Jaccard estimée : part des permutations où les deux minima coïncident."""
+    return sum(map(operator.eq, sig_a, sig_b)) / NUM_PERM
+
+
+def variant_score(exo):
+    """Qualité d'une variante : synopsis développé, schéma SVG, champs de détail renseignés."""
+    synopsis = str(exo.get('synopsis') or '')
+    score = min(len(exercise_text(exo, 'synopsis').strip()), 4000) / 1000
+    if SVG_BLOCK.search(synopsis) or exo.get('svg_schema'):
+        score += 2
+    score += 0.5 * sum(1 for field in DETAIL_FIELDS if str(exo.get(field) or '').strip())
+    score += 0.25 * min(len(exo.get('themes') or []), 4)
+    return score
+
+
+def start_seconds(exo):
+    try:
+        return int(float(exo.get('start_seconds') or 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+class DisjointSet:
+    """Union-find ; chaque racine garde l'étendue [min, max] des timestamps de son groupe."""
+
+    def __init__(self, times):
+        self.parent = list(range(len(times)))
+        self.span = [(t, t) for t in times]
+
+    def find(self, i):
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def merged_span(self, root_i, root_j):
+        (low_i, high_i), (low_j, high_j) = self.span[root_i], self.span[root_j]
+        return min(low_i, low_j), max(high_i, high_j)
+
+    def union(self, root_i, root_j):
+        span = self.merged_span(root_i, root_j)
+        root, child = min(root_i, root_j), max(root_i, root_j)
+        self.parent[child] = root
+        self.span[root] = span
+
+
+def duplicate_groups(exercises, window=TIME_WINDOW, threshold=SIMILARITY_THRESHOLD):
+    """
+    Groupes de quasi-doublons (listes d'indices dans `exercises`, singletons compris) :
+    même seau LSH et Jaccard estimée >= `threshold`. Un groupe ne s'étend pas sur plus de `window`
+    secondes (None : pas de fenêtre), sinon une suite d'exercices proches deux à deux s'agglomérerait
+    en un seul.
+    """
+    sigs = [exercise_signature(exo) for exo in exercises]
+    times = [start_seconds(exo) for exo in exercises]
+    groups = DisjointSet(times)
+    buckets = {}
+    for i, sig in enumerate(sigs):
+        if sig is None:
+            continue
+        for key in band_keys(sig):
+            buckets.setdefault(key, []).append(i)
+    checked = set()
+    for members in buckets.values():
+        for pos, i in enumerate(members):
+            for j in members[pos + 1:]:
+                root_i, root_j = groups.find(i), groups.find(j)
+                if (i, j) in checked or root_i == root_j:
+                    continue
+                checked.add((i, j))
+                if window is not None:
+                    low, high = groups.merged_span(root_i, root_j)
+                    if high - low >= window:
+                        continue
+                if similarity(sigs[i], sigs[j]) >= threshold:
+                    groups.union(root_i, root_j)
+    by_root = {}
+    for i in range(len(exercises)):
+        by_root.setdefault(groups.find(i), []).append(i)
+    return list(by_root.values())
+
+
+def deduplicate(exercises, window=TIME_WINDOW, threshold=SIMILARITY_THRESHOLD):
+    """Meilleure variante (variant_score) de chaque groupe de quasi-doublons, triées par timestamp."""
+    exercises = sorted(exercises, key=start_seconds)
+    kept = [max((exercises[i] for i in group), key=variant_score)
+            for group in duplicate_groups(exercises, window, threshold)]
+    kept.sort(key=start_seconds)
+    return kept
@@ -0,0 +1,479 @@
+"""
+Bibliothèque persistante des exercices analysés (SQLite en WAL, partagée entre workers).
+
+Une entrée garde la forme renvoyée au client : {"id", "title", "thumbnail", "link", "data"}.
+À côté du JSON complet, des colonnes dérivées et indexées servent les recherches sans balayage :
+- lien de la vidéo, table thèmes -> exercices ;
+- catégorie (cat_range) et niveau (level_range) en bornes ordinales (« U13 → Seniors » = [13, 20]) ;
+- durée (duree_totale) en minutes ;
+- groupe de quasi-doublons (similarity_index) et score de variante, pour n'en lister que la meilleure ;
+- index plein texte FTS5 (exercise_fts, rowid = id) sur summary, video_description et synopsis,
+  racinisés par exercise_search, tenu à jour dans la même transaction que la table.
+
+search() filtre sur ces index et pagine par curseur (id du dernier élément rendu, pas d'OFFSET) ;
+search_text() rend les meilleurs résultats plein texte classés par bm25.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import exercise_search
+import exercise_similarity
+import similarity_index
+
+STORE_DIR = os.environ.get('EXERCISE_DATA_DIR', 'cache_data')
+STORE_PATH = os.environ.get('EXERCISE_STORE_PATH', os.path.join(STORE_DIR, 'exercises.sqlite3'))
+BUSY_TIMEOUT = 10       # Secondes d'attente du verrou d'écriture (plusieurs workers)
+SQL_BATCH = 500         # Limite de paramètres par requête IN (...)
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+LIST_OMITTED_FIELDS = ('synopsis', 'svg_schema')    # Vue liste : sans le markdown ni les SVG
+
+# Catégories d'âge : Uxx = xx ans, Seniors après U19, Vétérans au-delà
+SENIORS = 20
+VETERANS = 35
+CATEGORY_WORDS = {'senior': SENIORS, 'seniors': SENIORS, 'adulte': SENIORS, 'adultes': SENIORS,
+                  'veteran': VETERANS, 'veterans': VETERANS}
+ALL_CATEGORIES = (5, VETERANS)
+AGE_CATEGORY = re.compile(r'\bu\s?(\d{1,2})\b')
+
+# Niveaux : les mots que le filtre du client reconnaît déjà (débutant / ligue / national)
+LEVEL_WORDS = (
+    (0, ('debutant', 'debutants', 'loisir', 'initiation', 'ecole')),
+    (1, ('district', 'departemental', 'departementale', 'd1', 'd2', 'd3', 'd4', 'd5')),
+    (2, ('ligue', 'regional', 'regionale', 'r1', 'r2', 'r3')),
+    (3, ('national', 'nationale', 'n1', 'n2', 'n3')),
+    (4, ('pro', 'professionnel', 'elite')),
+)
+DURATION = re.compile(r'\d+')
+
+
+def category_bounds(text):
+    """[min, max] des catégories d'âge citées (None si aucune), « toutes » = toutes."""
+    words = exercise_similarity.normalize(text)
+    if not words:
+        return None, None
+    ages = [int(age) for age in AGE_CATEGORY.findall(words)]
+    ages += [CATEGORY_WORDS[word] for word in words.split() if word in CATEGORY_WORDS]
+    if not ages:
+        return ALL_CATEGORIES if 'toute' in words else (None, None)
+    return min(ages), max(ages)
+
+
+def level_bounds(text):
+    words = exercise_similarity.normalize(text)
+    found = [rank for rank, names in LEVEL_WORDS
+             if any(re.search(rf'\b{name}\b', words) for name in names)]
+    if not found:
+        return None, None
+    return min(found), max(found)
+
+
+def duration_minutes(text):
+    """Première valeur de duree_totale, comme le total de séance du client (« 15-20 min » -> 15)."""
+    match = DURATION.search(str(text or ''))
+    return int(match.group(0)) if match else None
+
+
+def exercise_themes(data):
+    themes = data.get('themes') or ([data['theme_force']] if data.get('theme_force') else [])
+    if isinstance(themes, str):
+        themes = [themes]
+    return sorted({str(theme).strip().upper() for theme in themes if str(theme).strip()})
+
+
+def search_params(body):
+    """
+    Arguments de search() depuis le corps JSON de /filter_videos ; ValueError (message pour le
+    client) si un paramètre est invalide. collapse doit être un vrai booléen : "false" est refusé.
+    """
+    if not isinstance(body, dict):
+        raise ValueError("Paramètres de filtre invalides")
+    collapse = body.get('collapse', True)
+    if not isinstance(collapse, bool):
+        raise ValueError("collapse doit être un booléen JSON (true / false)")
+
+    def integer(key):
+        return int(body[key]) if body.get(key) not in (None, '') else None
+
+    def text(key, all_values=()):
+        value = body.get(key)
+        if value is not None and not isinstance(value, str):
+            raise TypeError(key)
+        return value if value and value not in all_values else None
+
+    try:
+        themes = body.get('themes') or ([body['theme']] if body.get('theme') else None)
+        if themes is not None and (not isinstance(themes, (list, str))
+                                   or not all(isinstance(theme, str) for theme in themes)):
+            raise TypeError('themes')
+        return {
+            "themes": themes,
+            "category": text('category', ('Tous', 'Toutes')),
+            "level": text('level', ('Tous',)),
+            "duration_min": integer('duration_min'),
+            "duration_max": integer('duration_max'),
+            "text": (text('q') or '').strip() or None,
+            "cursor": integer('cursor'),
+            "limit": integer('limit'),
+            "detail": body.get('view') == 'detail',
+            "collapse": collapse,
+        }
+    except (TypeError, ValueError):
+        raise ValueError("Paramètres de filtre invalides")
+
+
+class ExerciseStore:
+    """Accès thread-safe à la bibliothèque ; une connexion par processus, verrou d'écriture SQLite partagé."""
+
+    def __init__(self, path=STORE_PATH, similarity_path=similarity_index.INDEX_PATH):
+        self.path = path
+        self.similarity_path = similarity_path
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._migrate()
+        has_search_index = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'exercise_fts'"
+        ).fetchone() is not None
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS exercises (
+                id INTEGER PRIMARY KEY,
+                title TEXT,
+                thumbnail TEXT,
+                link TEXT,
+                data TEXT NOT NULL,
+                cat_min INTEGER,
+                cat_max INTEGER,
+                level_min INTEGER,
+                level_max INTEGER,
+                duration INTEGER,
+                cluster_id INTEGER,
+                score REAL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_exercises_link ON exercises(link);
+            CREATE INDEX IF NOT EXISTS idx_exercises_category ON exercises(cat_min, cat_max);
+            CREATE INDEX IF NOT EXISTS idx_exercises_level ON exercises(level_min, level_max);
+            CREATE INDEX IF NOT EXISTS idx_exercises_duration ON exercises(duration);
+            CREATE INDEX IF NOT EXISTS idx_exercises_cluster ON exercises(cluster_id, score);
+            CREATE TABLE IF NOT EXISTS exercise_themes (
+                theme TEXT NOT NULL,
+                exercise_id INTEGER NOT NULL,
+                PRIMARY KEY (theme, exercise_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_themes_exercise ON exercise_themes(exercise_id);
+            CREATE VIRTUAL TABLE IF NOT EXISTS exercise_fts USING fts5(
+                summary, video_description, synopsis,
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3 4'
+            );
+        """)
+        if not has_search_index:
+            self._rebuild_search_index()
+
+    def _migrate(self):
+        """
+        Bases créées avant les colonnes de groupe : ajout des colonnes, score recalculé, groupes
+        repris de l'index de similarité déjà alimenté (sinon chaque exercice forme son groupe).
+        """
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(exercises)")}
+        if not columns or 'cluster_id' in columns:
+            return
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.execute("ALTER TABLE exercises ADD COLUMN cluster_id INTEGER")
+            self.conn.execute("ALTER TABLE exercises ADD COLUMN score REAL")
+            self.conn.executemany(
+                "UPDATE exercises SET cluster_id = ?, score = ? WHERE id = ?",
+                [(exercise_id, exercise_similarity.variant_score(json.loads(data)), exercise_id)
+                 for exercise_id, data in self.conn.execute("SELECT id, data FROM exercises").fetchall()]
+            )
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        if self.similarity_path and os.path.exists(self.similarity_path):
+            self.conn.execute("ATTACH DATABASE ? AS similarity", (self.similarity_path,))
+            try:
+                self.conn.execute("BEGIN IMMEDIATE")
+                self.conn.execute("""
+                    UPDATE exercises SET cluster_id = (
+                        SELECT s.cluster_id FROM similarity.signatures s WHERE s.exercise_id = exercises.id
+                    ) WHERE id IN (SELECT exercise_id FROM similarity.signatures)
+                """)
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            finally:
+                self.conn.execute("DETACH DATABASE similarity")
+
+    def _rebuild_search_index(self):
+        """Index plein texte des exercices déjà enregistrés (base antérieure à la recherche)."""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.execute("DELETE FROM exercise_fts")
+            for exercise_id, data in self.conn.execute("SELECT id, data FROM exercises").fetchall():
+                self.conn.execute(
+                    "INSERT INTO exercise_fts (rowid, summary, video_description, synopsis) VALUES (?, ?, ?, ?)",
+                    (exercise_id, *exercise_search.document(json.loads(data)))
+                )
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def _row_to_entry(self, row):
+        exercise_id, title, thumbnail, link, data = row
+        return {"id": exercise_id, "title": title, "thumbnail": thumbnail, "link": link, "data": json.loads(data)}
+
+    def _insert(self, items, now):
+        """Insère [(titre, miniature, lien, exercice)] dans la transaction en cours ; rend les entrées."""
+        last_id = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM exercises").fetchone()[0]
+        first_id = max(int(now * 1000), last_id + 1)
+        entries = []
+        rows = []
+        themes = []
+        documents = []
+        for offset, (title, thumbnail, link, exo) in enumerate(items):
+            exercise_id = first_id + offset
+            cat_min, cat_max = category_bounds(exo.get('cat_range'))
+            level_min, level_max = level_bounds(exo.get('level_range'))
+            rows.append((exercise_id, title, thumbnail, link, json.dumps(exo, ensure_ascii=False),
+                         cat_min, cat_max, level_min, level_max, duration_minutes(exo.get('duree_totale')),
+                         exercise_id, exercise_similarity.variant_score(exo), now))
+            themes.extend((theme, exercise_id) for theme in exercise_themes(exo))
+            documents.append((exercise_id, *exercise_search.document(exo)))
+            entries.append({"id": exercise_id, "title": title, "thumbnail": thumbnail, "link": link, "data": exo})
+        self.conn.executemany("""
+            INSERT INTO exercises (id, title, thumbnail, link, data, cat_min, cat_max,
+                                   level_min, level_max, duration, cluster_id, score, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO exercise_themes (theme, exercise_id) VALUES (?, ?)", themes
+        )
+        self.conn.executemany(
+            "INSERT INTO exercise_fts (rowid, summary, video_description, synopsis) VALUES (?, ?, ?, ?)",
+            documents
+        )
+        return entries
+
+    def _delete_ids(self, ids):
+        """Supprime des entrées (et leurs thèmes / lignes FTS) dans la transaction en cours."""
+        params = [(exercise_id,) for exercise_id in ids]
+        self.conn.executemany("DELETE FROM exercise_themes WHERE exercise_id = ?", params)
+        self.conn.executemany("DELETE FROM exercise_fts WHERE rowid = ?", params)
+        self.conn.executemany("DELETE FROM exercises WHERE id = ?", params)
+
+    def add_many(self, items):
+        """
+        Enregistre [(titre, miniature, lien, exercice)] en une transaction ; rend les entrées créées.
+        Les ids suivent l'horloge en millisecondes et restent uniques entre workers (BEGIN IMMEDIATE).
+        """
+        items = list(items)
+        if not items:
+            return []
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                entries = self._insert(items, time.time())
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return entries
+
+    def replace_link(self, link, items):
+        """
+        Remplace, en une transaction, les entrées du lien `link` par [(titre, miniature, exercice)] :
+        une nouvelle analyse de la même vidéo (reprise d'une analyse partielle) ne crée pas de doublons.
+        Rend (ids supprimés, entrées créées).
+        """
+        items = [(title, thumbnail, link, exo) for title, thumbnail, exo in items]
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                removed = [row[0] for row in self.conn.execute("SELECT id FROM exercises WHERE link = ?", (link,))]
+                self._delete_ids(removed)
+                entries = self._insert(items, time.time()) if items else []
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return removed, entries
+
+    def set_clusters(self, clusters):
+        """Groupes de quasi-doublons calculés par similarity_index ({id: cluster_id})."""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.executemany("UPDATE exercises SET cluster_id = ? WHERE id = ?",
+                                      [(cluster_id, exercise_id) for exercise_id, cluster_id in clusters.items()])
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def _filters(self, alias, themes, category, level, duration_min, duration_max, text):
+        """Conditions SQL (sur la table `alias`) et leurs paramètres."""
+        conditions = []
+        params = []
+        if themes:
+            conditions.append(f"{alias}.id IN (SELECT exercise_id FROM exercise_themes "
+                              f"WHERE theme IN ({','.join('?' * len(themes))}))")
+            params.extend(themes)
+        for column, (low, high) in (('cat', category), ('level', level)):
+            if low is not None:     # Intervalles qui se chevauchent
+                conditions.append(f"{alias}.{column}_min <= ? AND {alias}.{column}_max >= ?")
+                params.extend((high, low))
+        if duration_min is not None:
+            conditions.append(f"{alias}.duration >= ?")
+            params.append(duration_min)
+        if duration_max is not None:
+            conditions.append(f"{alias}.duration <= ?")
+            params.append(duration_max)
+        query = exercise_search.match_query(text) if text else None
+        if query:
+            conditions.append(f"{alias}.id IN (SELECT rowid FROM exercise_fts WHERE exercise_fts MATCH ?)")
+            params.append(query)
+        return conditions, params
+
+    def search(self, themes=None, category=None, level=None, duration_min=None, duration_max=None, text=None,
+               cursor=None, limit=PAGE_SIZE, detail=False, collapse=True):
+        """
+        Une page d'entrées filtrées, triées par id, après `cursor` ; rend (entrées, curseur suivant ou None).
+        - category / level : textes libres (« U15 », « Ligue »...) ramenés aux bornes ordinales ;
+        - collapse : seule la meilleure variante de chaque groupe de quasi-doublons qui passe les
+          filtres, avec les ids des autres dans `duplicates` ;
+        - detail=False : `data` sans synopsis ni SVG (vue liste).
+        """
+        themes = exercise_themes({'themes': themes}) if themes else []
+        category = category_bounds(category) if category else (None, None)
+        level = level_bounds(level) if level else (None, None)
+        limit = max(1, min(int(limit or PAGE_SIZE), MAX_PAGE_SIZE))
+        conditions, params = self._filters('e', themes, category, level, duration_min, duration_max, text)
+        if collapse:
+            inner, inner_params = self._filters('x', themes, category, level, duration_min, duration_max, text)
+            conditions.append(f"""e.id = (SELECT x.id FROM exercises x WHERE x.cluster_id = e.cluster_id
+                                  {''.join(' AND ' + c for c in inner)} ORDER BY x.score DESC, x.id LIMIT 1)""")
+            params.extend(inner_params)
+        if cursor is not None:
+            conditions.append("e.id > ?")
+            params.append(cursor)
+        data = 'e.data' if detail else f"json_remove(e.data, {', '.join(repr('$.' + f) for f in LIST_OMITTED_FIELDS)})"
+        where = ' AND '.join(conditions) or '1'
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT e.id, e.title, e.thumbnail, e.link, {data}, e.cluster_id FROM exercises e "
+                f"WHERE {where} ORDER BY e.id LIMIT ?", (*params, limit + 1)
+            ).fetchall()
+            more = len(rows) > limit
+            rows = rows[:limit]
+            members = {}
+            if collapse and rows:
+                clusters = list({row[5] for row in rows})
+                for cluster_id, exercise_id in self.conn.execute(
+                    f"SELECT cluster_id, id FROM exercises WHERE cluster_id IN ({','.join('?' * len(clusters))}) "
+                    f"ORDER BY id", clusters
+                ):
+                    members.setdefault(cluster_id, []).append(exercise_id)
+        entries = []
+        for row in rows:
+            entry = self._row_to_entry(row[:5])
+            others = [exercise_id for exercise_id in members.get(row[5], ()) if exercise_id != row[0]]
+            if others:
+                entry['duplicates'] = others
+            entries.append(entry)
+        return entries, (rows[-1][0] if more else None)
+
+    def search_text(self, text, limit=20, detail=False):
+        """
+        Les `limit` meilleurs exercices pour une recherche libre (bm25, titre pondéré), chacun avec
+        son `score` ; une seule variante par groupe de quasi-doublons.
+        """
+        query = exercise_search.match_query(text)
+        if not query:
+            return []
+        limit = max(1, min(int(limit or PAGE_SIZE), MAX_PAGE_SIZE))
+        data = 'e.data' if detail else f"json_remove(e.data, {', '.join(repr('$.' + f) for f in LIST_OMITTED_FIELDS)})"
+        weights = ', '.join(str(weight) for weight in exercise_search.FIELD_WEIGHTS)
+        with self.lock:
+            rows = self.conn.execute(f"""
+                SELECT e.id, e.title, e.thumbnail, e.link, {data}, e.cluster_id, f.relevance
+                FROM (SELECT rowid, bm25(exercise_fts, {weights}) AS relevance FROM exercise_fts
+                      WHERE exercise_fts MATCH ? ORDER BY relevance LIMIT ?) f
+                JOIN exercises e ON e.id = f.rowid
+                ORDER BY f.relevance
+            """, (query, limit * 3)).fetchall()     # Marge pour les variantes écartées
+        entries = []
+        seen_clusters = set()
+        for row in rows:
+            if row[5] in seen_clusters:
+                continue
+            seen_clusters.add(row[5])
+            entry = self._row_to_entry(row[:5])
+            entry['score'] = round(-row[6], 3)      # bm25 : plus négatif = plus pertinent
+            entries.append(entry)
+            if len(entries) == limit:
+                break
+        return entries
+
+    def get(self, exercise_id):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT id, title, thumbnail, link, data FROM exercises WHERE id = ?", (exercise_id,)
+            ).fetchone()
+        return self._row_to_entry(row) if row else None
+
+    def get_many(self, exercise_ids):
+        """{id: entrée} pour les ids encore présents."""
+        ids = list(exercise_ids)
+        found = {}
+        with self.lock:
+            for start in range(0, len(ids), SQL_BATCH):
+                batch = ids[start:start + SQL_BATCH]
+                rows = self.conn.execute(
+                    f"SELECT id, title, thumbnail, link, data FROM exercises WHERE id IN ({','.join('?' * len(batch))})",
+                    batch
+                ).fetchall()
+                found.update((row[0], self._row_to_entry(row)) for row in rows)
+        return found
+
+    def by_link(self, link):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, title, thumbnail, link, data FROM exercises WHERE link = ? ORDER BY id", (link,)
+            ).fetchall()
+        return [self._row_to_entry(row) for row in rows]
+
+    def all(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT id, title, thumbnail, link, data FROM exercises ORDER BY id").fetchall()
+        return [self._row_to_entry(row) for row in rows]
+
+    def delete(self, exercise_id):
+        """Supprime une entrée ; rend False si elle n'existait pas."""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.execute("DELETE FROM exercise_themes WHERE exercise_id = ?", (exercise_id,))
+                self.conn.execute("DELETE FROM exercise_fts WHERE rowid = ?", (exercise_id,))
+                deleted = self.conn.execute("DELETE FROM exercises WHERE id = ?", (exercise_id,)).rowcount
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return deleted > 0
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM exercises").fetchone()[0]
@@ -0,0 +1,185 @@
+"""
+Surveillance partagée de l'état des fichiers Gemini (PROCESSING -> ACTIVE).
+
+Un seul thread suit tous les fichiers en attente au lieu d'un thread par fichier
+qui dort et interroge files.get en boucle :
+- les vérifications sont groupées (un files.list dès que plusieurs fichiers attendent) ;
+- l'intervalle par fichier démarre court puis s'allonge (backoff adaptatif) ;
+- chaque fichier a un Future résolu dès qu'il est prêt, qui réveille l'étape suivante.
+
+Le Future se résout avec le fichier ACTIVE, ou None (FAILED, introuvable ou timeout),
+comme le faisaient les anciens workers d'upload. Un fichier FAILED ou expiré est supprimé
+côté Google : aucun appelant ne le réutilisera.
+"""
+import concurrent.futures
+import os
+import threading
+import time
+
+MIN_INTERVAL = float(os.environ.get('GEMINI_FILE_POLL_MIN', 0.5))
+MAX_INTERVAL = float(os.environ.get('GEMINI_FILE_POLL_MAX', 5.0))
+BACKOFF_FACTOR = 1.6
+LIST_THRESHOLD = 3      # À partir de 3 fichiers en attente, un files.list remplace les files.get
+LIST_PAGE_SIZE = 100
+
+
+def file_state(video_file):
+    """État d'un fichier Gemini sous forme de chaîne ('PROCESSING', 'ACTIVE', 'FAILED')."""
+    state = getattr(video_file, 'state', None)
+    return getattr(state, 'value', state)
+
+
+class _PendingFile:
+    def __init__(self, video_file, future, timeout, label, min_interval):
+        now = time.monotonic()
+        self.name = video_file.name
+        self.future = future
+        self.label = label or video_file.name
+        self.started = now
+        self.deadline = now + timeout
+        self.interval = min_interval
+        self.next_check = now + min_interval
+
+
+class FileReadinessWatcher:
+    """Thread unique qui suit les fichiers en PROCESSING et résout leurs Futures."""
+
+    def __init__(self, client_getter, scheduler=None, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL):
+        self.client_getter = client_getter
+        self.scheduler = scheduler
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.pending = {}
+        self.cond = threading.Condition()
+        self.thread = None
+        self.counters = {"watched": 0, "ready": 0, "failed": 0, "timeouts": 0, "list_calls": 0, "get_calls": 0,
+                         "deleted": 0}
+
+    def watch(self, video_file, timeout, label=None):
+        """Future résolu avec le fichier dès qu'il quitte l'état PROCESSING."""
+        future = concurrent.futures.Future()
+        state = file_state(video_file)
+        if state != 'PROCESSING':
+            if state == 'FAILED':
+                self._delete(video_file.name, label or video_file.name)
+            future.set_result(video_file if state != 'FAILED' else None)
+            return future
+        with self.cond:
+            self.counters["watched"] += 1
+            self.pending[video_file.name] = _PendingFile(video_file, future, timeout, label, self.min_interval)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='gemini-file-watcher', daemon=True)
+                self.thread.start()
+            self.cond.notify_all()
+        return future
+
+    def _call(self, fn, **kwargs):
+        if self.scheduler is not None:
+            return self.scheduler.call(fn, request_cost=0, **kwargs)
+        return fn(**kwargs)
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while True:
+                    # Les Futures annulés (job annulé) ne sont plus suivis
+                    for name in [n for n, p in self.pending.items() if p.future.cancelled()]:
+                        del self.pending[name]
+                    if not self.pending:
+                        self.cond.wait()
+                        continue
+                    now = time.monotonic()
+                    soonest = min(min(p.next_check, p.deadline) for p in self.pending.values())
+                    if soonest <= now:
+                        break
+                    self.cond.wait(soonest - now)
+                due = [p for p in self.pending.values() if min(p.next_check, p.deadline) <= now]
+                batch = len(self.pending) >= LIST_THRESHOLD
+                watched = list(self.pending.values())
+            try:
+                self._poll(watched if batch else due, batch)
+            except Exception as e:
+                print(f"⚠️ [Watcher] Vérification des fichiers impossible : {e}")
+            self._expire()
+
+    def _poll(self, entries, batch):
+        """Récupère l'état des fichiers (un files.list groupé, sinon un files.get par fichier)."""
+        client = self.client_getter()
+        states = {}
+        if batch:
+            wanted = {p.name for p in entries}
+            with self.cond:
+                self.counters["list_calls"] += 1
+            pager = self._call(client.files.list, config={'page_size': LIST_PAGE_SIZE})
+            for video_file in pager:
+                if video_file.name in wanted:
+                    states[video_file.name] = video_file
+                    wanted.discard(video_file.name)
+                    if not wanted:
+                        break
+        now = time.monotonic()
+        for entry in entries:
+            if entry.name in states:
+                continue
+            if not batch and entry.next_check > now:
+                continue
+            try:
+                with self.cond:
+                    self.counters["get_calls"] += 1
+                states[entry.name] = self._call(client.files.get, name=entry.name)
+            except Exception as e:
+                print(f"⚠️ [Watcher] {entry.label} : état illisible ({e})")
+        for entry in entries:
+            if entry.name in states:
+                self._update(entry, states[entry.name])
+
+    def _update(self, entry, video_file):
+        state = file_state(video_file)
+        if state == 'PROCESSING':
+            with self.cond:
+                entry.interval = min(self.max_interval, entry.interval * BACKOFF_FACTOR)
+                entry.next_check = time.monotonic() + entry.interval
+            return
+        if state == 'FAILED':
+            print(f"❌ [Watcher] {entry.label} : traitement Google en échec (Status FAILED)")
+            if self._resolve(entry, None, "failed"):
+                self._delete(entry.name, entry.label)
+        else:
+            print(f"✅ [Watcher] {entry.label} prêt en {time.monotonic() - entry.started:.1f}s")
+            self._resolve(entry, video_file, "ready")
+
+    def _expire(self):
+        now = time.monotonic()
+        with self.cond:
+            expired = [p for p in self.pending.values() if p.deadline <= now]
+        for entry in expired:
+            print(f"⚠️ [Watcher] {entry.label} : TIMEOUT, le traitement Google prend trop de temps")
+            if self._resolve(entry, None, "timeouts"):
+                self._delete(entry.name, entry.label)
+
+    def _resolve(self, entry, result, counter):
+        """Retire le fichier du suivi et résout son Future ; False s'il l'était déjà."""
+        with self.cond:
+            if self.pending.get(entry.name) is not entry:
+                return False
+            del self.pending[entry.name]
+            self.counters[counter] += 1
+        if not entry.future.done():
+            try:
+                entry.future.set_result(result)
+            except concurrent.futures.InvalidStateError:
+                pass
+        return True
+
+    def _delete(self, name, label):
+        try:
+            self._call(self.client_getter().files.delete, name=name)
+        except Exception as e:
+            print(f"⚠️ [Watcher] {label} : suppression du fichier impossible ({e})")
+            return
+        with self.cond:
+            self.counters["deleted"] += 1
+
+    def stats(self):
+        with self.cond:
+            return {"pending": len(self.pending), **self.counters}
@@ -0,0 +1,207 @@
+"""
+Ordonnanceur global des appels Gemini (tout le process partage les mêmes budgets).
+
+- Concurrence bornée : au plus GEMINI_MAX_CONCURRENCY appels en vol.
+- Budgets par minute (seaux à jetons) : requêtes (GEMINI_RPM) et tokens d'entrée (GEMINI_TPM).
+- Deux voies de priorité : INTERACTIVE (adaptation de séance, l'utilisateur attend)
+  passe toujours devant BATCH (analyse vidéo).
+- Sur 429 / 500 / 503 : backoff exponentiel avec jitter, qui respecte le délai suggéré
+  par l'API (retryDelay / Retry-After) et met tout le process en pause le temps indiqué.
+"""
+import heapq
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+INTERACTIVE = 0
+BATCH = 1
+LANE_NAMES = {INTERACTIVE: 'interactive', BATCH: 'batch'}
+
+MAX_CONCURRENCY = int(os.environ.get('GEMINI_MAX_CONCURRENCY', 6))
+REQUESTS_PER_MIN = int(os.environ.get('GEMINI_RPM', 60))
+TOKENS_PER_MIN = int(os.environ.get('GEMINI_TPM', 1000000))
+MAX_RETRIES = int(os.environ.get('GEMINI_MAX_RETRIES', 4))
+BACKOFF_BASE = 2.0
+BACKOFF_CAP = 60.0
+
+RETRY_HINT_PATTERNS = [
+    re.compile(r"retry[_ ]?delay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s", re.IGNORECASE),
+    re.compile(r"retry[- ]after['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)", re.IGNORECASE),
+    re.compile(r"retry in (\d+(?:\.\d+)?)\s*s", re.IGNORECASE),
+]
+# Erreurs transitoires : code HTTP et statut Google correspondant (429 quota, 500 erreur interne, 503 surcharge)
+RETRYABLE_CODES = (429, 500, 503)
+RETRYABLE_MARKERS = re.compile(r"\b(?:429|500|503|RESOURCE_EXHAUSTED|INTERNAL|UNAVAILABLE)\b")
+
+
+class TokenBucket:
+    """Seau à jetons rechargé en continu ; capacité = budget d'une minute."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Secondes à attendre avant de pouvoir consommer `amount` (0 si disponible)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def consume(self, amount):
+        self.level -= min(amount, self.capacity)
+
+
+def is_retryable(error):
+    """
+    429 (quota), 500 (erreur interne passagère côté Gemini) et 503 (surcharge) sont transitoires,
+    le reste remonte. Sans code numérique, le texte de l'erreur est cherché (code ou statut).
+    """
+    code = getattr(error, 'code', None) or getattr(error, 'status_code', None)
+    if code in RETRYABLE_CODES:
+        return True
+    return RETRYABLE_MARKERS.search(str(error)) is not None
+
+
+def retry_hint(error):
+    """Délai (s) suggéré par l'API dans l'erreur, ou None."""
+    candidates = [str(error)]
+    details = getattr(error, 'details', None)
+    if details:
+        try:
+            candidates.append(json.dumps(details))
+        except (TypeError, ValueError):
+            candidates.append(str(details))
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if headers and headers.get('Retry-After'):
+        candidates.append(f"retry-after: {headers.get('Retry-After')}")
+    for text in candidates:
+        for pattern in RETRY_HINT_PATTERNS:
+            match = pattern.search(text)
+            if match:
+                return float(match.group(1))
+    return None
+
+
+class GeminiScheduler:
+    """File d'attente à priorités devant GENAI_CLIENT, partagée par tous les threads."""
+
+    def __init__(self, max_concurrency=MAX_CONCURRENCY, requests_per_min=REQUESTS_PER_MIN,
+                 tokens_per_min=TOKENS_PER_MIN, max_retries=MAX_RETRIES):
+        self.max_concurrency = max_concurrency
+        self.requests = TokenBucket(requests_per_min)
+        self.tokens = TokenBucket(tokens_per_min)
+        self.max_retries = max_retries
+        self.cond = threading.Condition()
+        self.waiting = []                 # tas de (priorité, ordre d'arrivée)
+        self.sequence = itertools.count()
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self.counters = {"calls": 0, "rate_limited": 0, "retries": 0, "failures": 0}
+
+    def acquire(self, priority=BATCH, est_tokens=0, request_cost=1):
+        """Bloque jusqu'à obtenir un créneau (tour de priorité, concurrence, budgets, pause 429)."""
+        ticket = (priority, next(self.sequence))
+        with self.cond:
+            heapq.heappush(self.waiting, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = None
+                    if self.waiting[0] == ticket and self.in_flight < self.max_concurrency:
+                        wait = max(
+                            self.cooldown_until - now,
+                            self.requests.wait_time(request_cost, now),
+                            self.tokens.wait_time(est_tokens, now),
+                        )
+                        if wait <= 0:
+                            self.requests.consume(request_cost)
+                            self.tokens.consume(est_tokens)
+                            self.in_flight += 1
+                            self.counters["calls"] += 1
+                            return
+                    self.cond.wait(wait)
+            finally:
+                self.waiting.remove(ticket)
+                heapq.heapify(self.waiting)
+                self.cond.notify_all()
+
+    def release(self):
+        with self.cond:
+            self.in_flight -= 1
+            self.cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority=BATCH, est_tokens=0, request_cost=1):
+        """Créneau tenu pendant tout le bloc (utile pour consommer un stream)."""
+        self.acquire(priority, est_tokens, request_cost)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def backoff(self, attempt, error):
+        """
+        Attend avant une nouvelle tentative : délai suggéré par l'API si présent,
+        sinon exponentiel (base 2s, plafond 60s) avec full jitter.
+        Un 429 suspend aussi les autres appels du process pendant ce délai.
+        """
+        hint = retry_hint(error)
+        if hint is not None:
+            delay = hint + random.uniform(0, 1.0)
+        else:
+            delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt)))
+        with self.cond:
+            self.counters["retries"] += 1
+            if '429' in str(error) or 'RESOURCE_EXHAUSTED' in str(error) or getattr(error, 'code', None) == 429:
+                self.counters["rate_limited"] += 1
+                self.cooldown_until = max(self.cooldown_until, time.monotonic() + delay)
+                self.cond.notify_all()
+        print(f"⚠️ [Gemini] {type(error).__name__} transitoire, nouvelle tentative dans {delay:.1f}s "
+              f"(tentative {attempt + 1}/{self.max_retries})")
+        time.sleep(delay)
+
+    def call(self, fn, *args, priority=BATCH, est_tokens=0, request_cost=1, **kwargs):
+        """Exécute fn(*args, **kwargs) dans un créneau, avec backoff sur les erreurs transitoires."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.slot(priority, est_tokens, request_cost):
+                    return fn(*args, **kwargs)
+            except Exception as e:
+                if attempt < self.max_retries and is_retryable(e):
+                    self.backoff(attempt, e)
+                    continue
+                with self.cond:
+                    self.counters["failures"] += 1
+                raise
+
+    def metrics(self):
+        with self.cond:
+            depth = {name: 0 for name in LANE_NAMES.values()}
+            for priority, _ in self.waiting:
+                depth[LANE_NAMES.get(priority, str(priority))] += 1
+            now = time.monotonic()
+            return {
+                "queue_depth": depth,
+                "in_flight": self.in_flight,
+                "max_concurrency": self.max_concurrency,
+                "requests_per_min": self.requests.capacity,
+                "tokens_per_min": self.tokens.capacity,
+                "requests_available": round(self.requests.level, 1),
+                "tokens_available": int(self.tokens.level),
+                "cooldown_remaining": max(0.0, round(self.cooldown_until - now, 1)),
+                **self.counters,
+            }
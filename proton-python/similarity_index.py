@@ -0,0 +1,157 @@
+"""
+Index persistant des exercices quasi-doublons de toute la bibliothèque (SQLite, fichier local).
+
+Chaque exercice enregistré y laisse sa signature MinHash (exercise_similarity) et ses clés de
+bandes LSH. À l'insertion, les exercices qui partagent une bande sont comparés et le nouveau
+rejoint le groupe (cluster) le plus proche s'il dépasse le seuil face à chacun des membres
+comparés et face au représentant du groupe (sa meilleure variante, variant_score) : le même rondo
+extrait de dix vidéos forme un seul groupe, mais A~B et B~C ne suffisent pas à y faire entrer C.
+Pas de fenêtre de temps ici : les timestamps de vidéos différentes ne se comparent pas.
+"""
+import os
+import sqlite3
+import struct
+import threading
+
+import exercise_similarity
+
+INDEX_DIR = os.environ.get('EXERCISE_DATA_DIR', 'cache_data')
+INDEX_PATH = os.path.join(INDEX_DIR, 'exercise_similarity.sqlite3')
+LIBRARY_THRESHOLD = float(os.environ.get('LIBRARY_DEDUP_THRESHOLD', exercise_similarity.SIMILARITY_THRESHOLD))
+MAX_CANDIDATES = 64     # Voisins comparés au plus : ceux qui partagent le plus de bandes
+SIGNATURE_PACK = struct.Struct(f'<{exercise_similarity.NUM_PERM}I')
+
+
+class SimilarityIndex:
+    """Signatures + seaux LSH en SQLite ; regroupe les quasi-doublons au fil des insertions (thread-safe)."""
+
+    def __init__(self, path=INDEX_PATH, threshold=LIBRARY_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS signatures (
+                exercise_id INTEGER PRIMARY KEY,
+                cluster_id INTEGER NOT NULL,
+                score REAL NOT NULL,
+                signature BLOB
+            );
+            CREATE INDEX IF NOT EXISTS idx_signatures_cluster ON signatures(cluster_id);
+            CREATE TABLE IF NOT EXISTS bands (
+                band_key INTEGER NOT NULL,
+                exercise_id INTEGER NOT NULL,
+                PRIMARY KEY (band_key, exercise_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_bands_exercise ON bands(exercise_id);
+        """)
+        self.conn.commit()
+
+    def _candidates(self, keys, exclude):
+        """
+        Signatures des exercices qui partagent au moins une bande avec `keys` ; les MAX_CANDIDATES
+        qui en partagent le plus, pour qu'un groupe très peuplé ne rende pas l'insertion quadratique.
+        """
+        if not keys:
+            return []
+        rows = self.conn.execute(f"""
+            SELECT s.exercise_id, s.cluster_id, s.signature
+            FROM (
+                SELECT exercise_id, COUNT(*) AS shared FROM bands
+                WHERE band_key IN ({','.join('?' * len(keys))}) AND exercise_id != ?
+                GROUP BY exercise_id ORDER BY shared DESC LIMIT ?
+            ) b JOIN signatures s ON s.exercise_id = b.exercise_id
+        """, (*keys, exclude, MAX_CANDIDATES)).fetchall()
+        return [(exercise_id, cluster_id, SIGNATURE_PACK.unpack(blob)) for exercise_id, cluster_id, blob in rows]
+
+    def _neighbours(self, sig, keys, exclude):
+        """[(similarité, id, cluster)] au-delà du seuil, du plus proche au plus lointain."""
+        found = []
+        for exercise_id, cluster_id, other in self._candidates(keys, exclude):
+            score = exercise_similarity.similarity(sig, other)
+            if score >= self.threshold:
+                found.append((score, exercise_id, cluster_id))
+        found.sort(reverse=True)
+        return found
+
+    def _representative(self, cluster_id):
+        row = self.conn.execute(
+            "SELECT exercise_id, signature FROM signatures WHERE cluster_id = ? AND signature IS NOT NULL "
+            "ORDER BY score DESC, exercise_id LIMIT 1", (cluster_id,)
+        ).fetchone()
+        return (row[0], SIGNATURE_PACK.unpack(row[1])) if row else (None, None)
+
+    def _choose_cluster(self, sig, keys, exercise_id):
+        """
+        Groupe à rejoindre, du plus proche au plus lointain : le nouvel exercice doit dépasser le seuil
+        face à tous les membres de ce groupe parmi les candidats et face à son représentant.
+        Sinon il forme son propre groupe (pas de chaînage A~B~C).
+        """
+        by_cluster = {}
+        for other_id, cluster_id, other in self._candidates(keys, exercise_id):
+            by_cluster.setdefault(cluster_id, {})[other_id] = exercise_similarity.similarity(sig, other)
+        ranked = sorted(by_cluster.items(), key=lambda item: max(item[1].values()), reverse=True)
+        for cluster_id, scores in ranked:
+            if min(scores.values()) < self.threshold:
+                if max(scores.values()) < self.threshold:
+                    break       # Groupes suivants encore plus lointains
+                continue
+            representative_id, representative = self._representative(cluster_id)
+            if representative_id is None or representative_id in scores \
+                    or exercise_similarity.similarity(sig, representative) >= self.threshold:
+                return cluster_id
+        return exercise_id
+
+    def add_many(self, items):
+        """
+        Indexe [(id, exercice)] ; rend {id: cluster_id}. Un exercice sans groupe assez proche
+        forme le sien (cluster_id = son id).
+        """
+        clusters = {}
+        with self.lock:
+            for exercise_id, exo in items:
+                sig = exercise_similarity.exercise_signature(exo)
+                keys = exercise_similarity.band_keys(sig) if sig else []
+                cluster_id = self._choose_cluster(sig, keys, exercise_id) if sig else exercise_id
+                self.conn.execute("DELETE FROM bands WHERE exercise_id = ?", (exercise_id,))
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO signatures (exercise_id, cluster_id, score, signature) VALUES (?, ?, ?, ?)",
+                    (exercise_id, cluster_id, exercise_similarity.variant_score(exo),
+                     SIGNATURE_PACK.pack(*sig) if sig else None)
+                )
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO bands (band_key, exercise_id) VALUES (?, ?)",
+                    [(key, exercise_id) for key in keys]
+                )
+                clusters[exercise_id] = cluster_id
+            self.conn.commit()
+        return clusters
+
+    def remove(self, exercise_id):
+        with self.lock:
+            self.conn.execute("DELETE FROM bands WHERE exercise_id = ?", (exercise_id,))
+            self.conn.execute("DELETE FROM signatures WHERE exercise_id = ?", (exercise_id,))
+            self.conn.commit()
+
+    def similar(self, exercise_id, limit=10):
+        """[(id, similarité)] des exercices les plus proches de `exercise_id` (hors lui-même)."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT signature FROM signatures WHERE exercise_id = ?", (exercise_id,)
+            ).fetchone()
+            if not row or row[0] is None:
+                return []
+            sig = SIGNATURE_PACK.unpack(row[0])
+            neighbours = self._neighbours(sig, exercise_similarity.band_keys(sig), exercise_id)
+        return [(other_id, score) for score, other_id, _ in neighbours[:limit]]
+
+    def stats(self):
+        with self.lock:
+            count, groups = self.conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT cluster_id) FROM signatures"
+            ).fetchone()
+        return {"exercises": count, "clusters": groups}
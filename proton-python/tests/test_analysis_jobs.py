@@ -0,0 +1,142 @@
+"""Jobs d'analyse : journal d'événements (reprise SSE), base partagée entre workers, annulation, purge."""
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import analysis_jobs
+
+
+def make_manager(tmp_path, **kwargs):
+    return analysis_jobs.JobManager(store=analysis_jobs.JobStore(str(tmp_path / 'jobs.sqlite3')), **kwargs)
+
+
+def wait_finished(job, after_id=-1, timeout=5):
+    """Suit le job comme le flux SSE jusqu'à la fin ; rend les événements reçus."""
+    last_id = after_id
+    events = []
+    while True:
+        batch, finished = job.wait_events(last_id, timeout=timeout)
+        events.extend(batch)
+        if batch:
+            last_id = batch[-1]['id']
+        if finished and not batch:
+            return events
+
+
+def test_job_runs_and_publishes_numbered_events(tmp_path):
+    manager = make_manager(tmp_path)
+
+    def runner(job):
+        job.update('download', done=1, total=1)
+        job.emit('exercises', {"chunk": 0, "exercises": [{"summary": "Rondo"}]})
+        return [{"summary": "Rondo"}]
+
+    job = manager.submit(runner, 'https://example.com/v')
+    events = wait_finished(job)
+    assert [event['id'] for event in events] == list(range(len(events)))
+    assert [event['type'] for event in events] == ['state', 'progress', 'exercises', 'state']
+    assert events[-1]['data'] == {"state": analysis_jobs.SUCCEEDED, "result": [{"summary": "Rondo"}]}
+    assert job.to_dict()["result"] == [{"summary": "Rondo"}]
+
+
+def test_wait_events_resumes_after_last_event_id(tmp_path):
+    manager = make_manager(tmp_path)
+    release = threading.Event()
+
+    def runner(job):
+        job.update('split', done=1)
+        release.wait(5)
+        job.update('split', done=2)
+        return []
+
+    job = manager.submit(runner, 'u')
+    first, finished = job.wait_events(-1, timeout=5)
+    while len(first) < 2:
+        more, finished = job.wait_events(first[-1]['id'], timeout=5)
+        first += more
+    assert not finished
+    release.set()
+    # Reconnexion avec Last-Event-ID : seuls les événements suivants sont renvoyés
+    rest = wait_finished(job, after_id=first[-1]['id'])
+    assert rest[0]['id'] == first[-1]['id'] + 1
+    assert rest[0]['data'] == {"stage": 'split', "done": 2, "total": None}
+
+
+def test_other_worker_reads_state_and_events_from_store(tmp_path):
+    owner = make_manager(tmp_path)
+    other = make_manager(tmp_path)
+    job = owner.submit(lambda job: [{"summary": "Centres"}], 'u')
+    wait_finished(job)
+
+    remote = other.get(job.id)
+    assert isinstance(remote, analysis_jobs.RemoteJob)
+    assert remote.state == analysis_jobs.SUCCEEDED
+    assert remote.to_dict()["result"] == [{"summary": "Centres"}]
+    events, finished = remote.wait_events(0, timeout=1)
+    assert finished
+    assert [event['id'] for event in events] == list(range(1, job.to_dict()["last_event_id"] + 1))
+    assert other.get('inconnu') is None
+
+
+def test_cancel_from_other_worker_reaches_owner(tmp_path, monkeypatch):
+    monkeypatch.setattr(analysis_jobs, 'CANCEL_CHECK_INTERVAL', 0)
+    owner = make_manager(tmp_path)
+    other = make_manager(tmp_path)
+    started = threading.Event()
+
+    def runner(job):
+        started.set()
+        while True:
+            job.raise_if_cancelled()
+            threading.Event().wait(0.01)
+
+    job = owner.submit(runner, 'u')
+    assert started.wait(5)
+    assert isinstance(other.cancel(job.id), analysis_jobs.RemoteJob)
+    wait_finished(job)
+    assert job.state == analysis_jobs.CANCELLED
+    assert other.get(job.id).state == analysis_jobs.CANCELLED
+
+
+def test_list_purges_once_and_merges_local_and_remote_jobs(tmp_path):
+    first = make_manager(tmp_path)
+    second = make_manager(tmp_path)
+    local = first.submit(lambda job: 1, 'a')
+    remote = second.submit(lambda job: 2, 'b')
+    wait_finished(local)
+    wait_finished(remote)
+
+    purges = []
+    purge = first.store.purge
+    first.store.purge = lambda retention: purges.append(retention) or purge(retention)
+    jobs = first.list()
+    assert len(purges) == 1
+    assert [job.id for job in jobs] == [remote.id, local.id]
+    assert jobs[1] is local
+    assert isinstance(jobs[0], analysis_jobs.RemoteJob)
+
+
+def test_purge_fails_jobs_of_dead_workers(tmp_path):
+    store = analysis_jobs.JobStore(str(tmp_path / 'jobs.sqlite3'))
+    dead = subprocess.Popen([sys.executable, '-c', 'pass'])
+    dead.wait()
+    job = analysis_jobs.AnalysisJob('u')
+    store.save({**job.snapshot(), "owner_pid": dead.pid, "state": analysis_jobs.RUNNING})
+    store.purge(retention=3600)
+    row = store.load(job.id)
+    assert row['state'] == analysis_jobs.FAILED
+    assert row['status_code'] == 500
+
+
+def test_queue_full_counts_jobs_of_all_workers(tmp_path):
+    release = threading.Event()
+    first = make_manager(tmp_path, max_pending=2)
+    second = make_manager(tmp_path, max_pending=2)
+    jobs = [first.submit(lambda job: release.wait(5), 'a'), second.submit(lambda job: release.wait(5), 'b')]
+    with pytest.raises(analysis_jobs.QueueFull):
+        first.submit(lambda job: None, 'c')
+    release.set()
+    for job in jobs:
+        wait_finished(job)
@@ -0,0 +1,259 @@
+"""Index des clubs (club_db) sur une petite base en mémoire."""
+import json
+import random
+import struct
+
+import pytest
+
+import club_db
+
+RECORDS = [
+    {"affiliation_number": 500001, "name": "E.S. BULLY-LES-MINES", "short_name": "ES BULLY",
+     "location": "BULLY-LES-MINES", "latitude": 50.44, "longitude": 2.72, "logo": None},
+    {"affiliation_number": 500002, "name": "AS SAINT-ÉTIENNE", "short_name": "ASSE",
+     "location": "ST-ÉTIENNE", "latitude": 45.46, "longitude": 4.39, "logo": "asse.png"},
+    {"affiliation_number": 500003, "name": "US ASNIÈRES", "short_name": "USA",
+     "location": "ASNIÈRES-SUR-SEINE", "latitude": 48.91, "longitude": 2.28, "logo": None},
+    {"affiliation_number": 500004, "name": "FC NANTES", "short_name": "FCN",
+     "location": "NANTES", "latitude": 47.22, "longitude": -1.55, "logo": None},
+    {"affiliation_number": 500005, "name": "NANTES MÉTALLOS", "short_name": "",
+     "location": "Nantes", "latitude": 47.21, "longitude": -1.56, "logo": None},
+    {"affiliation_number": 500006, "name": "OLYMPIQUE LYONNAIS", "short_name": "OL",
+     "location": "LYON", "latitude": 45.76, "longitude": 4.83, "logo": None},
+    {"affiliation_number": 500007, "name": "ÉTOILE SANS GPS", "short_name": None,
+     "location": "Saint Etienne", "latitude": "", "longitude": None, "logo": None},
+    {"affiliation_number": 500008, "name": "CŒUR DE LENS", "short_name": "CDL",
+     "location": "LENS", "latitude": 0, "longitude": 0, "logo": None},
+]
+
+
+def build(records=RECORDS):
+    return club_db.ClubIndex.build(club_db.ClubTable.from_records(records))
+
+
+def names(clubs):
+    return [club['name'] for club in clubs]
+
+
+@pytest.fixture(scope='module')
+def index():
+    return build()
+
+
+# --- Index trigrammes / préfixes ----------------------------------------------------------------
+def test_field_start_ranks_before_word_start_before_substring():
+    index = build([{"name": name, "short_name": "", "location": ""}
+                   for name in ("VALENCIENNES FC", "RC LENS", "LENS OLYMPIQUE")])
+    assert names(index.search('len', fuzzy=False)) == ['LENS OLYMPIQUE', 'RC LENS', 'VALENCIENNES FC']
+
+
+def test_two_letter_queries_use_bigrams(index):
+    assert names(index.search('ol', fuzzy=False)) == ['OLYMPIQUE LYONNAIS']
+    # "FC" est aussi indexé développé : "football club nantes" contient "ll"
+    assert names(index.search('ll', fuzzy=False)) == ['E.S. BULLY-LES-MINES', 'FC NANTES', 'NANTES MÉTALLOS']
+    assert index.search('x', fuzzy=False) == []
+
+
+def test_substring_candidates_are_checked_against_the_text(index):
+    # Tous les trigrammes de "ant" existent, mais seuls les clubs qui contiennent "ant" sortent
+    assert names(index.search('ant', fuzzy=False)) == ['FC NANTES', 'NANTES MÉTALLOS']
+    assert index.search('zzz', fuzzy=False) == []
+
+
+def test_limit_stops_the_scan(index):
+    assert len(index.search('an', fuzzy=False)) == 3
+    assert names(index.search('an', limit=1, fuzzy=False)) == ['FC NANTES']
+
+
+# --- Normalisation ------------------------------------------------------------------------------
+@pytest.mark.parametrize('text, folded', [
+    ("E.S. BULLY-LES-MINES", "es bully les mines"),
+    ("AS SAINT-ÉTIENNE", "as saint etienne"),
+    ("CŒUR DE LENS", "coeur de lens"),
+    ("  Asnières--sur--Seine ", "asnieres sur seine"),
+    (None, ""),
+])
+def test_normalize_folds_accents_ligatures_acronyms_and_punctuation(text, folded):
+    assert club_db.normalize(text) == folded
+
+
+def test_abbreviations_are_expanded_except_the_word_being_typed():
+    assert club_db.index_variants("ST-ÉTIENNE") == ('st etienne', 'saint etienne')
+    assert club_db.query_variants("st e") == ('st e', 'saint e')
+    # "as" peut encore devenir "asnieres"
+    assert club_db.query_variants("as") == ('as',)
+
+
+@pytest.mark.parametrize('query', ['saint-étienne', 'ST ETIENNE', 'st-etienne'])
+def test_search_ignores_accents_punctuation_and_abbreviations(index, query):
+    assert names(index.search(query, fuzzy=False)) == ['AS SAINT-ÉTIENNE', 'ÉTOILE SANS GPS']
+
+
+def test_dotted_acronyms_and_ligatures_match_their_plain_form(index):
+    assert names(index.search('es bully', fuzzy=False)) == ['E.S. BULLY-LES-MINES']
+    assert names(index.search('coeur', fuzzy=False)) == names(index.search('cœur', fuzzy=False)) == ['CŒUR DE LENS']
+
+
+# --- Recherche approchée ------------------------------------------------------------------------
+@pytest.mark.parametrize('a, b, limit, prefix, expected', [
+    ('nantes', 'nantes', 1, False, 0),
+    ('nantse', 'nantes', 1, False, 1),         # Inversion de deux lettres : une seule faute
+    ('lyonais', 'lyonnais', 1, False, 1),
+    ('abcd', 'abxy', 1, False, None),
+    ('lyonnais', 'lyon', 2, False, None),      # Écart de longueur au-delà de la borne
+    ('lyo', 'lyonnais', 1, True, 0),           # Préfixe d'un mot en cours de frappe
+    ('lyin', 'lyonnais', 1, True, 1),
+])
+def test_bounded_levenshtein(a, b, limit, prefix, expected):
+    assert club_db.bounded_levenshtein(a, b, limit, prefix=prefix) == expected
+
+
+def test_typo_budget_grows_with_word_length():
+    assert [club_db.max_typos('x' * n) for n in (3, 4, 7, 8)] == [0, 1, 1, 2]
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('nantse', ['FC NANTES', 'NANTES MÉTALLOS']),
+    ('metalos', ['NANTES MÉTALLOS']),
+    ('asnieers', ['US ASNIÈRES']),
+    ('olympiqe lyonais', ['OLYMPIQUE LYONNAIS']),
+    ('olympiqeu', ['OLYMPIQUE LYONNAIS']),     # Dernier mot : préfixe approché
+])
+def test_fuzzy_search_takes_over_when_nothing_matches_exactly(index, query, expected):
+    assert index.search(query, fuzzy=False) == []
+    assert names(index.search(query)) == expected
+
+
+def test_fuzzy_search_needs_every_word_and_no_typo_on_short_words(index):
+    assert index.search('olympiqe paris') == []
+    assert index.search('lsn') == []
+
+
+# --- Grille géographique ------------------------------------------------------------------------
+@pytest.mark.parametrize('value, bound, expected', [
+    ('45.5', 90, 45.5), (-1.55, 180, -1.55), ('', 90, None), (None, 90, None),
+    ('nan', 90, None), (91, 90, None), ('abc', 180, None),
+])
+def test_parse_coordinate(value, bound, expected):
+    assert club_db.parse_coordinate(value, bound) == expected
+
+
+def test_clubs_without_coordinates_are_not_in_the_grid(index):
+    # Coordonnées vides et (0, 0) (valeur par défaut de l'export) ignorées
+    assert len(index.geo) == 6
+
+
+def test_within_radius_sorted_by_distance(index):
+    hits = index.geo.within(45.5, 4.4, 100)
+    assert [index.table[club_id]['name'] for _, club_id in hits] == ['AS SAINT-ÉTIENNE', 'OLYMPIQUE LYONNAIS']
+    assert hits[0][0] == pytest.approx(club_db.haversine_km(45.5, 4.4, 45.46, 4.39))
+    assert index.geo.within(45.5, 4.4, 1) == []
+
+
+def test_nearest_matches_brute_force_across_cells():
+    rng = random.Random(7)
+    records = [{"name": f"Club {i}", "latitude": rng.uniform(42.0, 51.0), "longitude": rng.uniform(-4.5, 8.0)}
+               for i in range(400)]
+    index = build(records)
+    for _ in range(25):
+        lat, lng = rng.uniform(41.0, 52.0), rng.uniform(-6.0, 9.0)
+        expected = sorted((club_db.haversine_km(lat, lng, r['latitude'], r['longitude']), i)
+                          for i, r in enumerate(records))
+        assert [club_id for _, club_id in index.geo.nearest(lat, lng, 5)] == [i for _, i in expected[:5]]
+        within = index.geo.within(lat, lng, 60)
+        assert [club_id for _, club_id in within] == [i for d, i in expected if d <= 60]
+
+
+def test_nearest_returns_everything_when_k_exceeds_the_clubs(index):
+    assert len(index.geo.nearest(47.2, -1.5, 50)) == 6
+    assert index.geo.nearest(47.2, -1.5, 0) == []
+
+
+# --- Table en colonnes --------------------------------------------------------------------------
+def test_table_restores_each_record(index):
+    table = index.table
+    assert len(table) == len(RECORDS)
+    for club_id, record in enumerate(RECORDS):
+        expected = dict(record)
+        for field in club_db.COORDINATE_BOUNDS:
+            expected[field] = club_db.parse_coordinate(record[field], club_db.COORDINATE_BOUNDS[field])
+        assert table[club_id] == expected
+    with pytest.raises(IndexError):
+        table[len(RECORDS)]
+
+
+def test_columns_pick_the_compact_representation():
+    records = [{"id": i, "league": "Ligue A" if i % 2 else "Ligue B", "name": f"Club {i}",
+                "score": i / 2, "tags": ["u13"] if i == 3 else None, "phone": None if i % 3 else f"0{i}"}
+               for i in range(12)]
+    table = club_db.ClubTable.from_records(records)
+    kinds = {field: column.kind for field, column in table.by_name.items()}
+    assert kinds == {"id": 'int', "league": 'dict', "name": 'str', "score": 'float', "tags": 'json',
+                     "phone": 'str'}
+    assert [table[i] for i in range(len(records))] == records
+    assert table.value(4, "phone") is None and table.value(3, "phone") == "03"
+    assert table.value(0, "absent") is None
+
+
+# --- Index binaire (mmap) -----------------------------------------------------------------------
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / 'clubs_full.json'
+    path.write_text(json.dumps(RECORDS, ensure_ascii=False), encoding='utf-8')
+    return path
+
+
+def test_binary_index_answers_like_the_built_index(source, tmp_path, index):
+    index_path = str(tmp_path / club_db.INDEX_FILENAME)
+    club_db.build_index_file(str(source), index_path)
+    table, loaded = club_db.open_index_file(index_path, str(source))
+    assert [table[i] for i in range(len(table))] == [index.table[i] for i in range(len(index.table))]
+    for query in ('nan', 'st etienne', 'll', 'nantse', 'olympiqe lyonais'):
+        assert names(loaded.search(query)) == names(index.search(query))
+    assert loaded.geo.nearest(47.2, -1.5, 3) == index.geo.nearest(47.2, -1.5, 3)
+    assert loaded.cities.search('st e') == index.cities.search('st e')
+
+
+def test_binary_index_is_stale_once_the_source_changes(source, tmp_path):
+    index_path = str(tmp_path / club_db.INDEX_FILENAME)
+    club_db.build_index_file(str(source), index_path)
+    source.write_text(json.dumps(RECORDS[:3]), encoding='utf-8')
+    assert club_db.open_index_file(index_path, str(source)) is None
+    # Source absente : l'index est servi tel quel
+    source.unlink()
+    assert len(club_db.open_index_file(index_path, str(source))[0]) == len(RECORDS)
+
+
+def test_binary_index_of_another_format_or_missing_is_ignored(source, tmp_path):
+    index_path = tmp_path / club_db.INDEX_FILENAME
+    assert club_db.open_index_file(str(index_path), str(source)) is None
+    club_db.build_index_file(str(source), str(index_path))
+    data = bytearray(index_path.read_bytes())
+    struct.pack_into('<I', data, len(club_db.INDEX_MAGIC), club_db.INDEX_FORMAT_VERSION + 1)
+    index_path.write_bytes(bytes(data))
+    assert club_db.open_index_file(str(index_path), str(source)) is None
+    index_path.write_bytes(b'')
+    assert club_db.open_index_file(str(index_path), str(source)) is None
+
+
+# --- Index des villes ---------------------------------------------------------------------------
+def test_city_autocomplete_merges_spellings(index):
+    # "ST-ÉTIENNE" et "Saint Etienne" sont la même ville, affichée sous une seule graphie
+    assert index.cities.search('st e') == index.cities.search('saint') == ['Saint Etienne']
+    assert index.cities.search('nan') == ['Nantes']
+    assert index.cities.search('as') == ['ASNIÈRES-SUR-SEINE']
+    assert index.cities.search('zz') == []
+
+
+def test_clubs_in_city_sorted_by_name(index):
+    def clubs(city):
+        return [index.table[club_id]['name'] for club_id in index.cities.clubs_in(city)]
+    assert clubs('saint-etienne') == clubs('ST ÉTIENNE') == ['AS SAINT-ÉTIENNE', 'ÉTOILE SANS GPS']
+    assert clubs('NANTES') == ['FC NANTES', 'NANTES MÉTALLOS']
+    assert clubs('Paris') == []
+
+
+def test_city_autocomplete_respects_the_limit():
+    index = build([{"name": f"Club {i}", "location": f"Ville {i:02d}"} for i in range(30)])
+    assert index.cities.search('ville', limit=5) == [f"Ville {i:02d}" for i in range(5)]
+    assert len(index.cities) == 30
@@ -0,0 +1,114 @@
+"""Rechargement à chaud de la base des clubs (ClubReloader.check, sans le thread)."""
+import hashlib
+import json
+import os
+import time
+
+import pytest
+
+import club_db
+import club_reloader
+
+CLUBS = [{"name": "FC NANTES", "location": "NANTES"}, {"name": "RC LENS", "location": "LENS"}]
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return tmp_path / 'clubs_full.json', tmp_path / club_db.INDEX_FILENAME
+
+
+def write(path, records, age):
+    """Écrit le JSON avec un mtime vieux de `age` s (au-delà de SETTLE_SECONDS : fichier stable)."""
+    data = records if isinstance(records, bytes) else json.dumps(records).encode('utf-8')
+    path.write_bytes(data)
+    when = time.time() - age
+    os.utime(path, (when, when))
+
+
+def make_reloader(paths, **kwargs):
+    source, index_path = paths
+    return club_reloader.ClubReloader(str(source), str(index_path), check_interval=10, missing_interval=60, **kwargs)
+
+
+def test_first_check_builds_from_json_and_persists_the_binary_index(paths, monkeypatch):
+    write(paths[0], CLUBS, age=30)
+    reloader = make_reloader(paths)
+    assert reloader.check() == 10
+    assert [club['name'] for club in reloader.index.search('nantes')] == ['FC NANTES']
+    assert paths[1].exists()
+    # Démarrage suivant : l'index binaire à jour est ouvert par mmap, sans reconstruire
+    monkeypatch.setattr(club_db, 'build_from_bytes', lambda *args: pytest.fail("index reconstruit"))
+    other = make_reloader(paths)
+    other.check()
+    assert len(other.index) == 2
+
+
+def test_source_is_hashed_once_per_reload(paths, monkeypatch):
+    write(paths[0], CLUBS, age=30)
+    reloader = make_reloader(paths)
+    calls = []
+    sha256 = hashlib.sha256
+    monkeypatch.setattr(hashlib, 'sha256', lambda *args: calls.append(args) or sha256(*args))
+    monkeypatch.setattr(club_db, 'file_digest', lambda path: pytest.fail("source hachée une deuxième fois"))
+    reloader.check()
+    assert len(calls) == 1
+    # Cette même empreinte est celle du manifeste de l'index binaire écrit
+    assert club_db.open_index_file(str(paths[1]), source_digest=reloader.loaded_digest) is not None
+
+
+def test_touch_without_change_does_not_reload(paths):
+    write(paths[0], CLUBS, age=30)
+    reloader = make_reloader(paths)
+    reloader.check()
+    index = reloader.index
+    write(paths[0], CLUBS, age=20)
+    reloader.check()
+    assert reloader.index is index
+
+
+def test_changed_source_swaps_the_index(paths):
+    write(paths[0], CLUBS, age=30)
+    reloader = make_reloader(paths)
+    reloader.check()
+    before = reloader.index
+    write(paths[0], CLUBS + [{"name": "OLYMPIQUE LYONNAIS", "location": "LYON"}], age=20)
+    reloader.check()
+    assert len(reloader.index) == 3
+    # Une requête qui tient encore l'ancien index le lit jusqu'au bout
+    assert [club['name'] for club in before.search('lens')] == ['RC LENS']
+
+
+def test_file_being_written_waits_for_it_to_settle(paths):
+    write(paths[0], CLUBS, age=0)
+    reloader = make_reloader(paths)
+    assert reloader.check() == club_reloader.SETTLE_SECONDS
+    assert reloader.index is None
+
+
+def test_unreadable_source_keeps_the_previous_index(paths):
+    write(paths[0], CLUBS, age=30)
+    reloader = make_reloader(paths, persist=False)
+    reloader.check()
+    index = reloader.index
+    write(paths[0], b'[{"name": "coupe', age=20)
+    reloader.check()
+    assert reloader.index is index
+    assert reloader.rejected is not None
+    # Même fichier illisible : pas relu à chaque vérification
+    reloader.check()
+    assert reloader.index is index
+
+
+def test_missing_source_serves_an_orphan_binary_index(paths):
+    write(paths[0], CLUBS, age=30)
+    club_db.build_index_file(str(paths[0]), str(paths[1]))
+    paths[0].unlink()
+    reloader = make_reloader(paths)
+    assert reloader.check() == 60
+    assert len(reloader.index) == 2
+
+
+def test_missing_source_without_index_waits(paths):
+    reloader = make_reloader(paths)
+    assert reloader.check() == 60
+    assert reloader.index is None
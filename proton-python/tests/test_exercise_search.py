@@ -0,0 +1,78 @@
+"""Recherche plein texte de la bibliothèque : racinisation, requêtes MATCH et index FTS5."""
+import pytest
+
+import exercise_search
+import exercise_store
+
+DEFENSIVE = {"summary": "Transition défensive en 4 contre 4",
+             "synopsis": "## Consignes\nLes défenseurs récupèrent et ressortent.\n```svg\n<svg>centres</svg>\n```"}
+CENTRES = {"summary": "Centres au second poteau", "video_description": "Les ailiers centrent fort"}
+
+
+@pytest.mark.parametrize('words, root', [
+    (('defensive', 'defensives', 'defensif', 'defensifs'), 'defensif'),
+    (('centrer', 'centre', 'centres'), 'centr'),
+    (('joueuse', 'joueur', 'joueurs'), 'joueur'),
+    (('cheval', 'chevaux'), 'cheval'),
+])
+def test_stem_groups_plurals_feminines_and_verb_endings(words, root):
+    assert {exercise_search.stem(word) for word in words} == {root}
+
+
+def test_short_words_and_numbers_are_kept():
+    assert exercise_search.stem('pas') == 'pas'
+    assert exercise_search.stem('4v4') == '4v4'
+    assert exercise_search.terms('Les 4 contre 4 défensifs') == ['4v4', 'defensif']
+
+
+def test_prefixes_complete_a_suffix_being_typed():
+    assert exercise_search.prefixes('defensiv') == ['defensiv', 'defensif']
+    assert exercise_search.prefixes('danseus') == ['danseu', 'danseus', 'danseur']
+
+
+def test_match_query_quotes_terms_and_prefixes_the_last_word():
+    assert exercise_search.match_query('Transition défensiv') == '"transition" AND ("defensiv"* OR "defensif"*)'
+    assert exercise_search.match_query('rondo') == '"rondo"*'
+    # La syntaxe FTS5 saisie par l'utilisateur reste du texte
+    assert exercise_search.match_query('"rondo" OR x*') == '"rondo" AND "or" AND "x"*'
+    assert exercise_search.match_query('le de') is None
+
+
+def test_document_skips_svg_and_section_headings():
+    summary, description, synopsis = exercise_search.document(DEFENSIVE)
+    assert summary == 'transition defensif 4v4'
+    assert description == ''
+    assert 'centr' not in synopsis and 'consign' not in synopsis
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = exercise_store.ExerciseStore(str(tmp_path / 'exercises.sqlite3'), str(tmp_path / 'similarity.sqlite3'))
+    store.add_many([("Défense", None, 'https://youtu.be/a', DEFENSIVE), ("Centres", None, 'https://youtu.be/b', CENTRES)])
+    return store
+
+
+def summaries(entries):
+    return [entry['data']['summary'] for entry in entries]
+
+
+@pytest.mark.parametrize('typed', ['défensiv', 'defensive', 'transitions défensives', 'DÉFENS'])
+def test_partially_typed_words_find_the_exercise(store, typed):
+    # « défensiv » : racine « defensiv », absente de l'index ; c'est le préfixe « defensif » qui trouve
+    assert summaries(store.search_text(typed)) == ["Transition défensive en 4 contre 4"]
+
+
+def test_search_text_ranks_the_title_first_and_ignores_the_svg(store):
+    assert summaries(store.search_text('centre')) == ["Centres au second poteau"]
+    store.add_many([("Jeu", None, 'https://youtu.be/c', {"summary": "Jeu à thème",
+                                                         "synopsis": "Finir par un centre ou une frappe."})])
+    assert summaries(store.search_text('centre')) == ["Centres au second poteau", "Jeu à thème"]
+    assert store.search_text('svg') == []
+    assert store.search_text('') == []
+
+
+def test_search_index_follows_deletes(store):
+    entry, = store.search_text('poteau')
+    store.delete(entry['id'])
+    assert store.search_text('poteau') == []
+    assert [entry['title'] for entry in store.search(text='défensiv')[0]] == ["Défense"]
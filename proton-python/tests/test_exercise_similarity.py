@@ -0,0 +1,73 @@
+"""Quasi-doublons d'exercices au sein d'une vidéo (MinHash + LSH)."""
+import exercise_similarity
+
+RONDO = {
+    "summary": "Rondo 4 contre 2 avec transition",
+    "synopsis": "## Organisation\nRondo 4v2 dans un carré de 10x10, les défenseurs qui récupèrent sortent "
+                "le ballon en conduite.\n```svg\n<svg>x</svg>\n```",
+    "materiel_detail": "plots, chasubles",
+    "start_seconds": 10,
+}
+RONDO_VARIANT = {
+    "summary": "Rondo 4c2 et transition",
+    "synopsis": "Rondo 4 contre 2 dans un carré 10x10 : les défenseurs qui récupèrent sortent le ballon "
+                "en conduite. Variante à deux touches.",
+    "materiel_detail": "plots, chasubles, ballons",
+    "dimensions": "10x10",
+    "svg_schema": "<svg/>",
+    "start_seconds": 40,
+}
+CENTRES = {
+    "summary": "Centres et finition au second poteau",
+    "synopsis": "Les ailiers débordent et centrent, les attaquants attaquent le premier et le second poteau.",
+    "materiel_detail": "mini-buts, plots",
+    "start_seconds": 50,
+}
+
+
+def signature(exo):
+    return exercise_similarity.exercise_signature(exo)
+
+
+def test_normalize_folds_accents_and_versus_notation():
+    assert exercise_similarity.normalize("Rondo 4 contre 2 — Équipe") == "rondo 4v2 equipe"
+    assert exercise_similarity.normalize("Jeu 5 vs 5") == exercise_similarity.normalize("jeu 5c5") == "jeu 5v5"
+
+
+def test_shingles_skip_svg_headings_stopwords_and_plurals():
+    shingles = exercise_similarity.shingles({"synopsis": "## Consignes\n```svg\n<svg>rect</svg>\n``` passes courtes"})
+    assert shingles == {"passe", "courte", "passe courte"}
+    assert exercise_similarity.exercise_signature({"summary": "Exercice de jeu"}) is None
+
+
+def test_signatures_are_stable_and_estimate_jaccard():
+    assert signature(RONDO) == signature(dict(RONDO))
+    assert len(signature(RONDO)) == exercise_similarity.NUM_PERM
+    assert exercise_similarity.similarity(signature(RONDO), signature(RONDO_VARIANT)) >= 0.6
+    assert exercise_similarity.similarity(signature(RONDO), signature(CENTRES)) < 0.2
+
+
+def test_band_keys_are_shared_by_near_duplicates():
+    keys = set(exercise_similarity.band_keys(signature(RONDO)))
+    assert len(keys) == exercise_similarity.BANDS
+    assert keys & set(exercise_similarity.band_keys(signature(RONDO_VARIANT)))
+
+
+def test_duplicate_groups_and_best_variant():
+    assert exercise_similarity.duplicate_groups([RONDO, RONDO_VARIANT, CENTRES]) == [[0, 1], [2]]
+    # Synopsis plus riche, schéma SVG et dimensions : la variante l'emporte
+    assert exercise_similarity.variant_score(RONDO_VARIANT) > exercise_similarity.variant_score(RONDO)
+    kept = exercise_similarity.deduplicate([CENTRES, RONDO, RONDO_VARIANT])
+    assert [exo["summary"] for exo in kept] == [RONDO_VARIANT["summary"], CENTRES["summary"]]
+
+
+def test_time_window_stops_a_chain_of_repeats_from_merging():
+    # Le même exercice revient toutes les 40 s : sans borne, tout s'agglomérerait en un groupe
+    repeats = [dict(RONDO, start_seconds=t) for t in (0, 40, 80, 120)]
+    assert exercise_similarity.duplicate_groups(repeats) == [[0, 1], [2, 3]]
+    assert exercise_similarity.duplicate_groups(repeats, window=None) == [[0, 1, 2, 3]]
+
+
+def test_exercises_without_text_stay_alone():
+    empty = {"summary": "", "start_seconds": 0}
+    assert exercise_similarity.duplicate_groups([empty, dict(empty)]) == [[0], [1]]
@@ -0,0 +1,198 @@
+"""Bibliothèque persistante des exercices (ExerciseStore, SQLite en WAL)."""
+import json
+import sqlite3
+
+import pytest
+
+import exercise_store
+import similarity_index
+
+VIDEO = 'https://youtu.be/rondo'
+RONDO = {"summary": "Rondo 4v2", "themes": ["possession", "Pressing"], "cat_range": "U13 → U15",
+         "level_range": "Ligue", "duree_totale": "15-20 min", "synopsis": "Conserver", "svg_schema": "<svg/>"}
+CENTRES = {"summary": "Centres", "theme_force": "FINITION", "cat_range": "Seniors", "duree_totale": "25 min"}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return exercise_store.ExerciseStore(str(tmp_path / 'exercises.sqlite3'), str(tmp_path / 'similarity.sqlite3'))
+
+
+@pytest.mark.parametrize('text, bounds', [
+    ('U13 → U15', (13, 15)),
+    ('u 9', (9, 9)),
+    ('U17 - Seniors', (17, exercise_store.SENIORS)),
+    ('Vétérans', (exercise_store.VETERANS, exercise_store.VETERANS)),
+    ('Toutes catégories', exercise_store.ALL_CATEGORIES),
+    ('', (None, None)),
+    ('adaptable', (None, None)),
+])
+def test_category_bounds(text, bounds):
+    assert exercise_store.category_bounds(text) == bounds
+
+
+def test_level_duration_and_themes():
+    assert exercise_store.level_bounds('Débutant à Régional') == (0, 2)
+    assert exercise_store.level_bounds('tous niveaux') == (None, None)
+    assert exercise_store.duration_minutes('15-20 min') == 15
+    assert exercise_store.duration_minutes(None) is None
+    assert exercise_store.exercise_themes(RONDO) == ['POSSESSION', 'PRESSING']
+    assert exercise_store.exercise_themes(CENTRES) == ['FINITION']
+
+
+def test_add_many_get_and_reopen(store):
+    entries = store.add_many([("Rondo", "thumb.jpg", VIDEO, RONDO), ("Centres", None, VIDEO, CENTRES)])
+    assert [entry['title'] for entry in entries] == ["Rondo", "Centres"]
+    first, second = (entry['id'] for entry in entries)
+    assert second == first + 1
+    assert store.get(first) == {"id": first, "title": "Rondo", "thumbnail": "thumb.jpg", "link": VIDEO, "data": RONDO}
+    # Une autre connexion (autre worker) voit les mêmes entrées
+    other = exercise_store.ExerciseStore(store.path, store.similarity_path)
+    assert other.count() == 2
+    assert set(other.get_many([first, second, 404])) == {first, second}
+    assert [entry['id'] for entry in other.by_link(VIDEO)] == [first, second]
+
+
+def test_ids_stay_unique_across_batches(store):
+    ids = [entry['id'] for entry in store.add_many([("A", None, VIDEO, RONDO)])]
+    ids += [entry['id'] for entry in store.add_many([("B", None, VIDEO, RONDO), ("C", None, VIDEO, RONDO)])]
+    assert ids == sorted(set(ids))
+    assert [entry['id'] for entry in store.all()] == ids
+
+
+def test_delete(store):
+    entry, = store.add_many([("Rondo", None, VIDEO, RONDO)])
+    assert store.delete(entry['id']) is True
+    assert store.delete(entry['id']) is False
+    assert store.get(entry['id']) is None
+    assert store.count() == 0
+
+
+def test_replace_link_swaps_the_entries_of_one_video(store):
+    old = store.add_many([("Rondo", None, VIDEO, RONDO)])
+    kept = store.add_many([("Autre", None, 'https://youtu.be/autre', CENTRES)])
+    removed, entries = store.replace_link(VIDEO, [("Rondo", None, RONDO), ("Centres", None, CENTRES)])
+    assert removed == [old[0]['id']]
+    assert [entry['data'] for entry in store.by_link(VIDEO)] == [RONDO, CENTRES]
+    assert store.get(kept[0]['id']) is not None
+    assert store.count() == 3
+    assert {entry['id'] for entry in entries}.isdisjoint(removed)
+
+
+# --- Recherche filtrée et paginée ---------------------------------------------------------------
+def library(store, count=5):
+    exos = [dict(RONDO, summary=f"Rondo {i}", duree_totale=f"{10 + 5 * i} min") for i in range(count)]
+    return [entry['id'] for entry in store.add_many([(exo['summary'], None, VIDEO, exo) for exo in exos])]
+
+
+def test_search_filters_on_the_derived_columns(store):
+    rondo, centres = (entry['id'] for entry in store.add_many([("Rondo", None, VIDEO, RONDO),
+                                                               ("Centres", None, VIDEO, CENTRES)]))
+
+    def ids(**filters):
+        return [entry['id'] for entry in store.search(**filters)[0]]
+
+    assert ids(themes=['pressing']) == [rondo]
+    assert ids(category='U14') == [rondo]
+    assert ids(category='Vétérans') == []
+    assert ids(category='U19 → Seniors') == [centres]
+    assert ids(level='Régional') == [rondo]
+    assert ids(duration_min=20) == [centres]
+    assert ids(duration_max=20) == [rondo]
+    assert ids() == [rondo, centres]
+
+
+def test_search_pages_by_cursor(store):
+    ids = library(store)
+    first, cursor = store.search(limit=2)
+    assert [entry['id'] for entry in first] == ids[:2] and cursor == ids[1]
+    second, cursor = store.search(limit=2, cursor=cursor)
+    last, cursor = store.search(limit=2, cursor=cursor)
+    assert [entry['id'] for entry in second + last] == ids[2:]
+    assert cursor is None
+
+
+def test_list_view_omits_synopsis_and_svg(store):
+    entry_id, = library(store, count=1)
+    listed, _ = store.search()
+    assert 'synopsis' not in listed[0]['data'] and 'svg_schema' not in listed[0]['data']
+    detailed, _ = store.search(detail=True)
+    assert detailed[0]['data']['synopsis'] == "Conserver"
+    assert store.get(entry_id)['data']['svg_schema'] == "<svg/>"
+
+
+def test_collapse_keeps_the_best_variant_that_passes_the_filters(store):
+    ids = library(store, count=3)
+    rich = store.add_many([("Rondo riche", None, VIDEO, dict(RONDO, synopsis='x' * 3000, duree_totale='90 min'))])
+    store.set_clusters({exercise_id: ids[0] for exercise_id in ids + [rich[0]['id']]})
+    collapsed, _ = store.search()
+    assert [entry['id'] for entry in collapsed] == [rich[0]['id']]
+    assert collapsed[0]['duplicates'] == ids
+    # La meilleure variante est écartée par le filtre : la suivante du groupe la remplace
+    filtered, _ = store.search(duration_max=30)
+    assert [entry['id'] for entry in filtered] == [ids[0]]
+    assert len(store.search(collapse=False)[0]) == 4
+
+
+def test_search_params_reject_string_booleans_and_bad_numbers():
+    assert exercise_store.search_params({})['collapse'] is True
+    assert exercise_store.search_params({"collapse": False, "category": "Toutes", "limit": "10"}) == {
+        "themes": None, "category": None, "level": None, "duration_min": None, "duration_max": None,
+        "text": None, "cursor": None, "limit": 10, "detail": False, "collapse": False,
+    }
+    # "false" est une chaîne non vide : la prendre pour un booléen renverrait les doublons par erreur
+    with pytest.raises(ValueError, match='collapse'):
+        exercise_store.search_params({"collapse": "false"})
+    for body in ({"cursor": "abc"}, {"themes": 5}, {"category": 13}, {"q": ["rondo"]}, []):
+        with pytest.raises(ValueError, match='invalides'):
+            exercise_store.search_params(body)
+
+
+# --- Migration d'une base antérieure aux groupes ------------------------------------------------
+OLD_SCHEMA = """
+    CREATE TABLE exercises (
+        id INTEGER PRIMARY KEY, title TEXT, thumbnail TEXT, link TEXT, data TEXT NOT NULL,
+        cat_min INTEGER, cat_max INTEGER, level_min INTEGER, level_max INTEGER, duration INTEGER,
+        created_at REAL NOT NULL
+    );
+    CREATE TABLE exercise_themes (
+        theme TEXT NOT NULL, exercise_id INTEGER NOT NULL, PRIMARY KEY (theme, exercise_id)
+    ) WITHOUT ROWID;
+"""
+OLD_ROWS = {
+    1: dict(RONDO, summary="Transition défensive en 4 contre 4",
+            synopsis="Rondo 4 contre 2 : les défenseurs qui récupèrent sortent le ballon en conduite."),
+    2: dict(RONDO, summary="Transition défensive 4c4",
+            synopsis="Rondo 4 contre 2 : les défenseurs qui récupèrent sortent le ballon en conduite. Variante."),
+    3: CENTRES,
+}
+
+
+def old_database(tmp_path):
+    path = tmp_path / 'exercises.sqlite3'
+    conn = sqlite3.connect(str(path))
+    conn.executescript(OLD_SCHEMA)
+    conn.executemany("INSERT INTO exercises (id, title, link, data, created_at) VALUES (?, ?, ?, ?, 0)",
+                     [(exercise_id, exo['summary'], VIDEO, json.dumps(exo)) for exercise_id, exo in OLD_ROWS.items()])
+    conn.commit()
+    conn.close()
+    return str(path)
+
+
+def test_migration_backfills_clusters_from_the_similarity_index(tmp_path):
+    path = old_database(tmp_path)
+    similarity_path = str(tmp_path / 'similarity.sqlite3')
+    assert similarity_index.SimilarityIndex(similarity_path).add_many(OLD_ROWS.items()) == {1: 1, 2: 1, 3: 3}
+    store = exercise_store.ExerciseStore(path, similarity_path)
+    entries, _ = store.search()
+    assert [entry['id'] for entry in entries] == [2, 3]     # Variante au synopsis le plus riche
+    assert entries[0]['duplicates'] == [1]
+    # Index plein texte construit pour les exercices déjà enregistrés, un résultat par groupe
+    assert [entry['id'] for entry in store.search_text('transition')] in ([1], [2])
+
+
+def test_migration_without_similarity_index_keeps_every_exercise(tmp_path):
+    store = exercise_store.ExerciseStore(old_database(tmp_path), str(tmp_path / 'absent.sqlite3'))
+    assert [entry['id'] for entry in store.search()[0]] == [1, 2, 3]
+    # Rouvrir une base déjà migrée ne refait rien
+    assert exercise_store.ExerciseStore(store.path, store.similarity_path).count() == 3
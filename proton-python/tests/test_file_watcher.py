@@ -0,0 +1,103 @@
+"""FileReadinessWatcher contre une fausse API files (get / list / delete) en mémoire."""
+import threading
+
+import file_watcher
+
+
+class FakeFile:
+    def __init__(self, name, state):
+        self.name = name
+        self.state = state
+
+
+class FakeFiles:
+    """Chaque fichier suit une liste d'états, un état consommé par observation (get ou list)."""
+
+    def __init__(self, scripts):
+        self.scripts = {name: list(states) for name, states in scripts.items()}
+        self.get_calls = 0
+        self.list_calls = 0
+        self.deleted = []
+        self.lock = threading.Lock()
+
+    def _observe(self, name):
+        states = self.scripts[name]
+        state = states.pop(0) if len(states) > 1 else states[0]
+        return FakeFile(name, state)
+
+    def get(self, name):
+        with self.lock:
+            self.get_calls += 1
+            return self._observe(name)
+
+    def list(self, config=None):
+        with self.lock:
+            self.list_calls += 1
+            return [self._observe(name) for name in list(self.scripts)]
+
+    def delete(self, name):
+        with self.lock:
+            self.deleted.append(name)
+
+
+class FakeClient:
+    def __init__(self, scripts):
+        self.files = FakeFiles(scripts)
+
+
+def make_watcher(scripts, min_interval=0.01, max_interval=0.05):
+    client = FakeClient(scripts)
+    watcher = file_watcher.FileReadinessWatcher(lambda: client, min_interval=min_interval,
+                                                max_interval=max_interval)
+    return watcher, client.files
+
+
+def test_active_file_resolves_with_file():
+    watcher, files = make_watcher({'files/a': ['PROCESSING', 'PROCESSING', 'ACTIVE']})
+    result = watcher.watch(FakeFile('files/a', 'PROCESSING'), timeout=5).result(timeout=5)
+    assert result.name == 'files/a' and result.state == 'ACTIVE'
+    assert files.deleted == []
+    assert watcher.stats()["ready"] == 1
+
+
+def test_failed_file_resolves_none_and_is_deleted():
+    watcher, files = make_watcher({'files/b': ['PROCESSING', 'FAILED']})
+    assert watcher.watch(FakeFile('files/b', 'PROCESSING'), timeout=5).result(timeout=5) is None
+    assert files.deleted == ['files/b']
+    assert watcher.stats()["failed"] == 1
+
+
+def test_already_failed_file_is_deleted_without_polling():
+    watcher, files = make_watcher({'files/c': ['FAILED']})
+    assert watcher.watch(FakeFile('files/c', 'FAILED'), timeout=5).result(timeout=1) is None
+    assert files.deleted == ['files/c']
+    assert files.get_calls == 0
+
+
+def test_timeout_resolves_none_and_is_deleted():
+    watcher, files = make_watcher({'files/d': ['PROCESSING']})
+    assert watcher.watch(FakeFile('files/d', 'PROCESSING'), timeout=0.2).result(timeout=5) is None
+    assert files.deleted == ['files/d']
+    assert watcher.stats()["timeouts"] == 1
+
+
+def test_three_pending_files_use_one_list_call():
+    names = [f'files/{i}' for i in range(file_watcher.LIST_THRESHOLD)]
+    watcher, files = make_watcher({name: ['PROCESSING', 'ACTIVE'] for name in names}, min_interval=0.1)
+    futures = [watcher.watch(FakeFile(name, 'PROCESSING'), timeout=5) for name in names]
+    assert [f.result(timeout=5).name for f in futures] == names
+    assert files.list_calls >= 1
+    assert files.get_calls == 0
+
+
+def test_poll_interval_grows_from_min_to_max():
+    watcher = file_watcher.FileReadinessWatcher(lambda: None, min_interval=0.5, max_interval=5.0)
+    entry = file_watcher._PendingFile(FakeFile('files/e', 'PROCESSING'), None, 60, None, watcher.min_interval)
+    intervals = [entry.interval]
+    for _ in range(8):
+        watcher._update(entry, FakeFile('files/e', 'PROCESSING'))
+        intervals.append(entry.interval)
+    assert intervals[0] == 0.5
+    assert intervals == sorted(intervals)
+    assert intervals[1] == 0.5 * file_watcher.BACKOFF_FACTOR
+    assert intervals[-1] == intervals[-2] == 5.0
@@ -0,0 +1,26 @@
+"""Erreurs Gemini considérées comme transitoires par l'ordonnanceur."""
+import pytest
+
+import genai_scheduler
+
+
+class ApiError(Exception):
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.code = code
+
+
+@pytest.mark.parametrize('error, retryable', [
+    (ApiError('quota', code=429), True),
+    (ApiError('boom', code=500), True),
+    (ApiError('overloaded', code=503), True),
+    (ApiError('bad request', code=400), False),
+    # Sans code numérique : le message porte le code ou le statut Google
+    (ApiError('429 RESOURCE_EXHAUSTED. Quota exceeded'), True),
+    (ApiError('500 INTERNAL. An internal error has occurred'), True),
+    (ApiError('The model is UNAVAILABLE'), True),
+    (ApiError('400 INVALID_ARGUMENT: 5000 tokens max'), False),
+    (ApiError('404 NOT_FOUND'), False),
+])
+def test_is_retryable_agrees_for_codes_and_messages(error, retryable):
+    assert genai_scheduler.is_retryable(error) is retryable
@@ -0,0 +1,64 @@
+"""Index des quasi-doublons de toute la bibliothèque (groupes persistants, sans chaînage)."""
+import pytest
+
+import exercise_similarity
+import similarity_index
+
+# Signatures construites à la main : positions communes / NUM_PERM = similarité estimée
+#   0-21 : A = B = C ; 22-40 : A = B ; 41-55 : B = C ; le reste diffère partout
+A = tuple(range(64))
+B = A[:41] + tuple(1000 + i for i in range(41, 64))
+C = A[:22] + tuple(2000 + i for i in range(22, 41)) + B[41:56] + tuple(3000 + i for i in range(56, 64))
+SIGNATURES = {'A': A, 'B': B, 'C': C}
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    monkeypatch.setattr(exercise_similarity, 'exercise_signature', lambda exo: SIGNATURES.get(exo['sig']))
+    return similarity_index.SimilarityIndex(str(tmp_path / 'similarity.sqlite3'), threshold=0.4)
+
+
+def exo(sig, synopsis=''):
+    return {"sig": sig, "summary": sig, "synopsis": synopsis}
+
+
+def test_fixture_similarities():
+    similarity = exercise_similarity.similarity
+    assert similarity(A, B) == pytest.approx(0.64, abs=0.01)
+    assert similarity(B, C) == pytest.approx(0.58, abs=0.01)
+    assert similarity(A, C) == pytest.approx(0.34, abs=0.01)
+
+
+def test_a_b_and_b_c_do_not_chain_c_into_a(index):
+    # A~B et B~C dépassent le seuil, A~C non : C ne rejoint pas le groupe de A
+    assert index.add_many([(1, exo('A')), (2, exo('B')), (3, exo('C'))]) == {1: 1, 2: 1, 3: 3}
+    assert index.stats() == {"exercises": 3, "clusters": 2}
+
+
+def test_candidate_must_also_match_the_representative(index, monkeypatch):
+    # Un seul candidat comparé (B, qui partage le plus de bandes avec C) : seul le représentant,
+    # A (meilleure variante du groupe), peut encore écarter C
+    index.add_many([(1, exo('A', synopsis='x' * 3000)), (2, exo('B'))])
+    monkeypatch.setattr(similarity_index, 'MAX_CANDIDATES', 1)
+    assert index.add_many([(3, exo('C'))]) == {3: 3}
+
+
+def test_near_duplicate_of_the_representative_joins(index):
+    index.add_many([(1, exo('A'))])
+    assert index.add_many([(2, exo('B'))]) == {2: 1}
+    assert index.similar(2) == [(1, pytest.approx(0.64, abs=0.01))]
+
+
+def test_exercise_without_signature_forms_its_own_cluster(index):
+    assert index.add_many([(1, exo('A')), (2, exo(None))]) == {1: 1, 2: 2}
+    assert index.similar(2) == []
+
+
+def test_remove_and_reopen(index, tmp_path):
+    index.add_many([(1, exo('A')), (2, exo('B')), (3, exo('C'))])
+    index.remove(2)
+    assert index.similar(1) == []
+    reopened = similarity_index.SimilarityIndex(index.path, threshold=0.4)
+    assert reopened.stats() == {"exercises": 2, "clusters": 2}
+    # Sans B, C reste seul ; réindexé, il ne rejoint toujours pas A
+    assert reopened.add_many([(3, exo('C'))]) == {3: 3}